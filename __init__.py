@@ -3,100 +3,273 @@ from flask_login import LoginManager
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 import os
+import sqlite3
+from datetime import timedelta
+from model.pool import TimedQueuePool
+from model.replica import RoutingSession, init_read_replica
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Setup of key Flask object (app)
-app = Flask(__name__)
-
-# Initialize Flask-Login object
+# Flask extensions, bound to the app by create_app
 login_manager = LoginManager()
-login_manager.init_app(app)
-
-# Configure CORS with more permissive settings
-cors = CORS(app, resources={
-    r"/api/*": {
-        "origins": [
-            "http://localhost:4888",
-            "http://127.0.0.1:4888",
-            "https://bookconnect-832734119496.us-west1.run.app",
-            "https://*.us-west1.run.app",  # Allow all subdomains of us-west1.run.app
-            "https://jacobcancode.github.io",  # GitHub Pages frontend
-            "https://*.github.io"  # Allow all GitHub Pages domains
-        ],
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["*"],
-        "expose_headers": ["*"],
-        "supports_credentials": True,
-        "max_age": 3600
+cors = CORS()
+db = SQLAlchemy(session_options={"class_": RoutingSession})  # reads of GET requests may go to a replica, see model/replica.py
+migrate = Migrate()
+
+# Origins allowed to call /api/* with credentials, unless CORS_ORIGINS (comma separated) replaces them
+CORS_ORIGINS = [
+    "http://localhost:4888",
+    "http://127.0.0.1:4888",
+    "https://bookconnect-832734119496.us-west1.run.app",
+    "https://*.us-west1.run.app",  # Allow all subdomains of us-west1.run.app
+    "https://jacobcancode.github.io",  # GitHub Pages frontend
+    "https://*.github.io"  # Allow all GitHub Pages domains
+]
+
+# SQLite pragmas every new connection gets, by SQLITE_PRAGMA_PROFILE (see apply_sqlite_pragmas)
+# None of them enforces foreign keys: the tables referencing users and posts do not cascade deletes, so
+# deleting either would fail once a row refers to it; SQLITE_PRAGMAS=foreign_keys=ON turns enforcement on
+SQLITE_PRAGMA_PROFILES = {
+    # SQLite's defaults: a rollback journal fsynced on every commit, writers lock out readers
+    'legacy': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000},
+    # WAL, still fsynced on every commit
+    'durable': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'busy_timeout': 5000},
+    # WAL fsynced at checkpoints only: a power loss can lose the last commits but not corrupt the database
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # ms a writer waits for the lock before "database is locked"
+        'mmap_size': 256 * 1024 * 1024,  # reads served from the page cache without copying
+        'cache_size': -64000,  # KiB of page cache per connection
+        'temp_store': 'MEMORY'  # sorts and temporary indexes stay off disk
+    }
+}
+
+# Tables taking many small writes, by the bind that moves them to a database of their own when named in
+# DB_SEPARATE_BINDS; SQLite lets one writer at a time into a file, so their bursts then stop delaying the rest
+SEPARATE_BINDS = {
+    'chat': ('carChats',),
+    'engagement': ('carcomments',)  # votes stay with posts: a vote updates its post's counters in the same transaction
+}
+
+def create_app():
+    """
+    Build the Flask app: its settings, then the extensions above bound to it.
+
+    This module calls it once and every other module shares the result (app below): main.py adds its
+    routes and the api blueprints to it, the models' seeders push its context. A second app would
+    bring a second engine, pool and CORS setup onto the same database.
+
+    Returns:
+        Flask: The configured app.
+    """
+    app = Flask(__name__,
+        static_url_path='',
+        static_folder='static',
+        template_folder='templates'
+    )
+
+    # System Defaults
+    app.config['ADMIN_USER'] = os.environ.get('ADMIN_USER') or 'admin'
+    app.config['ADMIN_PASSWORD'] = os.environ.get('ADMIN_PASSWORD') or os.environ.get('DEFAULT_PASSWORD') or 'password'
+    app.config['DEFAULT_USER'] = os.environ.get('DEFAULT_USER') or 'user'
+    app.config['DEFAULT_PASSWORD'] = os.environ.get('DEFAULT_PASSWORD') or 'password'
+
+    # Password hashing settings
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256'  # hashes made with other parameters are upgraded at login
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1)  # concurrent hashes per process, 0 hashes inline
+    app.config['PASSWORD_HASH_BULK_WORKERS'] = int(os.environ.get('PASSWORD_HASH_BULK_WORKERS') or max(1, app.config['PASSWORD_HASH_WORKERS'] // 2))  # hashes per process for bulk imports, all imports together; 0 hashes inline
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE') or 4 * app.config['PASSWORD_HASH_WORKERS'])  # hashes allowed to wait before logins get 503
+    app.config['PASSWORD_HASH_RETRY_AFTER'] = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER') or 2)  # Retry-After seconds sent with 503
+
+    # Login admission control settings
+    app.config['LOGIN_THROTTLE_BACKEND'] = os.environ.get('LOGIN_THROTTLE_BACKEND') or 'memory'  # 'memory' per process, 'file' shared by workers
+    app.config['LOGIN_THROTTLE_PATH'] = os.environ.get('LOGIN_THROTTLE_PATH') or os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else app.instance_path, 'login_throttle.db')
+    app.config['LOGIN_THROTTLE_WINDOW'] = int(os.environ.get('LOGIN_THROTTLE_WINDOW') or 300)  # sliding window in seconds
+    app.config['LOGIN_MAX_PER_IP'] = int(os.environ.get('LOGIN_MAX_PER_IP') or 30)  # attempts per IP per window, 0 disables
+    app.config['LOGIN_MAX_PER_UID'] = int(os.environ.get('LOGIN_MAX_PER_UID') or 10)  # failed attempts per uid per window, 0 disables
+    app.config['LOGIN_THROTTLE_PROXIES'] = int(os.environ.get('LOGIN_THROTTLE_PROXIES') or 0)  # trusted proxies adding X-Forwarded-For
+
+    # Feed settings
+    app.config['FEED_HOT_DECAY'] = int(os.environ.get('FEED_HOT_DECAY') or 45000)  # seconds of age that cost a post 10x its vote balance
+    app.config['FEED_PAGE_SIZE'] = int(os.environ.get('FEED_PAGE_SIZE') or 20)  # posts per feed page when the client does not ask for a limit
+
+    # Browser settings
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'dev'  # secret key for session management
+    app.config['SESSION_COOKIE_NAME'] = os.environ.get('SESSION_COOKIE_NAME') or 'sess_python_flask'
+    app.config['CORS_ORIGINS'] = os.environ['CORS_ORIGINS'].split(',') if os.environ.get('CORS_ORIGINS') else CORS_ORIGINS  # origins allowed to call /api/* with credentials
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY') or app.config['SECRET_KEY']
+    app.config['JWT_ALGORITHM'] = 'HS256'
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
+    app.config['JWT_TOKEN_NAME'] = os.environ.get('JWT_TOKEN_NAME') or 'jwt_token'
+    app.config['JWT_CACHE_SIZE'] = int(os.environ.get('JWT_CACHE_SIZE') or 1024)  # verified tokens kept per process
+    app.config['JWT_CACHE_TTL'] = int(os.environ.get('JWT_CACHE_TTL') or 60)  # seconds a verified token is trusted
+
+    # Database settings 
+    dbName = 'user_management'
+    DB_ENDPOINT = os.environ.get('DB_ENDPOINT') or None
+    DB_USERNAME = os.environ.get('DB_USERNAME') or None
+    DB_PASSWORD = os.environ.get('DB_PASSWORD') or None
+
+    # Ensure volumes directory exists (instance/ is the directory containers mount)
+    volumes_dir = os.path.join(app.instance_path, 'volumes')
+    os.makedirs(volumes_dir, exist_ok=True)
+
+    if DB_ENDPOINT and DB_USERNAME and DB_PASSWORD:
+        # Production - Use MySQL
+        DB_PORT = os.environ.get('DB_PORT') or '3306'
+        DB_NAME = dbName
+        dbString = f'mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_ENDPOINT}:{DB_PORT}'
+        dbURI =  dbString + '/' + dbName
+        backupURI = None  # MySQL backup would require a different approach
+    else:
+        # Development - Use SQLite
+        dbString = 'sqlite:///' + os.path.join(volumes_dir, '')
+        dbURI = dbString + dbName + '.db'
+        backupURI = dbString + dbName + '_bak.db'
+
+    app.config['DB_ENDPOINT'] = DB_ENDPOINT
+    app.config['DB_USERNAME'] = DB_USERNAME
+    app.config['DB_PASSWORD'] = DB_PASSWORD
+    app.config['SQLALCHEMY_DATABASE_NAME'] = dbName
+    app.config['SQLALCHEMY_DATABASE_STRING'] = dbString
+    app.config['SQLALCHEMY_DATABASE_URI'] = dbURI
+    app.config['SQLALCHEMY_BACKUP_URI'] = backupURI
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_REPLICA_URI'] = os.environ.get('DB_REPLICA_URI') or None  # database the reads of GET requests go to, e.g. a MySQL read replica
+    app.config['DB_REPLICA_STICKY_SECONDS'] = int(os.environ.get('DB_REPLICA_STICKY_SECONDS') or 5)  # seconds a user's reads stay on the primary after they write, longer than the replica lag
+    app.config['DB_REPLICA_STICKY_COOKIE'] = os.environ.get('DB_REPLICA_STICKY_COOKIE') or 'db_primary_until'
+    app.config['DB_SEPARATE_BINDS'] = [name for name in (os.environ.get('DB_SEPARATE_BINDS') or '').split(',') if name]  # keys of SEPARATE_BINDS, e.g. "chat,engagement"
+    app.config['DB_TABLE_BINDS'] = {table: name for name in app.config['DB_SEPARATE_BINDS'] for table in SEPARATE_BINDS[name]}
+    app.config['SQLALCHEMY_BINDS'] = {
+        # DB_<NAME>_URI places a bind elsewhere; on SQLite it defaults to user_management_<name>.db next to the database
+        name: os.environ.get(f'DB_{name.upper()}_URI') or (dbString + f'{dbName}_{name}.db' if dbURI.startswith('sqlite') else dbURI)
+        for name in app.config['DB_SEPARATE_BINDS']
     }
-})
-
-# System Defaults
-app.config['ADMIN_USER'] = os.environ.get('ADMIN_USER') or 'admin'
-app.config['ADMIN_PASSWORD'] = os.environ.get('ADMIN_PASSWORD') or os.environ.get('DEFAULT_PASSWORD') or 'password'
-app.config['DEFAULT_USER'] = os.environ.get('DEFAULT_USER') or 'user'
-app.config['DEFAULT_PASSWORD'] = os.environ.get('DEFAULT_PASSWORD') or 'password'
-
-# Browser settings
-SECRET_KEY = os.environ.get('SECRET_KEY') or 'SECRET_KEY' # secret key for session management
-SESSION_COOKIE_NAME = os.environ.get('SESSION_COOKIE_NAME') or 'sess_python_flask'
-JWT_TOKEN_NAME = os.environ.get('JWT_TOKEN_NAME') or 'jwt_python_flask'
-app.config['SECRET_KEY'] = SECRET_KEY
-app.config['SESSION_COOKIE_NAME'] = SESSION_COOKIE_NAME 
-app.config['JWT_TOKEN_NAME'] = JWT_TOKEN_NAME 
-
-# Database settings 
-dbName = 'user_management'
-DB_ENDPOINT = os.environ.get('DB_ENDPOINT') or None
-DB_USERNAME = os.environ.get('DB_USERNAME') or None
-DB_PASSWORD = os.environ.get('DB_PASSWORD') or None
-
-# Ensure volumes directory exists
-volumes_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'volumes')
-os.makedirs(volumes_dir, exist_ok=True)
-
-if DB_ENDPOINT and DB_USERNAME and DB_PASSWORD:
-    # Production - Use MySQL
-    DB_PORT = '3306'
-    DB_NAME = dbName
-    dbString = f'mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_ENDPOINT}:{DB_PORT}'
-    dbURI =  dbString + '/' + dbName
-    backupURI = None  # MySQL backup would require a different approach
-else:
-    # Development - Use SQLite
-    dbString = 'sqlite:///' + os.path.join(volumes_dir, '')
-    dbURI = dbString + dbName + '.db'
-    backupURI = dbString + dbName + '_bak.db'
-
-app.config['DB_ENDPOINT'] = DB_ENDPOINT
-app.config['DB_USERNAME'] = DB_USERNAME
-app.config['DB_PASSWORD'] = DB_PASSWORD
-app.config['SQLALCHEMY_DATABASE_NAME'] = dbName
-app.config['SQLALCHEMY_DATABASE_STRING'] = dbString
-app.config['SQLALCHEMY_DATABASE_URI'] = dbURI
-app.config['SQLALCHEMY_BACKUP_URI'] = backupURI
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-
-# Image upload settings 
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # maximum size of uploaded content
-app.config['UPLOAD_EXTENSIONS'] = ['.jpg', '.png', '.gif']  # supported file types
-# os.system('rm -rf ' + os.path.join(app.instance_path, 'uploads'))
-app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# GITHUB settings
-app.config['GITHUB_API_URL'] = 'https://api.github.com'
-app.config['GITHUB_TOKEN'] = os.environ.get('GITHUB_TOKEN') or None
-app.config['GITHUB_TARGET_TYPE'] = os.environ.get('GITHUB_TARGET_TYPE') or 'user'
-app.config['GITHUB_TARGET_NAME'] = os.environ.get('GITHUB_TARGET_NAME') or 'nighthawkcoders'
-
-# KASM settings
-app.config['KASM_SERVER'] = os.environ.get('KASM_SERVER') or 'https://kasm.nighthawkcodingsociety.com'
-app.config['KASM_API_KEY'] = os.environ.get('KASM_API_KEY') or None
-app.config['KASM_API_KEY_SECRET'] = os.environ.get('KASM_API_KEY_SECRET') or None
+    if app.config['DB_REPLICA_URI']:
+        app.config['SQLALCHEMY_BINDS']['replica'] = app.config['DB_REPLICA_URI']
+    app.config['DB_SCHEMA_CHECK'] = os.environ.get('DB_SCHEMA_CHECK') or 'warn'  # at boot, a database not at the newest migration is 'warn'ed about, 'strict' refuses to start, 'off' skips the check
+    app.config['DB_INIT_LOCK_TIMEOUT'] = int(os.environ.get('DB_INIT_LOCK_TIMEOUT') or 300)  # seconds scripts/db_init.py waits for another host's initialization (MySQL)
+    app.config['SQLITE_PRAGMA_PROFILE'] = os.environ.get('SQLITE_PRAGMA_PROFILE') or 'production'  # a key of SQLITE_PRAGMA_PROFILES
+    app.config['SQLITE_PRAGMAS'] = {
+        **SQLITE_PRAGMA_PROFILES[app.config['SQLITE_PRAGMA_PROFILE']],
+        # SQLITE_PRAGMAS overrides single pragmas of the profile, e.g. "busy_timeout=10000,mmap_size=0"
+        **dict(item.split('=', 1) for item in (os.environ.get('SQLITE_PRAGMAS') or '').split(',') if item)
+    }
+
+    # Connection pool settings, per worker: workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay below MySQL's max_connections
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE') or 5)  # connections kept open
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW') or 10)  # connections opened beyond those under load, closed once returned
+    app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # whole seconds a request waits for a free connection before it fails
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE') or 1800)  # seconds before a connection is replaced, below the server's wait_timeout (MySQL)
+    app.config['DB_POOL_PRE_PING'] = (os.environ.get('DB_POOL_PRE_PING') or 'true').lower() not in ('0', 'false', 'no')  # check connections on checkout, replacing dropped ones instead of failing the request (MySQL)
+    app.config['DB_CONNECT_TIMEOUT'] = int(os.environ.get('DB_CONNECT_TIMEOUT') or 10)  # seconds to open a connection (MySQL)
+    app.config['DB_READ_TIMEOUT'] = int(os.environ.get('DB_READ_TIMEOUT') or 30)  # seconds a query may take to answer (MySQL)
+    app.config['DB_WRITE_TIMEOUT'] = int(os.environ.get('DB_WRITE_TIMEOUT') or 30)  # seconds a query may take to send (MySQL)
+    engine_options = {
+        'poolclass': TimedQueuePool,  # counts checkouts and waits for /health
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT']
+    }
+    if DB_ENDPOINT and DB_USERNAME and DB_PASSWORD:
+        engine_options.update({
+            'pool_recycle': app.config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+            'connect_args': {
+                'connect_timeout': app.config['DB_CONNECT_TIMEOUT'],
+                'read_timeout': app.config['DB_READ_TIMEOUT'],
+                'write_timeout': app.config['DB_WRITE_TIMEOUT']
+            }
+        })
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+    # Backup settings
+    app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR') or os.path.join(app.instance_path, 'backup')  # backups are written to timestamped directories here
+    app.config['BACKUP_BATCH_SIZE'] = int(os.environ.get('BACKUP_BATCH_SIZE') or 1000)  # rows fetched per round trip while streaming a table
+    app.config['BACKUP_SQLITE_PAGES'] = int(os.environ.get('BACKUP_SQLITE_PAGES') or -1)  # pages the SQLite online backup copies per step, -1 copies in one step (in WAL mode writers carry on meanwhile)
+    app.config['BACKUP_SQLITE_RESTARTS'] = int(os.environ.get('BACKUP_SQLITE_RESTARTS') or 3)  # times writes may restart a copy in steps before it is redone in one step
+    app.config['BACKUP_COMPRESS_LEVEL'] = int(os.environ.get('BACKUP_COMPRESS_LEVEL') or 6)  # gzip level of the table files
+
+    # Replication settings (WAL shipping of the SQLite database, see model/replication.py)
+    app.config['REPLICA_DIR'] = os.environ.get('REPLICA_DIR') or os.path.join(app.instance_path, 'replica')  # archive of snapshots and WAL segments
+    app.config['REPLICA_SYNC_INTERVAL'] = float(os.environ.get('REPLICA_SYNC_INTERVAL') or 1)  # seconds between WAL copies, the granularity of a point-in-time restore
+    app.config['REPLICA_CHECKPOINT_PAGES'] = int(os.environ.get('REPLICA_CHECKPOINT_PAGES') or 1000)  # WAL frames before the replicator checkpoints and restarts the WAL
+    app.config['REPLICA_SNAPSHOT_INTERVAL'] = float(os.environ.get('REPLICA_SNAPSHOT_INTERVAL') or 3600)  # seconds between compactions of the segments into a snapshot
+    app.config['REPLICA_RETENTION'] = float(os.environ.get('REPLICA_RETENTION') or 86400)  # seconds of history kept restorable
+
+    # Startup settings
+    app.config['IMPORT_REPORT_MS'] = float(os.environ.get('IMPORT_REPORT_MS') or 20)  # imports slower than this are listed at startup
+    app.config['LAZY_WARMUP_DELAY'] = float(os.environ.get('LAZY_WARMUP_DELAY') or 1)  # seconds after a worker's first request before heavy client libraries load, negative loads them on first use only
+
+    # Image upload settings 
+    app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # maximum size of uploaded content
+    app.config['UPLOAD_EXTENSIONS'] = ['.jpg', '.png', '.gif']  # supported file types
+    # os.system('rm -rf ' + os.path.join(app.instance_path, 'uploads'))
+    app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # GITHUB settings
+    app.config['GITHUB_API_URL'] = 'https://api.github.com'
+    app.config['GITHUB_TOKEN'] = os.environ.get('GITHUB_TOKEN') or None
+    app.config['GITHUB_TARGET_TYPE'] = os.environ.get('GITHUB_TARGET_TYPE') or 'user'
+    app.config['GITHUB_TARGET_NAME'] = os.environ.get('GITHUB_TARGET_NAME') or 'nighthawkcoders'
+
+    # KASM settings
+    app.config['KASM_SERVER'] = os.environ.get('KASM_SERVER') or 'https://kasm.nighthawkcodingsociety.com'
+    app.config['KASM_API_KEY'] = os.environ.get('KASM_API_KEY') or None
+    app.config['KASM_API_KEY_SECRET'] = os.environ.get('KASM_API_KEY_SECRET') or None
+
+    login_manager.init_app(app)
+    cors.init_app(app, supports_credentials=True, resources={
+        r"/api/*": {
+            "origins": app.config['CORS_ORIGINS'],
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
+            "expose_headers": ["*"],
+            "max_age": 3600
+        }
+    })
+    db.init_app(app)
+    migrate.init_app(app, db)
+    if app.config['DB_REPLICA_URI']:
+        init_read_replica(app)
+    return app
+
+def apply_sqlite_pragmas(connection, pragmas):
+    """
+    Set pragmas on a new SQLite connection.
+
+    Only journal_mode is stored in the database file, the others last as long as the connection, so
+    they are set on every connection the pool opens.
+
+    Args:
+        connection (sqlite3.Connection): The connection, outside any transaction.
+        pragmas (dict): Pragma name -> value, e.g. a profile of SQLITE_PRAGMA_PROFILES.
+    """
+    for name, value in pragmas.items():
+        try:
+            connection.execute(f"PRAGMA {name}={value}")
+        except sqlite3.OperationalError:
+            pass  # read-only connections keep the journal mode of the file
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection, app.config['SQLITE_PRAGMAS'])
+
+# Setup of key Flask object (app), the only one in the process
+app = create_app()
+
+def dispose_engines():
+    # gunicorn --preload forks after import: each worker opens its own connections rather than sharing the master's
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=dispose_engines)
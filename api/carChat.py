@@ -2,10 +2,10 @@ import jwt
 from flask import Blueprint, request, jsonify, current_app, Response, g
 from flask_restful import Api, Resource  # used for REST API building
 from flask import Blueprint
-from __init__ import app
+from __init__ import app, db
 from flask_restful import Resource, reqparse, Api
+from datetime import datetime, timezone
 from model.carChat import carChat
-from app import db
 from api.jwt_authorize import token_required
 import base64
 import json
@@ -16,9 +16,34 @@ carChat_api = Blueprint('carChat_api', __name__, url_prefix='/api')
 api = Api(carChat_api)
 
 class carChatResource(Resource):  # Renamed to avoid confusion with model
+    PAGE_SIZE = 50  # messages per response when the client does not ask for a limit
+    MAX_PAGE_SIZE = 200
+
     def get(self):
-        messages = carChat.query.all()
-        return [msg.read() for msg in messages], 200
+        """
+        Retrieve chat messages.
+
+        Pollers pass ?after_id=<id of the last message they hold> (or ?since=<ISO timestamp> before they
+        hold any) and get {"messages", "cursor", "has_more"} with only the newer messages, oldest first;
+        the cursor is the after_id of the next poll. ?limit= caps the page at MAX_PAGE_SIZE.
+        Without a cursor the whole history is returned as a list, as before.
+        """
+        after_id = request.args.get('after_id', type=int)
+        since = request.args.get('since')
+        if after_id is None and since is None:
+            return carChat.read_all(carChat.query.all()), 200
+
+        if after_id is None:
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                return {'message': 'since must be an ISO 8601 timestamp'}, 400
+            if since.tzinfo is not None:
+                # Timestamps are stored as naive UTC
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        limit = request.args.get('limit', default=self.PAGE_SIZE, type=int)
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        return carChat.read_since(after_id=after_id, since=since, limit=limit), 200
 
     @token_required()
     def post(self):
@@ -13,6 +13,8 @@ carComments_api = Blueprint('carComments_api', __name__, url_prefix='/api')
 api = Api(carComments_api)
 
 class CarCommentsAPI:
+    PAGE_SIZE = 20  # comments per page when the client does not ask for a limit
+    MAX_PAGE_SIZE = 100
 
     class _CRUD(Resource):
         @token_required()
@@ -33,14 +35,28 @@ class CarCommentsAPI:
             return jsonify(comment.read())
         
         def get(self):
+            """
+            Retrieve comments.
 
-            comments = CarComments.query.all()
+            With ?post_id=<id> returns one page of that post's comments, oldest first, as
+            {"post_id", "comments", "total", "next_cursor"}; pass next_cursor back as ?cursor= for the
+            next page and ?limit= (at most MAX_PAGE_SIZE) to change the page size.
+            Without post_id returns every comment, as before.
+            """
+            post_id = request.args.get('post_id', type=int)
+            if post_id is None:
+                # Legacy: the whole table, with the authors fetched in one query
+                return jsonify(CarComments.read_all(CarComments.query.all()))
+
+            limit = request.args.get('limit', default=CarCommentsAPI.PAGE_SIZE, type=int)
+            limit = max(1, min(limit, CarCommentsAPI.MAX_PAGE_SIZE))
+            try:
+                page = CarComments.read_page(post_id, limit=limit, cursor=request.args.get('cursor'))
+            except ValueError:
+                return {'message': 'Invalid cursor'}, 400
 
-            if comments is None:
-                return Response("{'message': 'Comment not found'}", 404)
-            
             # Return response to the client in JSON format, converting Python dictionaries to JSON format
-            return jsonify([comment.read() for comment in comments])
+            return jsonify(page)
 
         @token_required()
         def put(self):
@@ -72,13 +72,11 @@ class CarPostAPI:
             return jsonify(post.read())
         
         def get(self):
-            posts = CarPost.query.all()
+            # Serialize all posts, with the users they reference fetched in one query
+            posts = CarPost.read_all()
 
-            if posts is None:
-                return Response("{'message': 'Post not found'}", 404)
-                                                                                                                                                               
             # Return response to the client in JSON format, converting Python dictionaries to JSON format
-            return jsonify([post.read() for post in posts])
+            return jsonify(posts)
 
         @token_required()
         def put(self):
@@ -112,7 +110,7 @@ class CarPostAPI:
                 return jsonify({"message": "Post deleted",
                             "deleted": True})
 
-            if current_user.id != post.read()['user']['id']:
+            if current_user.id != post._uid:
                 return jsonify({"message": "Post not deleted wrong user",
                                 "deleted": False})
             # Delete the post using the ORM method defined in the model
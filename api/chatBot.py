@@ -1,17 +1,19 @@
 from flask import Blueprint
 from flask_restful import Api, Resource
-import google.generativeai as genai
 from dotenv import load_dotenv
+import functools
 import os
 
+from api.lazy import lazy_import
+
 load_dotenv()
 
 # Create a Blueprint for the VIN decoding functionality
 chatbot_api = Blueprint('chatbot_api', __name__, url_prefix='/api')
 api = Api(chatbot_api)
 
-# Configure the API key (ensure the API_KEY environment variable is set)
-genai.configure(api_key=os.getenv('CHATBOT_API_KEY'))
+# google.generativeai (with gRPC and protobuf) takes close to a second to import, load it on the first chat
+genai = lazy_import("google.generativeai")
 
 # Create the model with the configuration
 generation_config = {
@@ -22,15 +24,23 @@ generation_config = {
     "response_mime_type": "text/plain",
 }
 
-model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash",
-    generation_config=generation_config,
-    system_instruction=(
-        "You are a car expert and enthusiast. You know the answer to every question about cars."
-        "You speak in concise and clear sentences and maintain MINIMAL sentences."
-        "You DO NOT give responses longer than 4 sentences."
-    ),
-)
+@functools.lru_cache(maxsize=1)
+def chat_model():
+    """
+    Returns:
+        genai.GenerativeModel: The chat model, configured on first use.
+    """
+    # Configure the API key (ensure the API_KEY environment variable is set)
+    genai.configure(api_key=os.getenv('CHATBOT_API_KEY'))
+    return genai.GenerativeModel(
+        model_name="gemini-1.5-flash",
+        generation_config=generation_config,
+        system_instruction=(
+            "You are a car expert and enthusiast. You know the answer to every question about cars."
+            "You speak in concise and clear sentences and maintain MINIMAL sentences."
+            "You DO NOT give responses longer than 4 sentences."
+        ),
+    )
 
 class _Chatbot(Resource):
     def __init__(self):
@@ -47,7 +57,7 @@ class _Chatbot(Resource):
 
         try:
             # Start the chat session
-            chat_session = model.start_chat(history=self.history)
+            chat_session = chat_model().start_chat(history=self.history)
 
             # Get the response from the model
             response = chat_session.send_message(user_input)
@@ -1,30 +1,333 @@
 from flask import request
-from flask import current_app, g
+from flask import current_app, g, abort
 from functools import wraps
+from datetime import datetime, timedelta
+from werkzeug.local import LocalProxy
+from threading import Lock
+from cachetools import TTLCache
+from sqlalchemy.orm import make_transient_to_detached
+import time
 import jwt
+from __init__ import app, db
 from model.user import User
 
-def token_required(roles=None):
+class TokenCache:
+    """
+    Per-process cache of verified tokens.
+
+    Maps a raw JWT (the cookie value) to its decoded claims and a detached snapshot of the user
+    it resolved to, so repeated requests with the same cookie skip both jwt.decode and the users query.
+    Entries expire after a fixed TTL, never outlive the token's own "exp" claim, and the cache holds
+    at most maxsize tokens (least recently used are evicted first).
+
+    Attributes:
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that had to decode the token and query the database.
+        invalidations (int): Number of entries dropped because the underlying user changed.
+    """
+    def __init__(self, maxsize=1024, ttl=60):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._token_versions = {}  # user id -> current token version, None once the user is deleted
+
+    def get(self, token):
+        """
+        Look up a token.
+
+        Returns:
+            tuple: (claims, snapshot) for a live entry, or None on a miss.
+        """
+        with self._lock:
+            entry = self._cache.get(token)
+            if entry is not None and entry[0].get("exp", float("inf")) <= time.time():
+                # Token expired while cached, let jwt.decode report it
+                del self._cache[token]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, token, claims, user):
+        """
+        Cache the claims for a token along with a detached copy of its user.
+
+        Args:
+            token (str): The raw JWT.
+            claims (dict): The decoded token payload.
+            user (User): The persistent user the token resolved to.
+        """
+        snapshot = _snapshot(user)
+        with self._lock:
+            self._cache[token] = (claims, snapshot)
+
+    def invalidate(self, user_id, token_version=None, deleted=False):
+        """
+        Drop every cached token that resolved to the given user.
+
+        Args:
+            user_id (int): The id of the user whose data changed.
+            token_version (int, optional): The user's current token version. Claims-only requests handled by
+                this process reject tokens carrying any other version from now on.
+            deleted (bool): True when the user was deleted, every token for it is rejected from now on.
+        """
+        with self._lock:
+            stale = [token for token, (_, snapshot) in self._cache.items() if snapshot.id == user_id]
+            for token in stale:
+                del self._cache[token]
+            self.invalidations += len(stale)
+            if deleted:
+                self._token_versions[user_id] = None
+            elif token_version is not None:
+                self._token_versions[user_id] = token_version
+
+    def is_revoked(self, claims):
+        """
+        Check claims against the token versions this process has seen change.
+
+        Args:
+            claims (dict): A decoded token payload with "id" and "tv" claims.
+
+        Returns:
+            bool: True if the token was revoked by a password or role change, or by deleting the user.
+        """
+        with self._lock:
+            if claims["id"] not in self._token_versions:
+                return False
+            current = self._token_versions[claims["id"]]
+            # Only ever compare forward: a stale entry must not reject tokens issued after it
+            return current is None or claims["tv"] < current
+
+    def clear(self):
+        """
+        Drop all cached tokens.
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Cache size and hit/miss/invalidation counters, for monitoring.
+        """
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl": self._cache.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations
+            }
+
+def _snapshot(user):
+    """
+    Copy the column values of a user into a new instance that is not attached to any session.
+
+    The snapshot is shared between threads, so it is never handed to a request directly; each hit merges it
+    into the request's own session instead.
+    """
+    snapshot = User.__mapper__.class_manager.new_instance()
+    for column in User.__mapper__.column_attrs:
+        setattr(snapshot, column.key, getattr(user, column.key))
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+token_cache = TokenCache(maxsize=app.config['JWT_CACHE_SIZE'], ttl=app.config['JWT_CACHE_TTL'])
+
+# Claims a token needs for authorization without a database lookup
+AUTHZ_CLAIMS = ("id", "role", "tv")
+
+def encode_token(user, expires_in=3600):
+    """
+    Issue a JWT for a user.
+
+    Besides "_uid", the token carries the user id, role and token version, which lets
+    token_required(claims_only=True) authorize a request without loading the user.
+
+    Args:
+        user (User): The user the token is issued for.
+        expires_in (int, optional): Seconds until the token expires. Defaults to one hour.
+
+    Returns:
+        str: The encoded token.
+    """
+    return jwt.encode(
+        {
+            "_uid": user._uid,
+            "id": user.id,
+            "role": user.role,
+            "tv": user.token_version,
+            "exp": datetime.utcnow() + timedelta(seconds=expires_in)
+        },
+        _secret_key(),
+        algorithm="HS256"
+    )
+
+class AuthError(Exception):
+    """
+    Raised when the request's token does not resolve to an authenticated user.
+
+    Attributes:
+        status (int): The HTTP status to answer with.
+        body (dict): The JSON body to answer with.
+    """
+    def __init__(self, message, error="Unauthorized", status=401, data=None):
+        super().__init__(message)
+        self.status = status
+        self.body = {"message": message, "error": error}
+        if data is not None:
+            self.body["data"] = data
+
+def _secret_key():
+    return current_app.config.get("JWT_SECRET_KEY") or current_app.config["SECRET_KEY"]
+
+def get_token():
+    """
+    Find the request's JWT, in an "Authorization: Bearer" header or else in the JWT cookie.
+
+    Returns:
+        str: The raw token, or None if the request carries none.
+    """
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer ") and len(auth_header) > len("Bearer "):
+        return auth_header[len("Bearer "):]
+    return request.cookies.get(current_app.config["JWT_TOKEN_NAME"])
+
+def _decode(token):
+    """
+    Verify a token, from the token cache when possible.
+
+    Returns:
+        tuple: (claims, cache entry), the entry is None when the token was not cached.
+    """
+    try:
+        cached = token_cache.get(token)
+        data = cached[0] if cached else jwt.decode(token, _secret_key(), algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        raise AuthError("Token has expired")
+    except jwt.InvalidTokenError:
+        raise AuthError("Invalid token")
+    if all(claim in data for claim in AUTHZ_CLAIMS) and token_cache.is_revoked(data):
+        raise AuthError("Token has been revoked")
+    return data, cached
+
+def _load_user(token, data, cached):
+    """
+    Load the user a verified token belongs to, from the token cache entry _decode found when there was one.
+
+    Returns:
+        User: The user, attached to this request's session.
+    """
+    if cached:
+        # Attach a copy to this request's session without a SELECT
+        return db.session.merge(cached[1], load=False)
+    if "id" in data:
+        user = db.session.get(User, data["id"])
+    else:
+        # Tokens issued before the id claim existed
+        user = User.query.filter_by(_uid=data["_uid"]).first()
+    if user is None:
+        raise AuthError("User not found", data=data)
+    if "tv" in data and user.token_version != data["tv"]:
+        raise AuthError("Token has been revoked")
+    token_cache.put(token, data, user)
+    return user
+
+def resolve_identity(load_user=True):
+    """
+    Resolve the identity behind the current request, at most once per request.
+
+    The token is looked up and verified on the first call, and the user loaded on the first call that
+    needs it; both results, failures included, are kept in Flask's g object for the rest of the request.
+    token_required, the lazy g.current_user proxy and Flask-Login's loaders all go through here, so no
+    request decodes its token or queries the users table twice.
+
+    Args:
+        load_user (bool, optional): Also load the User. Defaults to True.
+
+    Returns:
+        tuple: (claims, user), user is None when it was not requested and not loaded before.
+
+    Raises:
+        AuthError: The request carries no valid token, or its user is gone or revoked the token.
+    """
+    if "auth" not in g:
+        g.auth = {"token": get_token(), "claims": None, "cached": None, "user": None, "error": None}
+        if g.auth["token"] is None:
+            g.auth["error"] = AuthError("Token is missing")
+        else:
+            try:
+                # One cache lookup per request, shared with _load_user below
+                g.auth["claims"], g.auth["cached"] = _decode(g.auth["token"])
+            except AuthError as e:
+                g.auth["error"] = e
+    auth = g.auth
+    if auth["error"] is None and load_user and auth["user"] is None:
+        try:
+            auth["user"] = _load_user(auth["token"], auth["claims"], auth["cached"])
+        except AuthError as e:
+            auth["error"] = e
+    if auth["error"] is not None:
+        raise auth["error"]
+    return auth["claims"], auth["user"]
+
+def authenticated_user():
+    """
+    The user behind the current request's token, for callers that treat a bad token as anonymous.
+
+    Returns:
+        User: The authenticated user, or None.
+    """
+    try:
+        return resolve_identity()[1]
+    except AuthError:
+        return None
+
+def _lazy_user():
+    """
+    Build a proxy for g.current_user that loads the user on first use.
+    A user that no longer exists, or whose token version moved past the token's, aborts the request with 401.
+    """
+    def load():
+        try:
+            return resolve_identity()[1]
+        except AuthError as e:
+            abort(e.status, str(e))
+    return LocalProxy(load)
+
+def token_required(roles=None, claims_only=False):
     """
     Guard API endpoints that require authentication.
 
     This function performs the following steps:
-    
-    1. Checks for the presence of a valid JWT token in the request cookie.
-    2. Decodes the token and retrieves the user data.
+
+    1. Checks for the presence of a valid JWT token in the Authorization header or the request cookie.
+    2. Looks the token up in the token cache, on a miss decodes the token and retrieves the user data.
     3. Checks if the user data is found in the database.
     4. Checks if the user has the required role.
     5. Sets the current_user in the global context (Flask's g object).
     6. Returns the decorated function if all checks pass.
 
+    Steps 1 to 3 run once per request in resolve_identity, whatever else asks for the user.
+
+    With claims_only=True, steps 3 and 4 use the claims in the token instead of the database: the role check
+    reads the "role" claim and g.current_user becomes a proxy that loads the user only when the guarded
+    function touches it. Tokens issued before these claims existed fall back to the database checks.
+
     Possible error responses:
-    
-    - 401 / Unauthorized: token is missing or invalid.
+
+    - 401 / Unauthorized: token is missing, invalid or revoked.
     - 403 / Forbidden: user has insufficient permissions.
     - 500 / Internal Server Error: something went wrong with the token decoding.
 
     Args:
         roles (list, optional): A list of roles that are allowed to access the endpoint. Defaults to None.
+        claims_only (bool, optional): Authorize from the token claims alone. Defaults to False.
 
     Returns:
         function: The decorated function if all checks pass.
@@ -32,42 +335,27 @@ def token_required(roles=None):
     def decorator(func_to_guard):
         @wraps(func_to_guard)
         def decorated(*args, **kwargs):
-            token = request.cookies.get(current_app.config["JWT_TOKEN_NAME"])
-            if not token:
-                return {
-                    "message": "Token is missing",
-                    "error": "Unauthorized"
-                }, 401
-
             try:
-                data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
-                current_user = User.query.filter_by(_uid=data["_uid"]).first()
-                if not current_user:
-                    return {
-                        "message": "User not found",
-                        "error": "Unauthorized",
-                        "data": data
-                    }, 401
+                data, _ = resolve_identity(load_user=False)
+                if claims_only and all(claim in data for claim in AUTHZ_CLAIMS):
+                    # Authorize from the claims, the user is loaded only if the guarded function touches it
+                    current_user = _lazy_user()
+                    role = data["role"]
+                else:
+                    _, current_user = resolve_identity()
+                    role = current_user.role
 
-                if roles and current_user.role not in roles:
+                if roles and role not in roles:
                     return {
                         "message": "User does not have the required role",
                         "error": "Forbidden",
                         "data": data
                     }, 403
-                    
+
                 # Authentication succes, set the current_user in the global context (Flask's g object)
                 g.current_user = current_user
-            except jwt.ExpiredSignatureError:
-                return {
-                    "message": "Token has expired",
-                    "error": "Unauthorized"
-                }, 401
-            except jwt.InvalidTokenError:
-                return {
-                    "message": "Invalid token",
-                    "error": "Unauthorized"
-                }, 401
+            except AuthError as e:
+                return e.body, e.status
             except Exception as e:
                 return {
                     "message": "An error occurred",
@@ -77,4 +365,4 @@ def token_required(roles=None):
             # Call back to the guarded function if all checks pass
             return func_to_guard(*args, **kwargs)
         return decorated
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,128 @@
+""" lazy.py
+Deferred loading of heavy client libraries, and a record of what importing the app costs.
+
+Some endpoints need large client libraries (google.generativeai pulls in gRPC and protobuf, close to
+a second of imports) that most requests never touch. An api module names them with lazy_import
+instead of importing them: the module object it gets back imports the real one on first attribute
+access, so a worker boots without them. Once the worker serves its first request, a background
+thread imports them anyway, so the first hit to those endpoints rarely pays for it either.
+
+timed_import imports a module and records how long that took, so main.py can report the slowest
+imports at startup and in /health.
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Module name -> seconds its import took, in the order they were imported
+import_costs = {}
+_lazy_modules = []
+
+
+def timed_import(name):
+    """
+    Import a module, recording the cost of a first import in import_costs.
+
+    Returns:
+        module: The module.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    import_costs[name] = time.perf_counter() - start
+    return module
+
+
+class LazyModule:
+    """
+    Stands in for a module until one of its attributes is used.
+
+    Attributes:
+        name (str): The module to import.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._module = None
+
+    def load(self):
+        # importlib holds the import lock, concurrent first uses import once
+        if self._module is None:
+            self._module = timed_import(self.name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.name}' ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+def lazy_import(name):
+    """
+    A module that is imported on first use, and by warm_up.
+
+    Args:
+        name (str): The module, e.g. "google.generativeai".
+
+    Returns:
+        LazyModule: Use it like the module.
+    """
+    module = LazyModule(name)
+    _lazy_modules.append(module)
+    return module
+
+
+def warm_up():
+    """
+    Import every lazy module not loaded yet.
+    """
+    for module in _lazy_modules:
+        try:
+            module.load()
+        except Exception as e:
+            print(f"Warning: warming up {module.name} failed: {e}")
+
+
+def schedule_warm_up(app, delay):
+    """
+    Start warm_up in a background thread once a process serves its first request.
+
+    Waiting for a request keeps the thread out of gunicorn's preloading master: a thread importing
+    while the master forks would leave the import lock held in the workers.
+
+    Args:
+        app (Flask): The app whose first request starts the thread.
+        delay (float): Seconds the thread waits before importing; negative disables warm-up.
+    """
+    if delay < 0:
+        return
+    started = {"pid": None}
+    lock = threading.Lock()
+
+    @app.before_request
+    def start_warm_up():
+        if started["pid"] == os.getpid():
+            return
+        with lock:
+            if started["pid"] == os.getpid():
+                return
+            started["pid"] = os.getpid()
+        timer = threading.Timer(delay, warm_up)
+        timer.daemon = True
+        timer.start()
+
+
+def slowest_imports(count=10):
+    """
+    Returns:
+        dict: The count slowest recorded imports, module name -> milliseconds.
+    """
+    slowest = sorted(import_costs.items(), key=lambda item: item[1], reverse=True)[:count]
+    return {name: round(seconds * 1000, 1) for name, seconds in slowest}
@@ -0,0 +1,232 @@
+""" login_throttle.py
+Admission control for /api/authenticate.
+
+Every login attempt costs a users query and a full pbkdf2 check, which makes the login endpoint
+the cheapest way to burn CPU. LoginThrottle counts attempts per client IP and failed attempts
+per uid in sliding windows and turns attempts over the limits away before any of that work runs.
+
+Counts live in this process by default ("memory" backend). The "file" backend keeps them in a
+small SQLite file so every gunicorn worker on the host shares them; pointing LOGIN_THROTTLE_PATH
+at /dev/shm keeps that file in shared memory.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from __init__ import app
+
+
+class MemoryWindowStore:
+    """
+    Per-process window counts.
+
+    Each key keeps the count of the current and the previous window only, so memory stays
+    proportional to the number of keys seen in the last two windows.
+    """
+    def __init__(self, max_keys=100000):
+        self._counts = {}  # key -> [window index, count, previous count]
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def _advance(self, key, index):
+        entry = self._counts.get(key)
+        if entry is None:
+            return [index, 0, 0]
+        if entry[0] == index:
+            return entry
+        previous = entry[1] if entry[0] == index - 1 else 0
+        return [index, 0, previous]
+
+    def counts(self, key, index):
+        """
+        Returns:
+            tuple: (count in window index, count in window index - 1) for the key.
+        """
+        with self._lock:
+            entry = self._advance(key, index)
+            return entry[1], entry[2]
+
+    def incr(self, key, index):
+        """
+        Adds one to the key's count in window index.
+        """
+        with self._lock:
+            if key not in self._counts and len(self._counts) >= self.max_keys:
+                self._prune(index)
+            entry = self._advance(key, index)
+            entry[1] += 1
+            self._counts[key] = entry
+
+    def reset(self, key):
+        with self._lock:
+            self._counts.pop(key, None)
+
+    def _prune(self, index):
+        stale = [key for key, entry in self._counts.items() if entry[0] < index - 1]
+        for key in stale:
+            del self._counts[key]
+        if len(self._counts) >= self.max_keys:
+            # Still full of live keys, forget the oldest half rather than grow without bound
+            for key in sorted(self._counts, key=lambda k: self._counts[k][0])[:self.max_keys // 2]:
+                del self._counts[key]
+
+    def __len__(self):
+        return len(self._counts)
+
+
+class FileWindowStore:
+    """
+    Window counts in a SQLite file shared by all processes on the host.
+
+    Counters are disposable, so the file runs without fsync; each thread (and each forked worker)
+    opens its own connection.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._pruned = None
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE IF NOT EXISTS login_windows (key TEXT, idx INTEGER, count INTEGER, PRIMARY KEY (key, idx))")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def counts(self, key, index):
+        rows = dict(self._connect().execute(
+            "SELECT idx, count FROM login_windows WHERE key = ? AND idx IN (?, ?)", (key, index, index - 1)
+        ).fetchall())
+        return rows.get(index, 0), rows.get(index - 1, 0)
+
+    def incr(self, key, index):
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO login_windows (key, idx, count) VALUES (?, ?, 1) "
+            "ON CONFLICT (key, idx) DO UPDATE SET count = count + 1", (key, index)
+        )
+        if self._pruned != index:
+            # Once per window, drop windows too old to matter
+            self._pruned = index
+            conn.execute("DELETE FROM login_windows WHERE idx < ?", (index - 1,))
+
+    def reset(self, key):
+        self._connect().execute("DELETE FROM login_windows WHERE key = ?", (key,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(DISTINCT key) FROM login_windows").fetchone()[0]
+
+
+class LoginThrottle:
+    """
+    Sliding-window limits on login attempts.
+
+    A window's count is estimated from the current and previous fixed windows, weighting the
+    previous one by how much of it still overlaps the sliding window.
+
+    Attributes:
+        window (int): Length of the sliding window in seconds.
+        max_per_ip (int): Attempts allowed from one IP per window (0 disables the limit).
+        max_per_uid (int): Failed attempts allowed for one uid per window (0 disables the limit).
+    """
+    def __init__(self, store, window=300, max_per_ip=30, max_per_uid=10):
+        self.store = store
+        self.window = window
+        self.max_per_ip = max_per_ip
+        self.max_per_uid = max_per_uid
+        self._lock = threading.Lock()
+        self._stats = {"allowed": 0, "rejected_ip": 0, "rejected_uid": 0, "failures": 0}
+
+    def _count(self, key, now):
+        index, offset = divmod(now, self.window)
+        current, previous = self.store.counts(key, int(index))
+        return current + previous * (1 - offset / self.window)
+
+    def _retry_after(self, now):
+        return max(1, math.ceil(self.window - now % self.window))
+
+    def _bump(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def admit(self, ip, uid):
+        """
+        Decide whether a login attempt may proceed, counting it against the IP when it does.
+
+        Args:
+            ip (str): The client address.
+            uid (str): The uid the client is trying to log in as.
+
+        Returns:
+            int: None if the attempt may proceed, otherwise the seconds the client should wait.
+        """
+        now = time.time()
+        if self.max_per_uid and self._count("uid:" + uid, now) >= self.max_per_uid:
+            self._bump("rejected_uid")
+            return self._retry_after(now)
+        if self.max_per_ip and self._count("ip:" + ip, now) >= self.max_per_ip:
+            self._bump("rejected_ip")
+            return self._retry_after(now)
+        self.store.incr("ip:" + ip, int(now // self.window))
+        self._bump("allowed")
+        return None
+
+    def failed(self, uid):
+        """
+        Count a failed attempt (unknown uid or wrong password) against the uid.
+        """
+        self.store.incr("uid:" + uid, int(time.time() // self.window))
+        self._bump("failures")
+
+    def succeeded(self, uid):
+        """
+        Clear the failures of a uid once its owner logs in.
+        """
+        self.store.reset("uid:" + uid)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Limits, counters since startup and the number of keys tracked, for monitoring.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "window": self.window,
+            "max_per_ip": self.max_per_ip,
+            "max_per_uid": self.max_per_uid,
+            "tracked_keys": len(self.store)
+        })
+        return stats
+
+
+def client_ip(request):
+    """
+    The client address of a request, looking through LOGIN_THROTTLE_PROXIES trusted proxies.
+
+    Only the entries appended by trusted proxies are used, a client can put anything in front of them.
+    """
+    proxies = app.config['LOGIN_THROTTLE_PROXIES']
+    route = request.access_route
+    if proxies and len(route) >= proxies:
+        return route[-proxies]
+    return request.remote_addr or "unknown"
+
+
+if app.config['LOGIN_THROTTLE_BACKEND'] == 'file':
+    _store = FileWindowStore(app.config['LOGIN_THROTTLE_PATH'])
+else:
+    _store = MemoryWindowStore()
+
+login_throttle = LoginThrottle(
+    _store,
+    window=app.config['LOGIN_THROTTLE_WINDOW'],
+    max_per_ip=app.config['LOGIN_MAX_PER_IP'],
+    max_per_uid=app.config['LOGIN_MAX_PER_UID']
+)
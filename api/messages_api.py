@@ -1,9 +1,11 @@
 # by P5 G1
 from flask import Blueprint, request, jsonify
 from flask_restful import Api, Resource
-import requests
+from api.lazy import lazy_import
 import json
 
+requests = lazy_import("requests")  # imported on the first outgoing call
+
 # Create a Blueprint for the messages API
 messages_api = Blueprint('messages_api', __name__, url_prefix='/api')
 api = Api(messages_api)
@@ -1,5 +1,6 @@
 import jwt
-from flask import Blueprint, request, jsonify, current_app, Response, g
+import json
+from flask import Blueprint, request, jsonify, current_app, Response, g, stream_with_context
 from flask_restful import Api, Resource  # used for REST API building
 from datetime import datetime
 from __init__ import app
@@ -129,50 +130,42 @@ class PostAPI:
             """
             # Obtain the current user
             current_user = g.current_user
-            # Find all the posts by the current user
-            posts = Post.query.filter(Post._user_id == current_user.id).all()
-            # Prepare a JSON list of all the posts, using list comprehension
-            json_ready = [post.read() for post in posts]
+            # Find and serialize all the posts by the current user, with their authors and channels in one query
+            json_ready = Post.read_all(Post.query.filter(Post._user_id == current_user.id))
             # Return a JSON list, converting Python dictionaries to JSON format
             return jsonify(json_ready)
 
     class _BULK_CRUD(Resource):
+        @token_required()
         def post(self):
             """
-            Handle bulk post creation by sending POST requests to the single post endpoint.
+            Handle bulk post creation in one transaction.
+
+            The response streams one JSON line per row once the transaction is over ({"row", "id"} or {"row", "error"})
+            followed by a summary line {"committed", "success_count", "error_count"}. Rows without an author
+            are posted as the current user; only Admins may post as someone else.
             """
+            current_user = g.current_user
             posts = request.get_json()
 
             if not isinstance(posts, list):
                 return {'message': 'Expected a list of post data'}, 400
-
-            results = {'errors': [], 'success_count': 0, 'error_count': 0}
-
-            with current_app.test_client() as client:
-                for post in posts:
-                    # Simulate a POST request to the single post creation endpoint
-                    response = client.post('/api/post', json=post)
-
-                    if response.status_code == 200:
-                        results['success_count'] += 1
-                    else:
-                        results['errors'].append(response.get_json())
-                        results['error_count'] += 1
-
-            # Return the results of the bulk creation process
-            return jsonify(results)
+            if current_user.role != 'Admin' and any(
+                isinstance(post, dict) and (post.get('user_id') is not None or post.get('uid') is not None or post.get('user_name') is not None)
+                for post in posts
+            ):
+                return {'message': 'Only Admins may create posts for other users'}, 403
+
+            results = Post.import_many(posts, current_user.id)
+            lines = (json.dumps(result) + "\n" for result in results)
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
         
         def get(self):
             """
             Retrieve all posts.
             """
-            # Find all the posts
-            posts = Post.query.all()
-            # Prepare a JSON list of all the posts, using list comprehension
-            json_ready = []
-            for post in posts:
-                post_data = post.read()
-                json_ready.append(post_data)
+            # Find and serialize all the posts, with their authors and channels in one query
+            json_ready = Post.read_all()
             # Return a JSON list, converting Python dictionaries to JSON format
             return jsonify(json_ready)
 
@@ -189,13 +182,28 @@ class PostAPI:
             if 'channel_id' not in data:
                 return {'message': 'Channel ID not found'}, 400
             
-            # Find all posts by channel ID and user ID
-            posts = Post.query.filter_by(_channel_id=data['channel_id']).all()
-            # Prepare a JSON list of all the posts, using list comprehension
-            json_ready = [post.read() for post in posts]
+            # Find and serialize all posts by channel ID, with their authors and channels in one query
+            json_ready = Post.read_all(Post.query.filter_by(_channel_id=data['channel_id']))
             # Return a JSON list, converting Python dictionaries to JSON format
             return jsonify(json_ready)
 
+    class _FEED(Resource):
+        def get(self):
+            """
+            Retrieve one page of the hot or top feed, e.g. /posts/feed?sort=hot&channel_id=1&limit=20.
+            Pass the returned next_cursor back as cursor to read the following page.
+            """
+            sort = request.args.get('sort', 'hot')
+            channel_id = request.args.get('channel_id', type=int)
+            limit = request.args.get('limit', default=app.config['FEED_PAGE_SIZE'], type=int)
+            limit = max(1, min(limit, 100))
+            try:
+                page = Post.feed(sort=sort, channel_id=channel_id, limit=limit, cursor=request.args.get('cursor'))
+            except ValueError as e:
+                return {'message': str(e)}, 400
+            # Return a JSON restful response to the client
+            return jsonify(page)
+
     """
     Map the _CRUD, _USER, _BULK_CRUD, and _FILTER classes to the API endpoints for /post, /post/user, /posts, and /posts/filter.
     - The API resource class inherits from flask_restful.Resource.
@@ -203,8 +211,10 @@ class PostAPI:
     - The _USER class defines the endpoints for retrieving posts by the current user.
     - The _BULK_CRUD class defines the bulk operations for the API.
     - The _FILTER class defines the endpoints for filtering posts by channel ID and user ID.
+    - The _FEED class defines the hot and top feeds, globally or per channel.
     """
     api.add_resource(_CRUD, '/post')
     api.add_resource(_USER, '/post/user')
     api.add_resource(_BULK_CRUD, '/posts')
-    api.add_resource(_FILTER, '/posts/filter')
\ No newline at end of file
+    api.add_resource(_FILTER, '/posts/filter')
+    api.add_resource(_FEED, '/posts/feed')
\ No newline at end of file
@@ -2,9 +2,12 @@ import jwt
 from flask import Blueprint, request, jsonify, current_app, Response, g
 from flask_restful import Api, Resource  # used for REST API building
 from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
 from __init__ import app
-from api.jwt_authorize import token_required
+from api.jwt_authorize import token_required, encode_token
+from api.login_throttle import login_throttle, client_ip
 from model.user import User
+from model.hashing import HashPoolSaturated
 import json
 
 # Create a Blueprint for the user API
@@ -18,36 +21,26 @@ class UserAPI:
     """
     Define the API endpoints for the User model.
     """
+    MAX_IMPORT = 10000  # users accepted by one bulk import request
     class _BULK_CRUD(Resource):
         """
         Users API operation for bulk Create and Read.
         """
 
+        @token_required("Admin")
         def post(self):
             """
-            Handle bulk user creation by sending POST requests to the single user endpoint.
+            Handle bulk user creation, validating the whole list and inserting the valid users in one transaction.
+            Users without a password get the default password. Errors are reported per row.
             """
             users = request.get_json()
 
             if not isinstance(users, list):
                 return {'message': 'Expected a list of user data'}, 400
+            if len(users) > UserAPI.MAX_IMPORT:
+                return {'message': f'At most {UserAPI.MAX_IMPORT} users per request'}, 400
 
-            results = {'errors': [], 'success_count': 0, 'error_count': 0}
-
-            with current_app.test_client() as client:
-                for user in users:
-                    # Set a default password as we don't have it for bulk creation
-                    user["password"] = app.config['DEFAULT_PASSWORD']
-
-                    # Simulate a POST request to the single user creation endpoint
-                    response = client.post('/api/user', json=user)
-
-                    if response.status_code == 200:
-                        results['success_count'] += 1
-                    else:
-                        results['errors'].append(response.get_json())
-                        results['error_count'] += 1
-
+            results = User.import_many(users)
             return jsonify(results)
         
         @token_required()
@@ -119,11 +112,11 @@ class UserAPI:
                         "error": "Duplicate error"
                     }, 409
 
-                # Setup minimal USER OBJECT
-                user_obj = User(name=name, uid=uid)
+                # Setup minimal USER OBJECT, hashing the password once here
+                user_obj = User(name=name, uid=uid, password=password)
 
-                # Add user to database
-                user = user_obj.create(body)
+                # Add user to database, the remaining fields (pfp, ...) are applied by update
+                user = user_obj.create({key: value for key, value in body.items() if key != 'password'})
                 if not user:
                     return {
                         "message": "Failed to create user",
@@ -136,6 +129,11 @@ class UserAPI:
                 resp.headers.add('Access-Control-Allow-Credentials', 'true')
                 return resp
 
+            except HashPoolSaturated as e:
+                return {
+                    "message": str(e),
+                    "error": "Service unavailable"
+                }, 503, {"Retry-After": str(e.retry_after)}
             except Exception as e:
                 return {
                     "message": "An error occurred during signup",
@@ -150,29 +148,30 @@ class UserAPI:
             resp.headers.add('Access-Control-Allow-Origin', 'https://jacobcancode.github.io')
             resp.headers.add('Access-Control-Allow-Credentials', 'true')
             return resp
-    @token_required()
-    def put(self):
-        """
-        Update a user.
-        """
-        current_user = g.current_user
-        body = request.get_json()
 
-        # Admin-specific update handling
-        if current_user.role == 'Admin':
-            uid = body.get('uid')
-            user = current_user if uid is None or uid == current_user.uid else User.query.filter_by(_uid=uid).first()
-            if not user:
-                return {'message': f'User {uid} not found'}, 404
+        @token_required()
+        def put(self):
+            """
+            Update a user.
+            """
+            current_user = g.current_user
+            body = request.get_json()
 
-            user.update(body)
-            resp = jsonify(user.read())
-            resp.headers.add('Access-Control-Allow-Origin', 'https://jacobcancode.github.io')
-            resp.headers.add('Access-Control-Allow-Credentials', 'true')
-            return resp
+            # Admin-specific update handling
+            if current_user.role == 'Admin':
+                uid = body.get('uid')
+                user = current_user if uid is None or uid == current_user.uid else User.query.filter_by(_uid=uid).first()
+                if not user:
+                    return {'message': f'User {uid} not found'}, 404
+
+                user.update(body)
+                resp = jsonify(user.read())
+                resp.headers.add('Access-Control-Allow-Origin', 'https://jacobcancode.github.io')
+                resp.headers.add('Access-Control-Allow-Credentials', 'true')
+                return resp
 
-    @token_required("Admin")
-    def delete(self):
+        @token_required("Admin", claims_only=True)
+        def delete(self):
             """
             Delete a user.
             """
@@ -182,130 +181,143 @@ class UserAPI:
             if user is None:
                 return {'message': f'User {uid} not found'}, 404
             json = user.read()
-            user.delete()
+            try:
+                user.delete()
+            except IntegrityError:
+                return {
+                    "message": f"User {uid} still owns posts or other records",
+                    "error": "Conflict"
+                }, 409
             return f"Deleted user: {json}", 204  # use 200 to test with Postman
 
-class _Security(Resource):
-    """
-    Security-related API operations.
-    """
-
-    def post(self):
+    class _Security(Resource):
         """
-        Authenticate a user and generate a JWT token.
+        Security-related API operations.
         """
-        try:
-            body = request.get_json()
-            if not body:
-                return {
-                    "message": "Please provide user details",
-                    "error": "Bad request"
-                }, 400
 
-            # Get Data
-            uid = body.get('uid')
-            if uid is None:
-                return {
-                    "message": "User ID is missing",
-                    "error": "Validation error"
-                }, 401
-            password = body.get('password')
-            if not password:
-                return {
-                    "message": "Password is missing",
-                    "error": "Validation error"
-                }, 401
+        def post(self):
+            """
+            Authenticate a user and generate a JWT token.
+            """
+            try:
+                body = request.get_json()
+                if not body:
+                    return {
+                        "message": "Please provide user details",
+                        "error": "Bad request"
+                    }, 400
 
-            # Find user
-            user = User.query.filter_by(_uid=uid).first()
-            if user is None:
-                return {
-                    "message": "User not found",
-                    "error": "Authentication error"
-                }, 401
+                # Get Data
+                uid = body.get('uid')
+                if uid is None:
+                    return {
+                        "message": "User ID is missing",
+                        "error": "Validation error"
+                    }, 401
+                password = body.get('password')
+                if not password:
+                    return {
+                        "message": "Password is missing",
+                        "error": "Validation error"
+                    }, 401
 
-            if not user.is_password(password):
-                return {
-                    "message": "Invalid password",
-                    "error": "Authentication error"
-                }, 401
-
-            # Generate token
-            token = jwt.encode(
-                {
-                    "_uid": user._uid,
-                    "exp": datetime.utcnow() + timedelta(seconds=3600)
-                },
-                current_app.config["SECRET_KEY"],
-                algorithm="HS256"
-            )
-
-            # Return both token and user data in JSON
-            response_data = {
-                "message": f"Authentication for {user._uid} successful",
-                "token": token,
-                "user": user.read()
-            }
-
-            # ✅ Use jsonify for proper headers and encoding
-            resp = jsonify(response_data)
-
-            # ✅ Set the token as an HttpOnly cookie
-            resp.set_cookie(
-                current_app.config["JWT_TOKEN_NAME"],
-                token,
-                max_age=3600,
-                secure=True,
-                httponly=True,
-                path='/',
-                samesite='None',
-                domain='.github.io'
-            )
-
-            # ✅ CORS headers for GitHub Pages
-            resp.headers.add('Access-Control-Allow-Origin', 'https://jacobcancode.github.io')
-            resp.headers.add('Access-Control-Allow-Credentials', 'true')
-            resp.headers.add('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-            resp.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+                # Admission control, before any database or hashing work
+                retry_after = login_throttle.admit(client_ip(request), str(uid))
+                if retry_after:
+                    return {
+                        "message": "Too many login attempts, try again later",
+                        "error": "Too many requests"
+                    }, 429, {"Retry-After": str(retry_after)}
+
+                # Find user
+                user = User.query.filter_by(_uid=uid).first()
+                if user is None:
+                    login_throttle.failed(str(uid))
+                    return {
+                        "message": "User not found",
+                        "error": "Authentication error"
+                    }, 401
 
-            return resp
+                if not user.is_password(password):
+                    login_throttle.failed(str(uid))
+                    return {
+                        "message": "Invalid password",
+                        "error": "Authentication error"
+                    }, 401
+                login_throttle.succeeded(str(uid))
+
+                # Generate token
+                token = encode_token(user, expires_in=3600)
+
+                # Return both token and user data in JSON
+                response_data = {
+                    "message": f"Authentication for {user._uid} successful",
+                    "token": token,
+                    "user": user.read()
+                }
+
+                # ✅ Use jsonify for proper headers and encoding
+                resp = jsonify(response_data)
+
+                # ✅ Set the token as an HttpOnly cookie
+                resp.set_cookie(
+                    current_app.config["JWT_TOKEN_NAME"],
+                    token,
+                    max_age=3600,
+                    secure=True,
+                    httponly=True,
+                    path='/',
+                    samesite='None',
+                    domain='.github.io'
+                )
+
+                # ✅ CORS headers for GitHub Pages
+                resp.headers.add('Access-Control-Allow-Origin', 'https://jacobcancode.github.io')
+                resp.headers.add('Access-Control-Allow-Credentials', 'true')
+                resp.headers.add('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+                resp.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization')
 
-        except Exception as e:
-            print(f"Login error: {str(e)}")
-            return {
-                "message": "An error occurred during login",
-                "error": str(e)
-            }, 500
+                return resp
+
+            except HashPoolSaturated as e:
+                # Fail fast rather than queue behind the hashes already running
+                return {
+                    "message": str(e),
+                    "error": "Service unavailable"
+                }, 503, {"Retry-After": str(e.retry_after)}
+            except Exception as e:
+                print(f"Login error: {str(e)}")
+                return {
+                    "message": "An error occurred during login",
+                    "error": str(e)
+                }, 500
+
+        @token_required()
+        def delete(self):
+            """
+            Invalidate the current user's token by setting its expiry to 0.
+            """
+            current_user = g.current_user
+            try:
+                token = encode_token(current_user, expires_in=0)
+
+                resp = Response("Token invalidated successfully")
+                resp.set_cookie(
+                    current_app.config["JWT_TOKEN_NAME"],
+                    token,
+                    max_age=0,
+                    secure=True,
+                    httponly=True,
+                    path='/',
+                    samesite='None'
+                )
+                return resp
+            except Exception as e:
+                return {
+                    "message": "Failed to invalidate token",
+                    "error": str(e)
+                }, 500
 
-    @token_required()
-    def delete(self):
-        """
-        Invalidate the current user's token by setting its expiry to 0.
-        """
-        current_user = g.current_user
-        try:
-            token = jwt.encode(
-                {"_uid": current_user._uid, "exp": datetime.utcnow()},
-                current_app.config["SECRET_KEY"],
-                algorithm="HS256"
-            )
-
-            resp = Response("Token invalidated successfully")
-            resp.set_cookie(
-                current_app.config["JWT_TOKEN_NAME"],
-                token,
-                max_age=0,
-                secure=True,
-                httponly=True,
-                path='/',
-                samesite='None'
-            )
-            return resp
-        except Exception as e:
-            return {
-                "message": "Failed to invalidate token",
-                "error": str(e)
-            }, 500
     class _ID(Resource):  # Individual identification API operation
         @token_required()
         def get(self):
@@ -1,7 +1,9 @@
 from flask import Blueprint, jsonify
 from flask_restful import Api, Resource
 from flask import Blueprint, request, jsonify
-import requests
+from api.lazy import lazy_import
+
+requests = lazy_import("requests")  # imported on the first outgoing call
 
 # Create a Blueprint for the VIN decoding functionality
 vin_api = Blueprint('vin_api', __name__, url_prefix='/api')
@@ -1,12 +1,14 @@
 from flask import Blueprint, request, jsonify, Response, g
 from flask_restful import Api, Resource
-import requests
+from api.lazy import lazy_import
 from sqlalchemy.exc import SQLAlchemyError
 from __init__ import db
 from model.vehicle import Vehicle
 from api.jwt_authorize import token_required
 from model.user import User
 
+requests = lazy_import("requests")  # imported on the first outgoing call
+
 # Create a Blueprint for the VIN decoding functionality
 vinStore_api = Blueprint('vinStore_api', __name__, url_prefix='/api')
 api = Api(vinStore_api)
@@ -156,7 +158,7 @@ class VINDecodeAPI:
 
             return jsonify({"message": "Vehicle VIN updated successfully", "vehicle": vehicle.read()})
         
-        @token_required("Admin")
+        @token_required("Admin", claims_only=True)
         def delete(self):
             """
             Delete a vehicle record by VIN.
@@ -18,6 +18,7 @@ class VoteAPI:
     Define the API CRUD endpoints for the Vote model.
     There are operations for upvoting, downvoting, and retrieving votes for a post.
     """
+    MAX_BATCH = 200  # post ids accepted by /vote/posts in one request
 
     class _CRUD(Resource):
         @token_required()
@@ -37,21 +38,16 @@ class VoteAPI:
                 return {'message': 'Post ID is required'}, 400
             if 'vote_type' not in data or data['vote_type'] not in ['upvote', 'downvote']:
                 return {'message': 'Vote type must be "upvote" or "downvote"'}, 400
+            try:
+                post_id = int(data['post_id'])
+            except (TypeError, ValueError):
+                return {'message': 'Post ID must be an integer'}, 400
 
-            # Check if the vote already exists for the user on the post
-            existing_vote = Vote.query.filter_by(_post_id=data['post_id'], _user_id=current_user.id).first()
-            if existing_vote:
-                # Update the existing vote type
-                existing_vote._vote_type = data['vote_type']
-                existing_vote.create()  # This will commit the update
-                return jsonify(existing_vote.read())
-
-            # Create a new vote object
-            vote = Vote(data['vote_type'], current_user.id, data['post_id'])
-            # Save the vote using the ORM method
-            vote.create()
-            # Return the saved vote in JSON format
-            return jsonify(vote.read())
+            # Insert or flip the vote and update the post's counters, without reading the vote first
+            vote = Vote.cast(current_user.id, post_id, data['vote_type'])
+            if vote is None:
+                return {'message': 'Post not found'}, 404
+            return jsonify(vote)
 
         @token_required()
         def delete(self):
@@ -66,14 +62,14 @@ class VoteAPI:
             # Validate required fields
             if not data or 'post_id' not in data:
                 return {'message': 'Post ID is required'}, 400
+            try:
+                post_id = int(data['post_id'])
+            except (TypeError, ValueError):
+                return {'message': 'Post ID must be an integer'}, 400
 
-            # Find the vote by user and post
-            vote = Vote.query.filter_by(_post_id=data['post_id'], _user_id=current_user.id).first()
-            if vote is None:
+            # Delete the vote and take it off the post's counters
+            if not Vote.retract(current_user.id, post_id):
                 return {'message': 'Vote not found'}, 404
-
-            # Delete the vote
-            vote.delete()
             return jsonify({"message": "Vote removed"})
 
     class _POST_VOTES(Resource):
@@ -94,25 +90,42 @@ class VoteAPI:
 
             if not post_id:
                 return {'message': 'Post ID is required'}, 400
-
-            # Get all votes for the post
-            votes = Vote.query.filter_by(_post_id=post_id).all()
-            upvotes = [vote.read() for vote in votes if vote._vote_type == 'upvote']
-            downvotes = [vote.read() for vote in votes if vote._vote_type == 'downvote']
-
-            result = {
-                "post_id": post_id,
-                "upvote_count": len(upvotes),
-                "downvote_count": len(downvotes),
-                "upvotes": upvotes,
-                "downvotes": downvotes
-            }
+            try:
+                post_id = int(post_id)
+            except (TypeError, ValueError):
+                return {'message': 'Post ID must be an integer'}, 400
+
+            # Counts are aggregated in the database, the vote lists can be left out with include_votes=false
+            include_votes = request.args.get('include_votes', 'true').lower() != 'false'
+            result = Vote.read_for_posts([post_id], include_votes=include_votes)[0]
             return jsonify(result)
 
+    class _POSTS_VOTES(Resource):
+        def get(self):
+            """
+            Retrieve vote counts for many posts in one request, e.g. /vote/posts?post_ids=1,2,3.
+            Only the counts are returned unless include_votes=true.
+            """
+            try:
+                post_ids = [int(post_id) for post_id in request.args.get('post_ids', '').split(',') if post_id.strip()]
+            except ValueError:
+                return {'message': 'post_ids must be a comma separated list of integers'}, 400
+            if not post_ids:
+                return {'message': 'post_ids is required'}, 400
+            if len(post_ids) > VoteAPI.MAX_BATCH:
+                return {'message': f'At most {VoteAPI.MAX_BATCH} post ids per request'}, 400
+
+            # Duplicates are answered once
+            post_ids = list(dict.fromkeys(post_ids))
+            include_votes = request.args.get('include_votes', 'false').lower() == 'true'
+            return jsonify(Vote.read_for_posts(post_ids, include_votes=include_votes))
+
     """
-    Map the _CRUD and _POST_VOTES classes to the API endpoints for /vote and /vote/post.
+    Map the _CRUD, _POST_VOTES and _POSTS_VOTES classes to the API endpoints for /vote, /vote/post and /vote/posts.
     - The _CRUD class defines the HTTP methods for voting (post and delete).
     - The _POST_VOTES class defines the endpoint for retrieving all votes for a specific post.
+    - The _POSTS_VOTES class defines the endpoint for retrieving vote counts for many posts at once.
     """
     api.add_resource(_CRUD, '/vote')
     api.add_resource(_POST_VOTES, '/vote/post')
+    api.add_resource(_POSTS_VOTES, '/vote/posts')
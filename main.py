@@ -3,40 +3,21 @@ import json
 import os
 import ast
 from urllib.parse import urljoin, urlparse
-from flask import Flask, request, jsonify, render_template, redirect, url_for, send_from_directory, current_app
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_cors import CORS
+from flask import request, jsonify, render_template, redirect, url_for, send_from_directory, current_app
+from flask_login import login_user, logout_user, login_required, current_user
 from flask.cli import AppGroup
+import click
 from werkzeug.security import generate_password_hash
 import shutil
 import datetime
-import jwt
-from functools import wraps
-from datetime import timedelta
 
 # import "objects" from "this" project
-from __init__ import db  # Key Flask objects 
+from __init__ import app, db, login_manager  # Key Flask objects, built by create_app
 # API endpoints
-from api.user import user_api 
-from api.pfp import pfp_api
-from api.nestImg import nestImg_api # Justin added this, custom format for his website
-from api.post import post_api
-from api.channel import channel_api
-from api.group import group_api
-from api.section import section_api
-from api.nestPost import nestPost_api # Justin added this, custom format for his website
-from api.messages_api import messages_api # Adi added this, messages for his website
-from api.carChat import carChat_api
-from api.carPost import carPost_api
-from api.student import student_api
-from api.vin import vin_api
-from api.chatBot import chatbot_api
-from api.carComments import carComments_api
-from api.userCars import userCars_api
-from api.mechanicsTips import mechanicsTips_api
-from api.vinStore import vinStore_api
-from api.favorites import itemStore_api
-from api.vote import vote_api
+from api.jwt_authorize import token_cache, authenticated_user
+from model.hashing import hash_pool
+from api.login_throttle import login_throttle
+from api.lazy import timed_import, slowest_imports, schedule_warm_up
 
 # database Initialization functions
 from model.carChat import carChat
@@ -52,113 +33,11 @@ from model.carPost import CarPost
 from model.vehicle import Vehicle, initVehicles
 from model.listings import UserItem, initDefaultUser
 from model.carComments import CarComments
-
-# Initialize Flask app
-app = Flask(__name__, 
-    static_url_path='',
-    static_folder='static',
-    template_folder='templates'
-)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev')
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', app.config['SECRET_KEY'])
-app.config['JWT_ALGORITHM'] = 'HS256'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
-app.config['JWT_TOKEN_NAME'] = os.environ.get('JWT_TOKEN_NAME', 'jwt_token')
-
-def generate_token(user):
-    """
-    Generate a JWT token for the given user.
-    
-    Args:
-        user (User): The user object to generate the token for.
-        
-    Returns:
-        str: The generated JWT token.
-    """
-    try:
-        # Create the token payload
-        payload = {
-            'user_id': user.id,
-            'username': user._uid,
-            'exp': datetime.datetime.utcnow() + app.config['JWT_ACCESS_TOKEN_EXPIRES']
-        }
-        
-        # Generate the token
-        token = jwt.encode(
-            payload,
-            app.config['JWT_SECRET_KEY'],
-            algorithm=app.config['JWT_ALGORITHM']
-        )
-        
-        return token
-    except Exception as e:
-        app.logger.error(f"Token generation error: {str(e)}")
-        return None
-
-def token_required(f):
-    """
-    Decorator to require a valid JWT token for protected routes.
-    
-    Args:
-        f (function): The route function to protect.
-        
-    Returns:
-        function: The wrapped route function.
-    """
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = None
-        
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-        
-        # Get token from cookie if not in header
-        if not token:
-            token = request.cookies.get(app.config['JWT_TOKEN_NAME'])
-        
-        if not token:
-            return jsonify({'error': 'Token is missing'}), 401
-            
-        try:
-            # Decode the token
-            payload = jwt.decode(
-                token,
-                app.config['JWT_SECRET_KEY'],
-                algorithms=[app.config['JWT_ALGORITHM']]
-            )
-            
-            # Get user from token
-            user = User.query.get(payload['user_id'])
-            if not user:
-                return jsonify({'error': 'User not found'}), 401
-                
-            # Add user to request context
-            request.user = user
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Invalid token'}), 401
-        except Exception as e:
-            app.logger.error(f"Token validation error: {str(e)}")
-            return jsonify({'error': 'Token validation failed'}), 401
-            
-        return f(*args, **kwargs)
-        
-    return decorated
-
-cors_origins = os.environ.get("CORS_ORIGINS", "").split(",")
-
-CORS(app, supports_credentials=True, resources={
-    r"/api/*": {
-        "origins": cors_origins,
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"]
-    }
-})
-
+from model.restore import restore as restore_backup, restore_snapshot, SPECS as RESTORE_TABLES
+from model.backup import backup_database, latest_backup
+from model.replication import WalArchive, WalReplicator
+from model.schema import initialize, check_schema, head_revision
+from model.pool import pool_stats
 
 # Serve static files
 @app.route('/static/<path:path>')
@@ -170,65 +49,50 @@ def serve_static(path):
 def favicon():
     return send_from_directory('static', 'favicon.ico', mimetype='image/vnd.microsoft.icon')
 
-# Database setup
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///volumes/user_management.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# Default data, in the order initialization seeds it
+SEEDERS = [initUsers, initSections, initGroups, initChannels, initPosts, initNestPosts, initVotes, initVehicles, initDefaultUser]
 
-# Initialize database tables
-with app.app_context():
-    try:
-        # Check if database exists and is accessible
-        db.engine.connect()
-        print("Database connection successful")
-        
-        # Create tables if they don't exist
-        db.create_all()
-        print("Database tables created/verified successfully")
-        
-        # Initialize default data if needed
-        try:
-            initUsers()
-            initSections()
-            initGroups()
-            initChannels()
-            initPosts()
-            initNestPosts()
-            initVotes()
-            initVehicles()
-            initDefaultUser()
-            print("Default data initialized successfully")
-        except Exception as e:
-            print(f"Warning: Error initializing default data: {str(e)}")
-            # Continue even if default data initialization fails
-            
-    except Exception as e:
-        print(f"Critical error: {str(e)}")
-        # Don't try to recreate the database in production
-        if os.environ.get('FLASK_ENV') == 'development':
-            try:
-                print("Attempting to recreate database in development mode...")
-                db.drop_all()
-                db.create_all()
-                print("Database recreated successfully")
-            except Exception as e:
-                print(f"Error recreating database: {str(e)}")
-        else:
-            print("Database initialization failed in production mode")
-
-# Initialize Flask-Login
-login_manager = LoginManager()
-login_manager.init_app(app)
+def generate_data(force=False):
+    """
+    Create the tables, apply migrations and seed default data, once (see model/schema.py).
+
+    Args:
+        force (bool, optional): Seed again even if the database is initialized. Defaults to False.
+    """
+    with app.app_context():
+        if not initialize(SEEDERS, force=force):
+            print(f"Database already initialized at revision {head_revision()}")
+
+# Workers only check the schema version at boot, initialization is scripts/db_init.py
+if app.config['DB_SCHEMA_CHECK'] != 'off':
+    with app.app_context():
+        schema_ok, db_revision, newest_revision = check_schema()
+    if not schema_ok:
+        message = f"Database is at revision {db_revision or 'none'}, the code expects {newest_revision}: run scripts/db_init.py"
+        if app.config['DB_SCHEMA_CHECK'] == 'strict':
+            raise RuntimeError(message)
+        print(f"Warning: {message}")
+
+# Flask-Login
 login_manager.login_view = 'login'
 
 @login_manager.user_loader
 def load_user(user_id):
+    # Reuse the user the request's token already resolved to, rather than querying it again
+    user = authenticated_user()
+    if user is not None and str(user.id) == str(user_id):
+        return user
     try:
-        return User.query.get(int(user_id))
+        return db.session.get(User, int(user_id))
     except Exception as e:
         print(f"Error loading user: {str(e)}")
         return None
 
+@login_manager.request_loader
+def load_user_from_request(request):
+    # Requests that carry a JWT (header or cookie) are authenticated by the same resolution as the APIs
+    return authenticated_user()
+
 # Simple error handler
 @app.errorhandler(Exception)
 def handle_error(error):
@@ -263,7 +127,7 @@ def before_request():
         resp = current_app.make_default_options_response()
         headers = resp.headers  # type: ignore
         origin = request.headers.get("Origin")
-        if origin in cors_origins:
+        if origin in app.config['CORS_ORIGINS']:
             headers['Access-Control-Allow-Origin'] = origin
             headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
             headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
@@ -281,26 +145,39 @@ def login_page():
 
 #
 # Register blueprints
-app.register_blueprint(user_api)
-app.register_blueprint(pfp_api)
-app.register_blueprint(post_api)
-app.register_blueprint(channel_api)
-app.register_blueprint(group_api)
-app.register_blueprint(section_api)
-app.register_blueprint(carChat_api)
-app.register_blueprint(nestPost_api)
-app.register_blueprint(nestImg_api)
-app.register_blueprint(vote_api)
-app.register_blueprint(carPost_api)
-app.register_blueprint(student_api)
-app.register_blueprint(vin_api)
-app.register_blueprint(chatbot_api)
-app.register_blueprint(carComments_api)
-app.register_blueprint(userCars_api)
-app.register_blueprint(mechanicsTips_api)
-app.register_blueprint(vinStore_api)
-app.register_blueprint(itemStore_api)
-app.register_blueprint(messages_api)
+# (module, blueprint) of the API endpoints, imported with timed_import so startup can report what each costs
+BLUEPRINTS = [
+    ("api.user", "user_api"),
+    ("api.pfp", "pfp_api"),
+    ("api.post", "post_api"),
+    ("api.channel", "channel_api"),
+    ("api.group", "group_api"),
+    ("api.section", "section_api"),
+    ("api.carChat", "carChat_api"),
+    ("api.nestPost", "nestPost_api"),  # Justin added this, custom format for his website
+    ("api.nestImg", "nestImg_api"),  # Justin added this, custom format for his website
+    ("api.vote", "vote_api"),
+    ("api.carPost", "carPost_api"),
+    ("api.student", "student_api"),
+    ("api.vin", "vin_api"),
+    ("api.chatBot", "chatbot_api"),
+    ("api.carComments", "carComments_api"),
+    ("api.userCars", "userCars_api"),
+    ("api.mechanicsTips", "mechanicsTips_api"),
+    ("api.vinStore", "vinStore_api"),
+    ("api.favorites", "itemStore_api"),
+    ("api.messages_api", "messages_api"),  # Adi added this, messages for his website
+]
+for module_name, blueprint_name in BLUEPRINTS:
+    app.register_blueprint(getattr(timed_import(module_name), blueprint_name))
+
+# Heavy client libraries (see api/lazy.py) load in the background once the worker serves traffic
+schedule_warm_up(app, app.config['LAZY_WARMUP_DELAY'])
+
+# A dependency that makes boots slow shows up in the logs
+slow_imports = {name: ms for name, ms in slowest_imports().items() if ms >= app.config['IMPORT_REPORT_MS']}
+if slow_imports:
+    print("Slowest imports: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in slow_imports.items()))
 
 # Root route
 @app.route('/')
@@ -316,11 +193,168 @@ def index():
 def health():
     return jsonify({
         'status': 'healthy',
-        'database': 'connected' if db.engine else 'disconnected'
+        'database': 'connected' if db.engine else 'disconnected',
+        'database_pool': pool_stats(db.engines),
+        'auth_cache': token_cache.stats(),
+        'password_hashing': hash_pool.stats(),
+        'login_throttle': login_throttle.stats(),
+        'slowest_imports': slowest_imports()
     })
 
+# Create an AppGroup for custom commands
+custom_cli = AppGroup('custom', help='Custom commands')
+
+def load_data_from_json(directory=None):
+    """
+    Load backup records from instance/backup: one <table>.json list per table, or a data.json holding
+    either {table: records} or, in the older format, a list of users.
+
+    Returns:
+        dict: Table name -> list of records.
+    """
+    directory = directory or os.path.join(app.instance_path, 'backup')
+    data = {}
+    legacy = os.path.join(directory, 'data.json')
+    if os.path.exists(legacy):
+        with open(legacy, 'r') as f:
+            records = json.load(f)
+        data.update(records if isinstance(records, dict) else {'users': records})
+    for table in RESTORE_TABLES:
+        path = os.path.join(directory, f'{table}.json')
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data[table] = json.load(f)
+    return data
+
+def restore_data(data):
+    """
+    Restore backup records into the database with the bulk restore engine, in foreign key order.
+    """
+    with app.app_context():
+        results = restore_backup(data)
+    for table, stats in results.items():
+        print(f"{table}: {stats['inserted']} inserted, {stats['updated']} updated, {stats['skipped']} skipped")
+    if results.get('users', {}).get('inserted'):
+        # Backup records carry no password hashes
+        print(f"users: the {results['users']['inserted']} inserted have the default password (DEFAULT_PASSWORD) and should change it")
+    print("Data restored to the new database.")
+
+@custom_cli.command('restore_data')
+def restore_data_command():
+    data = load_data_from_json()
+    restore_data(data)
+
+def backup_data(directory=None):
+    """
+    Back up the database from a consistent snapshot into a new directory under BACKUP_DIR (see model/backup.py).
+
+    Returns:
+        str: The backup directory.
+    """
+    with app.app_context():
+        path, manifest = backup_database(directory)
+    for table in manifest['tables']:
+        print(f"{table['name']}: {table['rows']} rows, {table['bytes']} bytes")
+    print(f"Backup written to {path}")
+    return path
+
+@custom_cli.command('backup_data')
+def backup_data_command():
+    backup_data()
+
+def restore_from_backup(path=None):
+    """
+    Restore a backup written by backup_data, the newest one unless a path is given.
+    """
+    path = path or latest_backup()
+    if path is None:
+        print("No backup found.")
+        return
+    with app.app_context():
+        results = restore_snapshot(path)
+    for table, stats in results.items():
+        print(f"{table}: {stats['inserted']} inserted, {stats['updated']} updated")
+    print(f"Backup {path} restored.")
+
+@custom_cli.command('restore_backup')
+@click.argument('path', required=False)
+def restore_backup_command(path):
+    restore_from_backup(path)
+
+def sqlite_path():
+    """
+    Returns:
+        str: The file of the app's SQLite database, or None on other databases.
+    """
+    with app.app_context():
+        url = db.engine.url
+    return url.database if url.get_backend_name() == 'sqlite' else None
+
+def replicate():
+    """
+    Ship the WAL of the SQLite database to REPLICA_DIR until interrupted (see model/replication.py).
+    """
+    path = sqlite_path()
+    if path is None:
+        print("WAL shipping needs the SQLite database.")
+        return
+    replicator = WalReplicator(
+        path,
+        WalArchive(app.config['REPLICA_DIR']),
+        checkpoint_pages=app.config['REPLICA_CHECKPOINT_PAGES'],
+        snapshot_interval=app.config['REPLICA_SNAPSHOT_INTERVAL'],
+        retention=app.config['REPLICA_RETENTION']
+    )
+    print(f"Replicating {path} to {replicator.archive.path}")
+    try:
+        replicator.run(interval=app.config['REPLICA_SYNC_INTERVAL'])
+    except KeyboardInterrupt:
+        pass
+    print(replicator.stats())
+
+@custom_cli.command('replicate')
+def replicate_command():
+    replicate()
+
+def restore_point_in_time(timestamp=None, output=None):
+    """
+    Rebuild the SQLite database as of timestamp (default the latest state) from the WAL archive.
+
+    The result goes to output, by default <database>_restored.db next to the live database; swap it in
+    with the app stopped.
+
+    Returns:
+        str: The restored database file, or None when the database is not SQLite (nothing to restore from).
+    """
+    path = sqlite_path()
+    if path is None:
+        print("Point-in-time restore requires SQLite WAL archiving, the database is not SQLite.")
+        return None
+    output = output or os.path.splitext(path)[0] + '_restored.db'
+    result = WalArchive(app.config['REPLICA_DIR']).restore(output, timestamp)
+    restored_to = datetime.datetime.fromtimestamp(result['restored_to'] / 1000, datetime.timezone.utc)
+    print(f"Restored {output} to {restored_to.isoformat()} ({result['segments']} segments of generation {result['generation']})")
+    return output
+
+@custom_cli.command('restore_pitr')
+@click.option('--timestamp', default=None, help='ISO 8601 point in time, UTC unless it has an offset')
+@click.option('--output', default=None, help='database file to write')
+def restore_pitr_command(timestamp, output):
+    if restore_point_in_time(timestamp, output) is None:
+        raise SystemExit(1)
+
+@custom_cli.command('init_db')
+@click.option('--force', is_flag=True, help='seed default data even if the database is initialized')
+def init_db_command(force):
+    generate_data(force)
+
+# Register the custom command group with the Flask application
+app.cli.add_command(custom_cli)
+
 # Run the application
 if __name__ == "__main__":
+    # The development server initializes on its own, a fresh checkout runs without a separate step
+    generate_data()
     app.run(debug=True, host="0.0.0.0", port="8080")
 
 
@@ -0,0 +1,77 @@
+"""indexes for the lookups the API filters by
+
+Each index below serves a filter an endpoint runs on every call, which without it scans the table:
+
+- posts._user_id: GET /api/post, the current user's posts;
+- nestPosts._user_id: GET /api/nestPost, the same for nest posts;
+- feedbacks._post_id: GET /api/feedback, one post's feedback;
+- groups._section_id: the groups of a section (api/group.py);
+- channels (_group_id, _name): the channels of a group, and one channel by name within it (api/channel.py);
+- userCars._uid and vehicles._uid: the current user's cars and vehicles;
+- vehicles upper(_vin): the case-insensitive VIN lookup of api/vinStore.py, an expression index;
+- user_items (name, user_id): an item by name, alone or for the current user (api/favorites.py).
+
+Filters already served by an index are left alone: posts by channel (the prefix of the feed indexes),
+votes by user and post, comments by post, and users, groups, sections and vehicles by their unique keys.
+
+Revision ID: 3c8f1e5b7a20
+Revises: a4db9e6d7399
+Create Date: 2026-10-18 14:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8f1e5b7a20'
+down_revision = 'a4db9e6d7399'
+branch_labels = None
+depends_on = None
+
+# Table -> index name -> columns, as declared on the models
+INDEXES = {
+    'posts': {'ix_posts__user_id': ['_user_id']},
+    'nestPosts': {'ix_nestPosts__user_id': ['_user_id']},
+    'feedbacks': {'ix_feedbacks__post_id': ['_post_id']},
+    'groups': {'ix_groups__section_id': ['_section_id']},
+    'channels': {'ix_channels_group_id_name': ['_group_id', '_name']},
+    'userCars': {'ix_userCars__uid': ['_uid']},
+    'vehicles': {
+        'ix_vehicles__uid': ['_uid'],
+        # An expression, which MySQL renders as the functional key part ((upper(_vin)))
+        'ix_vehicles_upper_vin': [sa.func.upper(sa.column('_vin'))],
+    },
+    'user_items': {'ix_user_items_name_user_id': ['name', 'user_id']},
+}
+
+
+def index_names(table):
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # SQLite reflection leaves out expression indexes, its catalog lists them all
+        rows = bind.execute(sa.text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"), {'table': table})
+        return {row[0] for row in rows}
+    return {index['name'] for index in sa.inspect(bind).get_indexes(table)}
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    for table, table_indexes in INDEXES.items():
+        if table not in tables:
+            continue
+        indexes = index_names(table)
+        for name, columns in table_indexes.items():
+            if name not in indexes:
+                op.create_index(name, table, columns)
+
+
+def downgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    for table, table_indexes in INDEXES.items():
+        if table not in tables:
+            continue
+        indexes = index_names(table)
+        for name in table_indexes:
+            if name in indexes:
+                op.drop_index(name, table_name=table)
@@ -0,0 +1,35 @@
+"""add users._token_version
+
+Tokens issued by /api/authenticate carry the user's token version so that a password or role change
+revokes every token issued before it.
+
+Tables are still created by db.create_all() at startup, so a fresh database already has the column;
+the upgrade only alters databases created before it existed.
+
+Revision ID: 4105390928ff
+Revises:
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4105390928ff'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')]
+    if '_token_version' not in columns:
+        op.add_column('users', sa.Column('_token_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('users')]
+    if '_token_version' in columns:
+        with op.batch_alter_table('users') as batch_op:
+            batch_op.drop_column('_token_version')
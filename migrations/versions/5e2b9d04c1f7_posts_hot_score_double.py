@@ -0,0 +1,40 @@
+"""posts._hot_score in double precision
+
+a4db9e6d7399 created _hot_score as FLOAT, which MySQL stores in single precision (about 7
+significant digits). The feed's keyset cursor carries the full Python float and compares it with
+the rounded stored value, so pages could skip or repeat posts. SQLite's REAL is already double
+precision, there this does nothing.
+
+Revision ID: 5e2b9d04c1f7
+Revises: 3c8f1e5b7a20
+Create Date: 2026-10-18 15:21:09.734118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2b9d04c1f7'
+down_revision = '3c8f1e5b7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+    inspector = sa.inspect(bind)
+    if 'posts' not in inspector.get_table_names():
+        return
+    column = next((column for column in inspector.get_columns('posts') if column['name'] == '_hot_score'), None)
+    if column is not None and not isinstance(column['type'], sa.Double):
+        op.alter_column('posts', '_hot_score', type_=sa.Double(), existing_type=column['type'],
+                        existing_nullable=False, existing_server_default='0')
+    # Stored values keep their rounding until scripts/feed_rescore.py next runs, but column and cursors agree from now on
+
+
+def downgrade():
+    # Narrowing back to FLOAT would only bring the rounding back
+    pass
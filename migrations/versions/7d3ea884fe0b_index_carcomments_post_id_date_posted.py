@@ -0,0 +1,37 @@
+"""index carcomments on (_post_id, _date_posted)
+
+GET /api/carComment?post_id= reads one post's comments a page at a time, ordered by date;
+the index turns that into a range scan instead of a scan of the whole table.
+
+Revision ID: 7d3ea884fe0b
+Revises: 4105390928ff
+Create Date: 2026-10-18 10:58:21.406377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3ea884fe0b'
+down_revision = '4105390928ff'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'carcomments' not in inspector.get_table_names():
+        return
+    indexes = [index['name'] for index in inspector.get_indexes('carcomments')]
+    if 'ix_carcomments_post_id_date_posted' not in indexes:
+        op.create_index('ix_carcomments_post_id_date_posted', 'carcomments', ['_post_id', '_date_posted'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'carcomments' not in inspector.get_table_names():
+        return
+    indexes = [index['name'] for index in inspector.get_indexes('carcomments')]
+    if 'ix_carcomments_post_id_date_posted' in indexes:
+        op.drop_index('ix_carcomments_post_id_date_posted', table_name='carcomments')
@@ -0,0 +1,65 @@
+"""posts._date_posted, _score and _hot_score with feed indexes
+
+The hot and top feeds page through posts ordered by a stored score, globally or per channel;
+each index below serves one of those orders as a range scan.
+
+Posts that existed before get the upgrade time as their creation time and their vote balance as
+_score. Their hot scores need the app's formula: run scripts/feed_rescore.py after upgrading.
+
+Revision ID: a4db9e6d7399
+Revises: a9d6cbc82180
+Create Date: 2026-10-18 12:48:15.620831
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4db9e6d7399'
+down_revision = 'a9d6cbc82180'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_posts_hot_score': ['_hot_score', 'id'],
+    'ix_posts_channel_id_hot_score': ['_channel_id', '_hot_score', 'id'],
+    'ix_posts_score': ['_score', 'id'],
+    'ix_posts_channel_id_score': ['_channel_id', '_score', 'id'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'posts' not in inspector.get_table_names():
+        return
+    columns = [column['name'] for column in inspector.get_columns('posts')]
+    if '_date_posted' not in columns:
+        op.add_column('posts', sa.Column('_date_posted', sa.DateTime(), nullable=True))
+        op.execute("UPDATE posts SET _date_posted = CURRENT_TIMESTAMP WHERE _date_posted IS NULL")
+    if '_score' not in columns:
+        op.add_column('posts', sa.Column('_score', sa.Integer(), nullable=False, server_default='0'))
+        op.execute("UPDATE posts SET _score = _upvotes - _downvotes")
+    if '_hot_score' not in columns:
+        # Double precision, MySQL's FLOAT would round the values feed cursors compare against
+        op.add_column('posts', sa.Column('_hot_score', sa.Double(), nullable=False, server_default='0'))
+
+    indexes = [index['name'] for index in inspector.get_indexes('posts')]
+    for name, index_columns in INDEXES.items():
+        if name not in indexes:
+            op.create_index(name, 'posts', index_columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'posts' not in inspector.get_table_names():
+        return
+    indexes = [index['name'] for index in inspector.get_indexes('posts')]
+    for name in INDEXES:
+        if name in indexes:
+            op.drop_index(name, table_name='posts')
+    columns = [column['name'] for column in inspector.get_columns('posts')]
+    with op.batch_alter_table('posts') as batch_op:
+        for column in ('_hot_score', '_score', '_date_posted'):
+            if column in columns:
+                batch_op.drop_column(column)
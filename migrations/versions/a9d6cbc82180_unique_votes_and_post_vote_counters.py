@@ -0,0 +1,63 @@
+"""unique votes per (user, post) and vote counters on posts
+
+Votes are written with an insert that ignores the (user, post) conflict, so the pair must be unique;
+duplicate votes left by the old read-modify-write path are removed first, keeping each user's latest.
+posts._upvotes and posts._downvotes are then filled from the votes table, after which Vote keeps
+them in step in the same transaction as every vote.
+
+Revision ID: a9d6cbc82180
+Revises: b26fb6fe8a3b
+Create Date: 2026-10-18 12:06:33.271948
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d6cbc82180'
+down_revision = 'b26fb6fe8a3b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if 'posts' in tables:
+        columns = [column['name'] for column in inspector.get_columns('posts')]
+        for name in ('_upvotes', '_downvotes'):
+            if name not in columns:
+                op.add_column('posts', sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+    if 'votes' not in tables:
+        return
+
+    indexes = [index['name'] for index in inspector.get_indexes('votes')]
+    if 'uq_votes_user_id_post_id' not in indexes:
+        op.execute(
+            "DELETE FROM votes WHERE id NOT IN "
+            "(SELECT max_id FROM (SELECT MAX(id) AS max_id FROM votes GROUP BY _user_id, _post_id) AS latest)"
+        )
+        op.create_index('uq_votes_user_id_post_id', 'votes', ['_user_id', '_post_id'], unique=True)
+
+    if 'posts' in tables:
+        op.execute(
+            "UPDATE posts SET "
+            "_upvotes = (SELECT COUNT(*) FROM votes WHERE votes._post_id = posts.id AND votes._vote_type = 'upvote'), "
+            "_downvotes = (SELECT COUNT(*) FROM votes WHERE votes._post_id = posts.id AND votes._vote_type = 'downvote')"
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    if 'votes' in tables:
+        indexes = [index['name'] for index in inspector.get_indexes('votes')]
+        if 'uq_votes_user_id_post_id' in indexes:
+            op.drop_index('uq_votes_user_id_post_id', table_name='votes')
+    if 'posts' in tables:
+        columns = [column['name'] for column in inspector.get_columns('posts')]
+        with op.batch_alter_table('posts') as batch_op:
+            for name in ('_downvotes', '_upvotes'):
+                if name in columns:
+                    batch_op.drop_column(name)
@@ -0,0 +1,37 @@
+"""index votes on (_post_id, _vote_type)
+
+Vote counts are aggregated with GROUP BY _post_id, _vote_type; the index covers that query, so
+counting the votes of a page of posts never reads the votes table itself.
+
+Revision ID: b26fb6fe8a3b
+Revises: dd5399cb5858
+Create Date: 2026-10-18 11:41:09.553820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b26fb6fe8a3b'
+down_revision = 'dd5399cb5858'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'votes' not in inspector.get_table_names():
+        return
+    indexes = [index['name'] for index in inspector.get_indexes('votes')]
+    if 'ix_votes_post_id_vote_type' not in indexes:
+        op.create_index('ix_votes_post_id_vote_type', 'votes', ['_post_id', '_vote_type'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'votes' not in inspector.get_table_names():
+        return
+    indexes = [index['name'] for index in inspector.get_indexes('votes')]
+    if 'ix_votes_post_id_vote_type' in indexes:
+        op.drop_index('ix_votes_post_id_vote_type', table_name='votes')
@@ -0,0 +1,37 @@
+"""index carChats._timestamp
+
+Chat clients poll GET /api/carChat?since=<timestamp> for new messages; the index keeps each
+poll proportional to the new messages rather than to the whole chat history.
+
+Revision ID: dd5399cb5858
+Revises: 7d3ea884fe0b
+Create Date: 2026-10-18 11:20:47.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dd5399cb5858'
+down_revision = '7d3ea884fe0b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'carChats' not in inspector.get_table_names():
+        return
+    indexes = [index['name'] for index in inspector.get_indexes('carChats')]
+    if 'ix_carChats__timestamp' not in indexes:
+        op.create_index('ix_carChats__timestamp', 'carChats', ['_timestamp'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'carChats' not in inspector.get_table_names():
+        return
+    indexes = [index['name'] for index in inspector.get_indexes('carChats')]
+    if 'ix_carChats__timestamp' in indexes:
+        op.drop_index('ix_carChats__timestamp', table_name='carChats')
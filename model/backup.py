@@ -0,0 +1,307 @@
+""" backup.py
+Consistent, streaming backups of the whole database.
+
+A backup is a directory holding one gzip-compressed NDJSON file per table (one JSON object per row)
+and a manifest.json listing every file with its row count and SHA-256. All tables come from one
+point-in-time snapshot, taken without blocking the writers of the running app:
+
+- SQLite: the online backup API copies the database into a snapshot file inside the backup
+  directory, which is then streamed and deleted. In WAL mode (SQLITE_PRAGMA_PROFILE) writers carry
+  on during the copy; with a rollback journal they wait for it and a steady stream of writes can
+  keep the copy from starting.
+- MySQL (and other server databases): every table is read in one REPEATABLE READ transaction
+  (START TRANSACTION WITH CONSISTENT SNAPSHOT on MySQL), which InnoDB serves from its undo log.
+
+Rows are fetched BACKUP_BATCH_SIZE at a time through server-side cursors and compressed as they
+arrive, so memory stays flat however large the tables are.
+"""
+import base64
+import datetime
+import decimal
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import uuid
+
+import sqlalchemy as sa
+
+from __init__ import app, db
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def _encode(value):
+    # JSON for the column types json.dumps does not know
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class _HashingWriter:
+    """
+    A write-only file that hashes and counts the bytes written through it.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.bytes += len(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+def _file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+class _CopyRestarted(Exception):
+    """
+    Raised when writes restarted a SQLite copy in steps more than BACKUP_SQLITE_RESTARTS times.
+    """
+
+
+def _sqlite_copy(source, path, pages):
+    """
+    Copy a SQLite database to path, pages at a time (-1 for one step).
+
+    Raises:
+        _CopyRestarted: Writes between the steps kept restarting the copy.
+    """
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        # A write between two steps sends the copy back to its first page
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > app.config['BACKUP_SQLITE_RESTARTS']:
+                raise _CopyRestarted()
+        last_remaining = remaining
+
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target, pages=pages, progress=progress if pages > 0 else None, sleep=0.005)
+        # The copy inherits the journal mode; a plain rollback journal file opens read-only without -wal/-shm files
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+
+
+def _sqlite_snapshot(engine, path):
+    """
+    Copy a SQLite database to path with the online backup API.
+
+    By default the copy is one step, which in WAL mode holds no lock writers wait for. With
+    BACKUP_SQLITE_PAGES > 0 writers also get in between the steps, but every write restarts the copy;
+    after BACKUP_SQLITE_RESTARTS restarts it is redone in one step so that it always finishes.
+
+    Returns:
+        sqlalchemy.Engine: An engine on the copy.
+    """
+    source = engine.raw_connection()
+    try:
+        try:
+            _sqlite_copy(source.driver_connection, path, app.config['BACKUP_SQLITE_PAGES'])
+        except _CopyRestarted:
+            _sqlite_copy(source.driver_connection, path, -1)
+    finally:
+        source.close()
+    return sa.create_engine("sqlite://", creator=lambda: sqlite3.connect(f"file:{path}?mode=ro", uri=True), poolclass=sa.pool.NullPool)
+
+
+def _stream_table(conn, table, path):
+    """
+    Write all rows of a table to a gzip-compressed NDJSON file.
+
+    Returns:
+        dict: The table's manifest entry.
+    """
+    batch_size = app.config['BACKUP_BATCH_SIZE']
+    rows = 0
+    with open(path, "wb") as raw:
+        writer = _HashingWriter(raw)
+        # mtime=0 keeps the gzip header, and with it the checksum, independent of when the backup ran
+        with gzip.GzipFile(fileobj=writer, mode="wb", compresslevel=app.config['BACKUP_COMPRESS_LEVEL'], mtime=0) as out:
+            encoder = json.JSONEncoder(default=_encode, separators=(",", ":"))
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(sa.select(table))
+            columns = list(result.keys())
+            for batch in result.partitions():
+                out.write("".join(encoder.encode(dict(zip(columns, row))) + "\n" for row in batch).encode("utf-8"))
+                rows += len(batch)
+    return {
+        "name": table.name,
+        "file": os.path.basename(path),
+        "rows": rows,
+        "bytes": writer.bytes,
+        "sha256": writer.sha256.hexdigest()
+    }
+
+
+def _dump(conn, directory, prefix="", skip=()):
+    # Reflect the snapshot itself, so tables without a model (alembic_version, ...) are included too
+    metadata = sa.MetaData()
+    metadata.reflect(bind=conn)
+    tables = []
+    for table in metadata.sorted_tables:
+        if table.name in skip:
+            continue
+        entry = _stream_table(conn, table, os.path.join(directory, f"{table.name}.ndjson.gz"))
+        entry["file"] = prefix + entry["file"]
+        tables.append(entry)
+    revision = None
+    if "alembic_version" in metadata.tables:
+        revision = conn.execute(sa.text("SELECT version_num FROM alembic_version")).scalar()
+    return tables, revision
+
+
+def _backup_engine(engine, directory, prefix="", skip=()):
+    """
+    Dump the tables of one database, but those in skip, from a consistent snapshot of it.
+
+    Returns:
+        tuple: (manifest entries of the tables, alembic revision or None, snapshot method).
+    """
+    if engine.dialect.name == "sqlite":
+        snapshot_path = os.path.join(directory, "snapshot.db")
+        snapshot = _sqlite_snapshot(engine, snapshot_path)
+        try:
+            with snapshot.connect() as conn:
+                return _dump(conn, directory, prefix, skip) + ("sqlite-online-backup",)
+        finally:
+            snapshot.dispose()
+            os.remove(snapshot_path)
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        if engine.dialect.name == "mysql":
+            conn.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        try:
+            return _dump(conn, directory, prefix, skip) + ("consistent-snapshot",)
+        finally:
+            conn.rollback()
+
+
+def backup_database(directory=None):
+    """
+    Back up every table of the app's database from one consistent snapshot.
+
+    Databases of their own (DB_SEPARATE_BINDS, see model/binds.py) are snapshotted one after the other
+    into a subdirectory named after the bind; each is consistent in itself.
+
+    The backup is written to a .partial directory, which is renamed once the manifest is complete;
+    a failed backup leaves nothing behind.
+
+    Args:
+        directory (str, optional): Where to create the backup directory. Defaults to BACKUP_DIR.
+
+    Returns:
+        tuple: (path of the backup directory, its manifest).
+    """
+    engine = db.engine
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    path = os.path.join(directory or app.config['BACKUP_DIR'], created_at.strftime("%Y%m%dT%H%M%S%fZ"))
+    partial = path + ".partial"
+    os.makedirs(partial)
+    try:
+        # Tables moved to a bind of their own may have left a copy behind in the main database, no longer used
+        tables, revision, method = _backup_engine(engine, partial, skip=app.config['DB_TABLE_BINDS'])
+        for bind in app.config['DB_SEPARATE_BINDS']:
+            os.makedirs(os.path.join(partial, bind))
+            bind_tables = _backup_engine(db.engines[bind], os.path.join(partial, bind), prefix=f"{bind}/")[0]
+            tables.extend(dict(entry, bind=bind) for entry in bind_tables)
+
+        manifest = {
+            "format": FORMAT_VERSION,
+            "created_at": created_at.isoformat(),
+            "dialect": engine.dialect.name,
+            "method": method,
+            "revision": revision,
+            "tables": tables
+        }
+        with open(os.path.join(partial, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    return path, manifest
+
+
+def latest_backup(directory=None):
+    """
+    Returns:
+        str: The newest complete backup directory under directory (default BACKUP_DIR), or None.
+    """
+    directory = directory or app.config['BACKUP_DIR']
+    if not os.path.isdir(directory):
+        return None
+    backups = sorted(
+        name for name in os.listdir(directory)
+        if not name.endswith(".partial") and os.path.isfile(os.path.join(directory, name, MANIFEST))
+    )
+    return os.path.join(directory, backups[-1]) if backups else None
+
+
+def load_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def verify_backup(path):
+    """
+    Check every table file of a backup against its manifest entry.
+
+    Args:
+        path (str): The backup directory.
+
+    Returns:
+        list: Problems found, empty if the backup is intact.
+    """
+    problems = []
+    for entry in load_manifest(path)["tables"]:
+        file_path = os.path.join(path, entry["file"])
+        if not os.path.isfile(file_path):
+            problems.append(f"{entry['file']}: missing")
+            continue
+        if _file_sha256(file_path) != entry["sha256"]:
+            problems.append(f"{entry['file']}: checksum mismatch")
+            continue
+        rows = sum(1 for _ in read_table(path, entry))
+        if rows != entry["rows"]:
+            problems.append(f"{entry['file']}: {rows} rows, manifest says {entry['rows']}")
+    return problems
+
+
+def read_table(path, entry):
+    """
+    Stream the rows of one table of a backup.
+
+    Args:
+        path (str): The backup directory.
+        entry (dict): The table's manifest entry.
+
+    Returns:
+        generator: The rows, as dicts of column name -> JSON value.
+    """
+    with gzip.open(os.path.join(path, entry["file"]), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
@@ -0,0 +1,72 @@
+""" binds.py
+Databases of their own for the tables that take many small writes.
+
+SQLite lets one writer at a time into a database file, so a burst of chat messages or comments
+delays every other write behind it, logins and profile updates included. With DB_SEPARATE_BINDS
+naming binds of SEPARATE_BINDS (__init__.py), their tables live in files of their own, each with its
+own write lock, and their models carry the bind key.
+
+Foreign keys cannot cross databases, so a table moved out keeps its user and post ids as plain
+integers (references); the code reading them already fetches the authors in one batched IN query
+(see carChat.read_all and CarComments.read_all), which works the same across binds.
+
+Moving a table leaves its rows in the main database. move_tables copies them over once, into the
+empty new table, when initialization runs (scripts/db_init.py).
+"""
+from sqlalchemy import inspect, select
+
+from __init__ import app, db
+
+
+def bind_key(table):
+    """
+    Args:
+        table (str): A table name.
+
+    Returns:
+        str: The bind the table lives in, or None for the main database.
+    """
+    return app.config['DB_TABLE_BINDS'].get(table)
+
+
+def references(table, column):
+    """
+    The foreign key of a column, for db.Column(*...), unless the table lives in another database than its target.
+
+    Args:
+        table (str): The table the column belongs to.
+        column (str): The referenced column, e.g. "users.id".
+
+    Returns:
+        list: [db.ForeignKey(column)], or nothing when the two tables are in different databases.
+    """
+    return [db.ForeignKey(column)] if bind_key(table) == bind_key(column.split(".")[0]) else []
+
+
+def move_tables(chunk_size=1000):
+    """
+    Copy the rows of tables moved to their own bind out of the main database, where the new table is still empty.
+
+    Returns:
+        dict: Table name -> rows copied.
+    """
+    copied = {}
+    main_tables = set(inspect(db.engine).get_table_names())
+    for table_name, bind in app.config['DB_TABLE_BINDS'].items():
+        table = db.metadatas[bind].tables[table_name]
+        if table_name not in main_tables:
+            continue
+        target = db.engines[bind]
+        with target.connect() as conn:
+            if conn.execute(select(table).limit(1)).first() is not None:
+                continue
+        rows = 0
+        with db.engine.connect() as source, target.begin() as conn:
+            result = source.execution_options(stream_results=True, yield_per=chunk_size).execute(select(table))
+            for batch in result.mappings().partitions():
+                conn.execute(table.insert(), [dict(row) for row in batch])
+                rows += len(batch)
+        if rows:
+            copied[table_name] = rows
+            print(f"Copied {rows} {table_name} rows to the {bind} database, the copy in the main database is no longer used")
+    return copied
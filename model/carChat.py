@@ -3,15 +3,18 @@ from sqlalchemy import Text
 from __init__ import app, db
 from model.user import User
 from model.group import Group
+from model.binds import bind_key, references
 from datetime import datetime
 
 class carChat(db.Model):
     __tablename__ = 'carChats'
+    __bind_key__ = bind_key('carChats')  # a database of its own with DB_SEPARATE_BINDS=chat
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     _message = db.Column(db.String(255), nullable=False)
-    _user_id = db.Column('user_id', db.Integer, db.ForeignKey('users.id'))
-    _timestamp = db.Column('_timestamp', db.DateTime, default=datetime.utcnow)
+    _user_id = db.Column('user_id', db.Integer, *references('carChats', 'users.id'))
+    # Indexed for clients that poll for messages since a timestamp
+    _timestamp = db.Column('_timestamp', db.DateTime, default=datetime.utcnow, index=True)
     
     def __init__(self, message, user_id):
         """
@@ -47,14 +50,16 @@ class carChat(db.Model):
             db.session.rollback()
             raise e
     
-    def read(self):
-        """Returns chat message data with user details"""
-        user = User.query.get(self._user_id)
-        if user:
-            user_data = user.read()
-            username = user_data.get("name", "Unknown User")  # Get actual username
-        else:
-            username = "Unknown User"
+    def read(self, username=None):
+        """
+        Returns chat message data with user details.
+
+        Args:
+            username (str, optional): The author's name, when the caller already has it (see read_all). Defaults to looking it up.
+        """
+        if username is None:
+            user = User.query.get(self._user_id)
+            username = user.name if user else "Unknown User"
             
         return {
             'id': self.id,
@@ -64,6 +69,56 @@ class carChat(db.Model):
             'timestamp': self._timestamp.isoformat() if self._timestamp else None  # Changed to ISO format
         }
 
+    @staticmethod
+    def read_all(messages):
+        """
+        Serializes many messages at once, resolving all the author names with a single IN query.
+
+        Args:
+            messages (list): carChat objects.
+
+        Returns:
+            list: A list of dictionaries as returned by read.
+        """
+        user_ids = {message._user_id for message in messages if message._user_id is not None}
+        names = {}
+        if user_ids:
+            names = dict(db.session.query(User.id, User._name).filter(User.id.in_(user_ids)).all())
+        return [message.read(names.get(message._user_id, "Unknown User")) for message in messages]
+
+    @staticmethod
+    def read_since(after_id=None, since=None, limit=50):
+        """
+        Reads the messages newer than a cursor, oldest first, at most limit of them.
+
+        Pollers pass the id of the last message they hold (after_id), or a timestamp (since) when they
+        have no id yet; either way only new rows are read, through the primary key or the _timestamp index.
+
+        Args:
+            after_id (int, optional): Return messages with a greater id.
+            since (datetime, optional): Return messages posted after this time (ignored when after_id is given).
+            limit (int, optional): The maximum number of messages to return. Defaults to 50.
+
+        Returns:
+            dict: The messages, the cursor to poll with next and whether more messages are already waiting.
+        """
+        query = carChat.query
+        if after_id is not None:
+            query = query.filter(carChat.id > after_id).order_by(carChat.id)
+        elif since is not None:
+            query = query.filter(carChat._timestamp > since).order_by(carChat._timestamp, carChat.id)
+        else:
+            query = query.order_by(carChat.id)
+        # Fetch one extra row to learn whether another page is waiting
+        messages = query.limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        return {
+            'messages': carChat.read_all(messages),
+            'cursor': messages[-1].id if messages else after_id,
+            'has_more': has_more
+        }
+
     def update(self, data=None):
         if data:
             self._message = data.get("message", self._message)
@@ -102,21 +157,11 @@ class carChat(db.Model):
 
     @staticmethod
     def restore(data):
-        users = {}
-        for chat_data in data:
-            id = chat_data.get("id")
-            message = carChat.query.filter_by(id=id).first()
-            if message:
-                # Update existing message
-                message._message = chat_data.get("message", message._message)
-                message._user_id = chat_data.get("user_id", message._user_id)
-                message._timestamp = datetime.fromisoformat(chat_data.get("timestamp", message._timestamp.isoformat()))
-                message.update()  # Call the update method to save changes
-            else:
-                # Create a new message
-                new_message = carChat(
-                    message=chat_data.get("message"),
-                    user_id=chat_data.get("user_id")
-                )
-                new_message.create()  # Call the create method to save the new message
-        return users
\ No newline at end of file
+        """
+        Upserts carChats records from a backup, in bulk (see model/restore.py).
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("carChats", data)["ids"]
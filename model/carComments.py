@@ -3,13 +3,17 @@ from sqlalchemy import Text
 from __init__ import app, db
 from datetime import datetime
 from model.user import User
+from model.binds import bind_key, references
 
 class CarComments(db.Model):
 
     __tablename__ = "carcomments" 
+    __bind_key__ = bind_key("carcomments")  # a database of its own with DB_SEPARATE_BINDS=engagement
+    # Comments are always read one post at a time, oldest first
+    __table_args__ = (db.Index('ix_carcomments_post_id_date_posted', '_post_id', '_date_posted'),)
     id = db.Column(db.Integer, primary_key=True)
-    _uid = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    _post_id = db.Column(db.Integer, db.ForeignKey("carPosts.id"), nullable=False)
+    _uid = db.Column(db.Integer, *references("carcomments", "users.id"), nullable=False)
+    _post_id = db.Column(db.Integer, *references("carcomments", "carPosts.id"), nullable=False)
     _content = db.Column(db.String(255), nullable=False)
     _date_posted = db.Column(db.DateTime, nullable=False)
 
@@ -47,31 +51,93 @@ class CarComments(db.Model):
             db.session.rollback()
             raise error
         
-    def read(self):
+    def read(self, user_data=None):
         """
         The read method retrieves the object data from the object's attributes and returns it as a dictionary.
         
         Uses:
-            The Group.query and User.query methods to retrieve the group and user objects.
+            The User.query method to retrieve the user object, unless the caller already has it (see read_all).
+
+        Args:
+            user_data (dict, optional): The nested user object, as built by User.summary. Defaults to looking it up.
         
         Returns:
-            dict: A dictionary containing the post data, including user and group names.
+            dict: A dictionary containing the comment data, including the nested user.
         """
-        user = User.query.get(self._uid)
+        if user_data is None:
+            user = db.session.get(User, self._uid)
+            user_data = user.summary() if user else None
         data = {
             "id": self.id,
             "content": self._content,
-            "user": {
-                "name": user.read()["name"],
-                "id": user.read()["id"],
-                "uid": user.read()["uid"],
-                "email": user.read()["email"],
-                "pfp": user.read()["pfp"]
-            },
+            "user": user_data,
             "postid": self._post_id,
             "date_posted": self._date_posted
         }
         return data
+
+    @staticmethod
+    def read_all(comments):
+        """
+        Serializes many comments at once, fetching all their authors with a single IN query.
+
+        Args:
+            comments (list): CarComments objects.
+
+        Returns:
+            list: A list of dictionaries as returned by read.
+        """
+        user_ids = {comment._uid for comment in comments}
+        users = {}
+        if user_ids:
+            users = {user.id: user.summary() for user in User.query.filter(User.id.in_(user_ids))}
+        return [comment.read(users.get(comment._uid)) for comment in comments]
+
+    @staticmethod
+    def encode_cursor(comment):
+        """
+        The cursor pointing just past a comment, "<date_posted isoformat>,<id>".
+        """
+        return f"{comment._date_posted.isoformat()},{comment.id}"
+
+    @staticmethod
+    def read_page(post_id, limit=20, cursor=None):
+        """
+        Reads one page of a post's comments, oldest first.
+
+        Pages are keyset paginated on (_date_posted, id): a cursor names the last comment of the previous
+        page and the next page starts right after it, walking ix_carcomments_post_id_date_posted instead of
+        counting past an OFFSET.
+
+        Args:
+            post_id (int): The car post whose comments to read.
+            limit (int, optional): The maximum number of comments on the page. Defaults to 20.
+            cursor (str, optional): The next_cursor of the previous page. Defaults to the first page.
+
+        Returns:
+            dict: The comments, the post's total comment count and the cursor of the next page (None on the last page).
+
+        Raises:
+            ValueError: The cursor is malformed.
+        """
+        query = CarComments.query.filter(CarComments._post_id == post_id)
+        total = query.count()
+        if cursor:
+            date_posted, comment_id = cursor.rsplit(",", 1)
+            date_posted, comment_id = datetime.fromisoformat(date_posted), int(comment_id)
+            query = query.filter(db.or_(
+                CarComments._date_posted > date_posted,
+                db.and_(CarComments._date_posted == date_posted, CarComments.id > comment_id)
+            ))
+        # Fetch one extra row to learn whether another page follows
+        comments = query.order_by(CarComments._date_posted, CarComments.id).limit(limit + 1).all()
+        next_cursor = CarComments.encode_cursor(comments[limit - 1]) if len(comments) > limit else None
+        return {
+            "post_id": post_id,
+            "comments": CarComments.read_all(comments[:limit]),
+            "total": total,
+            "next_cursor": next_cursor
+        }
     
     def update(self, data=None):
         
@@ -115,13 +181,11 @@ class CarComments(db.Model):
         
     @staticmethod
     def restore(data):
-        users = {}
-        for carComment_data in data:
-            id = carComment_data.get("id")
-            comment = CarComments.query.filter_by(id=id).first()
-            if comment:
-                comment.update(carComment_data)
-            else:
-                comment = CarComments(carComment_data.get("uid"), carComment_data.get("postid"), carComment_data.get("content"), carComment_data.get("date_posted"))
-                comment.create()
-        return users
\ No newline at end of file
+        """
+        Upserts carComments records from a backup, in bulk (see model/restore.py).
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("carComments", data)["ids"]
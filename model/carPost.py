@@ -1,5 +1,7 @@
 from sqlite3 import IntegrityError
 from sqlalchemy import Text
+import ast
+import json
 from __init__ import app, db
 from model.user import User
 from model.group import Group
@@ -47,7 +49,7 @@ class CarPost(db.Model):
         self._description = description
         self._uid = uid
         self._car_type = car_type
-        self._image_url_table = image_url_table
+        self._image_url_table = image_url_table if isinstance(image_url_table, str) else str(image_url_table)
         if not input_datetime:
             self._date_posted = datetime.now()
         else:
@@ -82,33 +84,74 @@ class CarPost(db.Model):
             db.session.rollback()
             raise error
         
-    def read(self):
+    @property
+    def image_url_table(self):
+        """
+        The image names of the post as a list.
+
+        The column holds the str() of a Python list (e.g. "['a.png', 'b.png']"), older rows may hold JSON.
+        """
+        value = self._image_url_table
+        if not value:
+            return []
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+
+    def read(self, user_data=None):
         """
         The read method retrieves the object data from the object's attributes and returns it as a dictionary.
         
         Uses:
-            The Group.query and User.query methods to retrieve the group and user objects.
+            The User.query method to retrieve the user object, unless the caller already has it (see read_all).
+
+        Args:
+            user_data (dict, optional): The nested user object, as built by User.summary. Defaults to looking it up.
         
         Returns:
-            dict: A dictionary containing the post data, including user and group names.
+            dict: A dictionary containing the post data, including the nested user and the parsed image_url_table.
         """
-        user = User.query.get(self._uid)
+        if user_data is None:
+            user = db.session.get(User, self._uid)
+            user_data = user.summary() if user else None
         data = {
             "id": self.id,
             "title": self._title,
             "description": self._description,
-            "user": {
-                "name": user.read()["name"],
-                "id": user.read()["id"],
-                "uid": user.read()["uid"],
-                "email": user.read()["email"],
-                "pfp": user.read()["pfp"]
-            },
+            "user": user_data,
             "car_type": self._car_type,
-            "image_url_table": self._image_url_table,
+            "image_url_table": self.image_url_table,
             "date_posted": self._date_posted
         }
         return data
+
+    @staticmethod
+    def read_all(query=None):
+        """
+        Serializes many posts at once.
+
+        All the referenced users are fetched with one IN query and each nested user object is built
+        once, so the cost is two queries however many posts there are.
+
+        Args:
+            query (Query, optional): A CarPost query to serialize. Defaults to all posts.
+
+        Returns:
+            list: A list of dictionaries as returned by read.
+        """
+        if query is None:
+            query = CarPost.query
+        posts = query.all()
+        user_ids = {post._uid for post in posts}
+        users = {}
+        if user_ids:
+            users = {user.id: user.summary() for user in User.query.filter(User.id.in_(user_ids))}
+        return [post.read(users.get(post._uid)) for post in posts]
     
     def updateImageTable(self, image_url_table):
         self._image_url_table = str(image_url_table)
@@ -127,7 +170,8 @@ class CarPost(db.Model):
         """
         if inputs:
             self._car_type = inputs.get("car_type", self._car_type)
-            self._image_url_table = inputs.get("image_url_table", self._image_url_table)
+            image_url_table = inputs.get("image_url_table", self._image_url_table)
+            self._image_url_table = image_url_table if isinstance(image_url_table, str) else str(image_url_table)
             self._date_posted = datetime.fromisoformat(inputs.get("date_posted", self._date_posted))
             self._title = inputs.get("title", self._title)
             self._description = inputs.get("description", self._description)
@@ -155,15 +199,13 @@ class CarPost(db.Model):
             db.session.rollback()
             raise error
         
+    @staticmethod
     def restore(data):
-        users = {}
-        for carPost_data in data:
-            id = carPost_data.get("id")
-            post = CarPost.query.filter_by(id=id).first()
-            if post:
-                post.update(carPost_data)
-            else:
-                print(carPost_data)
-                post = CarPost(carPost_data.get("title"), carPost_data.get("description"), carPost_data.get("user").get("id"), carPost_data.get("car_type"), carPost_data.get("image_url_table"), carPost_data.get("date_posted"))
-                post.create()
-        return users
\ No newline at end of file
+        """
+        Upserts carPosts records from a backup, in bulk (see model/restore.py).
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("carPosts", data)["ids"]
@@ -17,6 +17,8 @@ class Channel(db.Model):
         _group_id (db.Column): An integer representing the group to which the channel belongs.
     """
     __tablename__ = 'channels'
+    # The channels of a group, and one of them by name
+    __table_args__ = (db.Index('ix_channels_group_id_name', '_group_id', '_name'),)
 
     id = db.Column(db.Integer, primary_key=True)
     _name = db.Column(db.String(255), nullable=False)
@@ -120,18 +122,15 @@ class Channel(db.Model):
         
     @staticmethod
     def restore(data):
-        channels = {}
-        for channel_data in data:
-            _ = channel_data.pop('id', None)  # Remove 'id' from channel_data
-            name = channel_data.get("name", None)
-            channel = Channel.query.filter_by(_name=name).first()
-            if channel:
-                channel.update(channel_data)
-            else:
-                channel = Channel(**channel_data)
-                channel.create()
-        return channels
-    
+        """
+        Upserts channels records from a backup, in bulk (see model/restore.py).
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("channels", data)["ids"]
+
 def initChannels():
     """
     The initChannels function creates the Channel table and adds tester data to the table.
@@ -22,7 +22,7 @@ class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     _content = db.Column(Text, nullable=False)
     _user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    _post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False)
+    _post_id = db.Column(db.Integer, db.ForeignKey('posts.id'), nullable=False, index=True)  # a post's feedback
 
     def __init__(self, content, user_id, post_id):
         """
@@ -26,7 +26,7 @@ class Group(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     _name = db.Column(db.String(255), unique=True, nullable=False)
-    _section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False)
+    _section_id = db.Column(db.Integer, db.ForeignKey('sections.id'), nullable=False, index=True)  # a section's groups
 
     channels = db.relationship('Channel', backref='group', lazy=True)
     moderators = db.relationship('User', secondary=group_moderators, lazy='subquery',
@@ -127,29 +127,19 @@ class Group(db.Model):
         
     @staticmethod
     def restore(data, users):
-        groups = {}
-        for group_data in data:
-            _ = group_data.pop('id', None)  # Remove 'id' from group_data
-            name = group_data.get("name", None)
-            group = Group.query.filter_by(_name=name).first()
-            if group:
-                group.update(group_data)
-            else:
-                group = Group(**group_data)
-                group.create() 
-
-        # Restore moderators relationship (TBD)
         """
-        for group_data in data:
-            group = groups[group_data['name']]
-            if 'moderators' in group_data:
-                for moderator_id in group_data['moderators']:
-                    moderator = users[moderator_id]
-                    group.moderators.append(moderator)
-        db.session.commit()
+        Upserts groups records from a backup, in bulk (see model/restore.py).
+
+        Args:
+            data (list): The group records of a backup.
+            users (dict): Unused, moderators are not restored yet.
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
         """
-        return groups
-            
+        from model.restore import restore_table
+        return restore_table("groups", data)["ids"]
+
 def initGroups():
     """
     The initGroups function creates the Group table and adds tester data to the table.
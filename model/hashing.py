@@ -0,0 +1,224 @@
+""" hashing.py
+Password hashing off the request thread.
+
+pbkdf2 is deliberately expensive, so hashing runs on a small dedicated pool instead of whichever
+thread is serving the request. The pool caps how many hashes run at once and how many may wait;
+when both are full it refuses new work with HashPoolSaturated instead of letting a burst of logins
+pin every server worker.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from __init__ import app
+
+
+class HashPoolSaturated(Exception):
+    """
+    Raised when the hash pool has no room for another job.
+
+    Attributes:
+        retry_after (int): Seconds the client should wait before trying again.
+    """
+    def __init__(self, retry_after):
+        super().__init__("Password hashing is at capacity, try again shortly")
+        self.retry_after = retry_after
+
+
+def normalize_method(method):
+    """
+    Spell out the parameters werkzeug fills in for a hash method, e.g. "pbkdf2:sha256" -> "pbkdf2:sha256:1000000".
+
+    Args:
+        method (str): A werkzeug hash method, with or without parameters.
+
+    Returns:
+        str: The method as werkzeug writes it into a stored hash.
+    """
+    parts = method.split(":")
+    if parts[0] == "pbkdf2":
+        hash_name = parts[1] if len(parts) > 1 else "sha256"
+        iterations = parts[2] if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    if parts[0] == "scrypt":
+        n = parts[1] if len(parts) > 1 else "32768"
+        r = parts[2] if len(parts) > 2 else "8"
+        p = parts[3] if len(parts) > 3 else "1"
+        return f"scrypt:{n}:{r}:{p}"
+    return method
+
+
+class HashPool:
+    """
+    Bounded executor for password hashing.
+
+    Hashing functions from hashlib release the GIL, so worker threads hash in parallel across cores.
+    At most workers + queue_depth jobs are accepted at once; anything beyond that is rejected immediately.
+    With workers=0 hashing runs inline on the calling thread, as it did before the pool existed, and
+    outdated hashes are left as they are. Bulk imports hash on a second executor of bulk_workers threads,
+    shared by all imports of the process.
+
+    Attributes:
+        method (str): The werkzeug hash method new hashes are created with.
+        salt_length (int): The salt length new hashes are created with.
+        accepted (int): Jobs accepted since startup.
+        rejected (int): Jobs refused because the pool was saturated.
+        rehashed (int): Stored hashes upgraded to the current parameters.
+    """
+    def __init__(self, workers, queue_depth, method="pbkdf2:sha256", salt_length=10, retry_after=1, bulk_workers=1):
+        self.workers = workers
+        self.bulk_workers = bulk_workers
+        self.queue_depth = queue_depth
+        self.method = method
+        self.salt_length = salt_length
+        self.retry_after = retry_after
+        self._target = normalize_method(method)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._executor = None
+        self._bulk_executor = None
+        # gunicorn --preload forks after import, the child cannot reuse the parent's worker threads
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._executor = None
+        self._bulk_executor = None
+
+    def _reserve(self):
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_depth:
+                self.rejected += 1
+                return False
+            self._in_flight += 1
+            self.accepted += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hash")
+            return True
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, fn, *args):
+        if not self._reserve():
+            raise HashPoolSaturated(self.retry_after)
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def generate(self, password):
+        """
+        Hash a password with the current parameters.
+
+        Raises:
+            HashPoolSaturated: The pool is full.
+        """
+        if self.workers == 0:
+            return generate_password_hash(password, self.method, salt_length=self.salt_length)
+        return self._submit(generate_password_hash, password, self.method, self.salt_length).result()
+
+    def generate_many(self, passwords):
+        """
+        Hash many passwords at once, for bulk imports.
+
+        The batch runs on the bulk executor rather than on the request pool: an import of thousands of
+        users would otherwise fill the pool and turn logins away with 503. The bulk executor has
+        bulk_workers threads for the whole process, so concurrent imports queue behind each other
+        instead of each bringing threads of its own, and the other cores stay free for logins.
+
+        Args:
+            passwords (list): The plaintext passwords.
+
+        Returns:
+            list: The hashes, in the same order.
+        """
+        def generate(password):
+            return generate_password_hash(password, self.method, salt_length=self.salt_length)
+
+        if self.bulk_workers == 0:
+            return [generate(password) for password in passwords]
+        with self._lock:
+            if self._bulk_executor is None:
+                self._bulk_executor = ThreadPoolExecutor(max_workers=self.bulk_workers, thread_name_prefix="hash-bulk")
+            executor = self._bulk_executor
+        return list(executor.map(generate, passwords))
+
+    def check(self, pwhash, password):
+        """
+        Check a password against a stored hash.
+
+        Raises:
+            HashPoolSaturated: The pool is full.
+        """
+        if self.workers == 0:
+            return check_password_hash(pwhash, password)
+        return self._submit(check_password_hash, pwhash, password).result()
+
+    def needs_rehash(self, pwhash):
+        """
+        Checks if a stored hash was created with other parameters than the current ones.
+
+        Args:
+            pwhash (str): A hash as stored in the database, "method$salt$hash".
+
+        Returns:
+            bool: True if the hash should be regenerated at the next chance.
+        """
+        try:
+            method, salt, _ = pwhash.split("$", 2)
+        except ValueError:
+            return True
+        return normalize_method(method) != self._target or len(salt) < self.salt_length
+
+    def rehash_later(self, password, on_done):
+        """
+        Hash a password in the background and pass the new hash to on_done (on a pool thread).
+        Best effort: when the pool is busy the rehash is skipped, the next login will try again.
+
+        Args:
+            password (str): The plaintext password that just verified against the outdated hash.
+            on_done (callable): Called with the new hash.
+
+        Returns:
+            bool: True if the rehash was scheduled.
+        """
+        def rehash():
+            on_done(generate_password_hash(password, self.method, salt_length=self.salt_length))
+            with self._lock:
+                self.rehashed += 1
+
+        if self.workers == 0 or not self._reserve():
+            return False
+        self._executor.submit(rehash).add_done_callback(self._release)
+        return True
+
+    def stats(self):
+        """
+        Returns:
+            dict: Pool limits and counters, for monitoring.
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "bulk_workers": self.bulk_workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed
+            }
+
+
+hash_pool = HashPool(
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    queue_depth=app.config['PASSWORD_HASH_QUEUE'],
+    method=app.config['PASSWORD_HASH_METHOD'],
+    retry_after=app.config['PASSWORD_HASH_RETRY_AFTER'],
+    bulk_workers=app.config['PASSWORD_HASH_BULK_WORKERS']
+)
@@ -5,6 +5,8 @@ from sqlalchemy.exc import IntegrityError
 
 class UserItem(db.Model):
     __tablename__ = "user_items"
+    # An item by name, alone or for one user
+    __table_args__ = (db.Index('ix_user_items_name_user_id', 'name', 'user_id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(255), nullable=False)
@@ -56,29 +58,14 @@ class UserItem(db.Model):
         
     @staticmethod
     def restore(data):
-        for post_data in data:
-            post_data.pop('id', None)  # Remove 'id' from post_data
-            
-            name = post_data.get("name")
-            user_id = post_data.get("user_id")
-            post = UserItem.query.filter_by(name=name, user_id=user_id).first()
-            
-            if post:
-                if "user_input" in post_data:
-                    post.user_input = post_data["user_input"]
-                db.session.commit()
-            else:
-                date_added = post_data.get("date_added")
-                if isinstance(date_added, str):  # Convert string to datetime if needed
-                    date_added = datetime.fromisoformat(date_added)
-                post = UserItem(
-                    name=post_data["name"],
-                    user_id=post_data["user_id"],
-                    user_input=post_data.get("user_input"),
-                    date_added=date_added
-                )
-                post.create()
+        """
+        Upserts user_items records from a backup, in bulk (see model/restore.py).
 
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("user_items", data)["ids"]
 
 def initDefaultUser():
     """
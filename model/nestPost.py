@@ -24,7 +24,7 @@ class NestPost(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     _title = db.Column(db.String(255), nullable=False)
     _content = db.Column(Text, nullable=False)
-    _user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    _user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # a user's posts
     _group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
     _image_url = db.Column(db.String(255), nullable=False)
 
@@ -0,0 +1,88 @@
+""" pool.py
+The database connection pool, with the numbers that show when it runs short.
+
+SQLAlchemy's QueuePool keeps DB_POOL_SIZE connections per worker and opens up to DB_MAX_OVERFLOW
+more under load; a request that finds all of them in use waits up to DB_POOL_TIMEOUT seconds and
+then fails with a TimeoutError. Nothing records how close the pool got to that. TimedQueuePool is
+the same pool timing every checkout, so /health can report how many connections are in use, how
+far into overflow the worker went, how long requests waited for a connection and how many gave up.
+
+This module does not import the app: __init__.py names the pool class in the engine options.
+"""
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """
+    A QueuePool recording how long each checkout took to get a connection.
+
+    The time covers waiting for a connection to be returned and opening a new one (the pool does
+    either when none is idle), so a slow database server shows here too; checkouts that timed out
+    count with the time they waited.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._record(time.perf_counter() - start, timed_out=True)
+            print(f"Warning: no database connection free within {self._timeout}s: {self.stats()}")
+            raise
+        self._record(time.perf_counter() - start)
+        return connection
+
+    def _record(self, waited, timed_out=False):
+        with self._stats_lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+
+    def stats(self):
+        """
+        Returns:
+            dict: Connections in use and idle, overflow, checkouts, wait times (ms) and timeouts of this process.
+        """
+        with self._stats_lock:
+            return {
+                "size": self.size(),
+                "max_overflow": self._max_overflow,
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "overflow": max(0, self.overflow()),
+                "peak_checked_out": self.peak_checked_out,
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(self.wait_total / (self.checkouts + self.timeouts) * 1000, 3) if self.checkouts + self.timeouts else 0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+                "timeouts": self.timeouts
+            }
+
+
+def pool_stats(engines):
+    """
+    Args:
+        engines (dict): Bind key -> engine, as db.engines returns them.
+
+    Returns:
+        dict: Bind name ("default" for the main database) -> stats of its pool, or the pool class when it keeps none.
+    """
+    return {
+        key or "default": engine.pool.stats() if isinstance(engine.pool, TimedQueuePool) else {"pool": type(engine.pool).__name__}
+        for key, engine in engines.items()
+    }
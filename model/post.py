@@ -1,8 +1,11 @@
 # post.py
 import logging
+import math
+from datetime import datetime
 from sqlite3 import IntegrityError
-from sqlalchemy import Text, JSON
+from sqlalchemy import Text, JSON, tuple_, update
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from __init__ import app, db
 from model.user import User
 from model.channel import Channel
@@ -20,15 +23,33 @@ class Post(db.Model):
         _content (db.Column): A JSON blob representing the content of the post.
         _user_id (db.Column): An integer representing the user who created the post.
         _channel_id (db.Column): An integer representing the channel to which the post belongs.
+        _upvotes (db.Column): The number of upvotes, maintained by Vote in the same transaction as the votes.
+        _downvotes (db.Column): The number of downvotes, maintained the same way.
+        _date_posted (db.Column): When the post was created, the age term of the hot score.
+        _score (db.Column): Upvotes minus downvotes, the "top" feed order.
+        _hot_score (db.Column): The "hot" feed order, see hot_score.
     """
     __tablename__ = 'posts'
+    # Each feed page is a range scan of one of these, globally or within a channel
+    __table_args__ = (
+        db.Index('ix_posts_hot_score', '_hot_score', 'id'),
+        db.Index('ix_posts_channel_id_hot_score', '_channel_id', '_hot_score', 'id'),
+        db.Index('ix_posts_score', '_score', 'id'),
+        db.Index('ix_posts_channel_id_score', '_channel_id', '_score', 'id'),
+    )
+    FEED_EPOCH = datetime(2025, 1, 1)  # origin of the age term, any fixed time works
 
     id = db.Column(db.Integer, primary_key=True)
     _title = db.Column(db.String(255), nullable=False)
     _comment = db.Column(db.String(255), nullable=False)
     _content = db.Column(JSON, nullable=False)
-    _user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    _user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # a user's posts
     _channel_id = db.Column(db.Integer, db.ForeignKey('channels.id'), nullable=False)
+    _upvotes = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    _downvotes = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    _date_posted = db.Column(db.DateTime, default=datetime.utcnow, nullable=True)
+    _score = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    _hot_score = db.Column(db.Double, default=0, server_default='0', nullable=False)  # double precision: feed cursors compare it exactly
 
     def __init__(self, title, comment, user_id=None, channel_id=None, content={}, user_name=None, channel_name=None):
         """
@@ -46,6 +67,11 @@ class Post(db.Model):
         self._user_id = user_id
         self._channel_id = channel_id
         self._content = content
+        self._upvotes = 0
+        self._downvotes = 0
+        self._date_posted = datetime.utcnow()
+        self._score = 0
+        self._hot_score = Post.hot_score(0, self._date_posted)
 
     def __repr__(self):
         """
@@ -78,24 +104,241 @@ class Post(db.Model):
         The read method retrieves the object data from the object's attributes and returns it as a dictionary.
         
         Uses:
-            The Channel.query and User.query methods to retrieve the channel and user objects.
+            The author and channel relationships, which are already loaded when the post came from read_all.
         
         Returns:
             dict: A dictionary containing the post data, including user and channel names.
         """
-        user = User.query.get(self._user_id)
-        channel = Channel.query.get(self._channel_id)
+        user = self.author
+        channel = self.channel
         data = {
             "id": self.id,
             "title": self._title,
             "comment": self._comment,
             "content": self._content,
             "user_name": user.name if user else None,
-            "channel_name": channel.name if channel else None
+            "channel_name": channel.name if channel else None,
+            "upvote_count": self._upvotes,
+            "downvote_count": self._downvotes,
+            "score": self._score,
+            "hot_score": self._hot_score,
+            "date_posted": self._date_posted.isoformat() if self._date_posted else None
         }
         return data
     
 
+    @staticmethod
+    def hot_score(score, date_posted):
+        """
+        The hot score of a post: the order of magnitude of its vote balance plus its age term.
+
+        Every FEED_HOT_DECAY seconds of age are worth a factor 10 in vote balance, so newer posts rise
+        above older ones with the same votes. Instead of lowering every stored score as time passes,
+        the age term grows with the creation time: that ranks posts exactly as a score that decays
+        with age would, and a post's score only changes when its votes do.
+
+        Args:
+            score (int): Upvotes minus downvotes.
+            date_posted (datetime): When the post was created.
+
+        Returns:
+            float: The score, higher is hotter.
+        """
+        order = math.log10(max(abs(score), 1))
+        sign = 1 if score > 0 else -1 if score < 0 else 0
+        age = ((date_posted or Post.FEED_EPOCH) - Post.FEED_EPOCH).total_seconds()
+        return round(sign * order + age / app.config['FEED_HOT_DECAY'], 7)
+
+    @staticmethod
+    def rescore(post_id):
+        """
+        Recompute the stored scores of one post from its vote counters, in the current transaction.
+        Called by Vote whenever it changes the counters.
+        """
+        row = db.session.query(Post._upvotes, Post._downvotes, Post._date_posted).filter(Post.id == post_id).first()
+        if row is None:
+            return
+        score = row[0] - row[1]
+        db.session.execute(
+            update(Post).where(Post.id == post_id).values(_score=score, _hot_score=Post.hot_score(score, row[2]))
+        )
+
+    @staticmethod
+    def rescore_all(batch_size=500):
+        """
+        Recompute the stored scores of every post, batch_size posts per transaction.
+
+        This is the periodic feed job (scripts/feed_rescore.py): it fills the scores of posts created
+        before they existed, re-derives them after FEED_HOT_DECAY changes, and repairs any drift from
+        counters edited outside of Vote.
+
+        Returns:
+            int: The number of posts whose scores changed.
+        """
+        changed = 0
+        last_id = 0
+        while True:
+            rows = db.session.query(Post.id, Post._upvotes, Post._downvotes, Post._date_posted, Post._score, Post._hot_score) \
+                .filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+            if not rows:
+                return changed
+            updates = []
+            for post_id, upvotes, downvotes, date_posted, score, hot in rows:
+                new_score = upvotes - downvotes
+                new_hot = Post.hot_score(new_score, date_posted)
+                if new_score != score or new_hot != hot:
+                    updates.append({"id": post_id, "_score": new_score, "_hot_score": new_hot})
+            if updates:
+                db.session.execute(update(Post), updates)
+            db.session.commit()
+            changed += len(updates)
+            last_id = rows[-1][0]
+
+    @staticmethod
+    def feed(sort="hot", channel_id=None, limit=20, cursor=None):
+        """
+        Reads one page of the hot or top feed, globally or for one channel.
+
+        Pages are keyset paginated on (score, id), descending: the cursor names the last post of the
+        previous page, so each page is a range scan of a feed index, however deep the client pages.
+
+        Args:
+            sort (str, optional): "hot" or "top". Defaults to "hot".
+            channel_id (int, optional): Only posts in this channel. Defaults to all channels.
+            limit (int, optional): The maximum number of posts on the page. Defaults to 20.
+            cursor (str, optional): The next_cursor of the previous page. Defaults to the first page.
+
+        Returns:
+            dict: The posts, as returned by read, and the cursor of the next page (None on the last page).
+
+        Raises:
+            ValueError: The sort or the cursor is invalid.
+        """
+        if sort not in ("hot", "top"):
+            raise ValueError("sort must be hot or top")
+        column = Post._hot_score if sort == "hot" else Post._score
+        query = Post.query
+        if channel_id is not None:
+            query = query.filter(Post._channel_id == channel_id)
+        if cursor:
+            value, post_id = cursor.rsplit(",", 1)
+            value = float(value) if sort == "hot" else int(value)
+            query = query.filter(tuple_(column, Post.id) < tuple_(value, int(post_id)))
+        # Fetch one extra row to learn whether another page follows
+        query = query.order_by(column.desc(), Post.id.desc()).limit(limit + 1)
+        posts = Post.read_all(query)
+        next_cursor = None
+        if len(posts) > limit:
+            posts = posts[:limit]
+            last = posts[-1]
+            next_cursor = f"{last['hot_score'] if sort == 'hot' else last['score']!r},{last['id']}"
+        return {"sort": sort, "channel_id": channel_id, "posts": posts, "next_cursor": next_cursor}
+
+    @staticmethod
+    def import_many(rows, default_user_id, chunk_size=500):
+        """
+        Creates many posts in one transaction, then yields a result per row.
+
+        Authors and channels of the whole batch are resolved up front with one IN query per kind of
+        reference, the posts are then added and flushed chunk_size at a time and committed once at the end.
+        Nothing is yielded before the commit or the rollback: the write transaction, and with SQLite the
+        lock on the whole database, never waits on the client reading the results.
+
+        A row needs "title" and "comment" plus a channel, as "channel_id" or "channel_name", and may name its
+        author as "user_id", "uid" or "user_name" (as written by read); rows without an author get default_user_id.
+
+        Args:
+            rows (list): Dictionaries of post data.
+            default_user_id (int): The author of rows that do not name one.
+            chunk_size (int, optional): Posts per flush. Defaults to 500.
+
+        Yields:
+            dict: {"row", "error"} for every rejected row and, if the transaction committed, {"row", "id"} for
+            every created post, in row order; finally a summary {"committed", "success_count", "error_count"}.
+        """
+        def lookup(column, key_column, values):
+            values = list({value for value in values if value is not None})
+            found = {}
+            for start in range(0, len(values), chunk_size):
+                found.update((key, id) for id, key in db.session.query(column, key_column).filter(key_column.in_(values[start:start + chunk_size])))
+            return found
+
+        dicts = [row if isinstance(row, dict) else {} for row in rows]
+        channel_ids = lookup(Channel.id, Channel.id, [row.get("channel_id") for row in dicts])
+        channel_names = lookup(Channel.id, Channel._name, [row.get("channel_name") for row in dicts if row.get("channel_id") is None])
+        user_ids = lookup(User.id, User.id, [row.get("user_id") for row in dicts])
+        user_uids = lookup(User.id, User._uid, [row.get("uid") for row in dicts if row.get("user_id") is None])
+        user_names = lookup(User.id, User._name, [row.get("user_name") for row in dicts if row.get("user_id") is None and row.get("uid") is None])
+
+        errors = []  # {"row", "error"}
+        posts = []  # (row index, post)
+        pending = 0  # posts added since the last flush
+        committed = False
+        try:
+            for index, row in enumerate(rows):
+                error = None
+                if not isinstance(row, dict):
+                    error = "Expected an object with post data"
+                elif not row.get("title") or not row.get("comment"):
+                    error = "Post title and comment are required"
+                if error is None:
+                    channel_id = channel_ids.get(row["channel_id"]) if row.get("channel_id") is not None else channel_names.get(row.get("channel_name"))
+                    if row.get("user_id") is not None:
+                        user_id = user_ids.get(row["user_id"])
+                    elif row.get("uid") is not None:
+                        user_id = user_uids.get(row["uid"])
+                    elif row.get("user_name") is not None:
+                        user_id = user_names.get(row["user_name"])
+                    else:
+                        user_id = default_user_id
+                    if channel_id is None:
+                        error = "Channel not found"
+                    elif user_id is None:
+                        error = "User not found"
+                if error is not None:
+                    errors.append({"row": index, "error": error})
+                    continue
+                post = Post(row["title"], row["comment"], user_id, channel_id, row.get("content") or {})
+                db.session.add(post)
+                posts.append((index, post))
+                pending += 1
+                if pending >= chunk_size:
+                    db.session.flush()
+                    pending = 0
+            db.session.flush()
+            created = [{"row": index, "id": post.id} for index, post in posts]
+            db.session.commit()
+            committed = True
+        except Exception as e:
+            db.session.rollback()
+            yield from errors
+            yield {"committed": False, "error": str(e), "success_count": 0, "error_count": len(errors)}
+            return
+        finally:
+            if not committed:
+                db.session.rollback()  # also when the client went away (GeneratorExit) before the commit
+        yield from sorted(errors + created, key=lambda result: result["row"])
+        yield {"committed": True, "success_count": len(created), "error_count": len(errors)}
+
+    @staticmethod
+    def read_all(query=None):
+        """
+        Serializes many posts at once.
+
+        The posts are loaded together with their authors and channels in a single joined SELECT, so
+        serializing a list costs one query however long it is, instead of two more per post.
+
+        Args:
+            query (Query, optional): A Post query to serialize, e.g. Post.query.filter_by(...). Defaults to all posts.
+
+        Returns:
+            list: A list of dictionaries as returned by read.
+        """
+        if query is None:
+            query = Post.query
+        posts = query.options(joinedload(Post.author), joinedload(Post.channel)).all()
+        return [post.read() for post in posts]
+
     def update(self):
         """
         Updates the post object with new data.
@@ -165,17 +408,15 @@ class Post(db.Model):
         
     @staticmethod
     def restore(data):
-        for post_data in data:
-            _ = post_data.pop('id', None)  # Remove 'id' from post_data
-            title = post_data.get("title", None)
-            post = Post.query.filter_by(_title=title).first()
-            if post:
-                post.update(post_data)
-            else:
-                post = Post(**post_data)
-                post.update(post_data)
-                post.create()
-        
+        """
+        Upserts posts records from a backup, in bulk (see model/restore.py).
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("posts", data)["ids"]
+
 def initPosts():
     """
     The initPosts function creates the Post table and adds tester data to the table.
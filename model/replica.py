@@ -0,0 +1,158 @@
+""" replica.py
+Sends the reads of read-only requests to a replica database, and everything else to the primary.
+
+With DB_REPLICA_URI set, the replica is the "replica" bind and the session routes each statement:
+
+- SELECTs of a GET, HEAD or OPTIONS request go to the replica;
+- everything else goes to the primary: writes and flushes, raw connections and text() statements,
+  non-GET requests, and work outside a request (scripts, seeders, background threads).
+
+Once a request writes, its remaining reads go to the primary, and the response sets a cookie that
+keeps the browser's reads on the primary for DB_REPLICA_STICKY_SECONDS, so a user sees their own
+writes while the replica catches up. The cookie travels with the user to every worker, no state is
+shared between processes. Clients that send only a bearer token and keep no cookies do not get this.
+
+Tables of other binds keep their own engines; only the default database is replicated. Locally,
+ReplicaLagSimulator plays a lagging replica with two SQLite files (scripts/db_replica_sim.py).
+
+This module does not import the app: __init__.py names RoutingSession in the session options and
+calls init_read_replica from create_app.
+"""
+import sqlite3
+import time
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import CompoundSelect, Select
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = "replica"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RoutingSession(Session):
+    """
+    A Flask-SQLAlchemy session choosing between the primary and the replica per statement.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not has_request_context():
+            return engine
+        engines = self._db.engines
+        if REPLICA_BIND not in engines or engine is not engines.get(None):
+            return engine
+        if self._flushing or isinstance(clause, UpdateBase):
+            g.db_wrote = True
+            return engine
+        if g.get("db_read_replica") and not g.get("db_wrote") and isinstance(clause, (Select, CompoundSelect)):
+            return engines[REPLICA_BIND]
+        return engine
+
+
+def init_read_replica(app):
+    """
+    Decide per request whether its reads may use the replica, and keep users who just wrote on the primary.
+
+    Args:
+        app (Flask): The app, with DB_REPLICA_STICKY_SECONDS and DB_REPLICA_STICKY_COOKIE set.
+    """
+    cookie = app.config['DB_REPLICA_STICKY_COOKIE']
+
+    @app.before_request
+    def route_reads():
+        try:
+            sticky = float(request.cookies.get(cookie, 0)) > time.time()
+        except ValueError:
+            sticky = False
+        g.db_read_replica = request.method in READ_METHODS and not sticky
+
+    @app.after_request
+    def stick_to_primary(response):
+        window = app.config['DB_REPLICA_STICKY_SECONDS']
+        if g.get("db_wrote") and window > 0:
+            response.set_cookie(cookie, str(int(time.time() + window) + 1), max_age=window + 1, httponly=True,
+                                secure=request.is_secure, samesite="None" if request.is_secure else "Lax")
+        return response
+
+
+class ReplicaLagSimulator:
+    """
+    Keeps a SQLite replica a fixed time behind a SQLite primary, to try the routing locally.
+
+    Every interval the primary is copied into memory with the online backup API; once a copy is lag
+    seconds old it is written over the replica. The replica is thus always between lag and
+    lag + interval seconds behind, like a replica applying a stream of changes late.
+
+    Attributes:
+        primary (str): The primary database file.
+        replica (str): The replica database file, created if missing.
+        lag (float): Seconds the replica is behind.
+        interval (float): Seconds between copies of the primary.
+    """
+    def __init__(self, primary, replica, lag=2.0, interval=0.5):
+        self.primary = primary
+        self.replica = replica
+        self.lag = lag
+        self.interval = interval
+        self._copies = []  # (time taken, in-memory copy), oldest first
+        self._last_copy = 0.0
+        self.applied = None  # when the copy the replica holds was taken
+
+    def _write_replica(self, source):
+        replica = sqlite3.connect(self.replica, timeout=30)
+        try:
+            source.backup(replica)
+        finally:
+            replica.close()
+
+    def sync(self):
+        """
+        Make the replica equal to the primary now, as at the start of a session.
+        """
+        for _, copy in self._copies:
+            copy.close()
+        self._copies = []
+        primary = sqlite3.connect(self.primary)
+        try:
+            self._write_replica(primary)
+        finally:
+            primary.close()
+        self.applied = time.time()
+
+    def step(self, now=None):
+        """
+        Copy the primary if the interval has passed, and apply the newest copy that is lag seconds old.
+
+        Returns:
+            float: When the copy applied to the replica was taken, or None if none was due.
+        """
+        now = time.time() if now is None else now
+        if now - self._last_copy >= self.interval:
+            primary, copy = sqlite3.connect(self.primary), sqlite3.connect(":memory:")
+            try:
+                primary.backup(copy)
+            finally:
+                primary.close()
+            self._copies.append((now, copy))
+            self._last_copy = now
+        due = [(taken, copy) for taken, copy in self._copies if now - taken >= self.lag]
+        if not due:
+            return None
+        self._copies = self._copies[len(due):]
+        for _, copy in due[:-1]:
+            copy.close()
+        taken, copy = due[-1]
+        try:
+            self._write_replica(copy)
+        finally:
+            copy.close()
+        self.applied = taken
+        return taken
+
+    def run(self):
+        """
+        Step until interrupted.
+        """
+        while True:
+            self.step()
+            time.sleep(min(self.interval, self.lag) / 2 or 0.05)
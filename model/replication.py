@@ -0,0 +1,507 @@
+""" replication.py
+Continuous WAL shipping and point-in-time restore for the SQLite database.
+
+WalReplicator follows the database's write-ahead log and copies every committed frame into a
+WalArchive on local disk, the way Litestream does:
+
+- The archive is a series of generations. A generation starts with a snapshot of the database
+  and continues with WAL segments: the frames of one or more transactions, as copied from the
+  WAL at one sync. Positions are (index, offset): the index counts WAL restarts within the
+  generation, the offset is the byte offset in that WAL.
+- The replicator keeps a read transaction open on the database. SQLite does not restart the WAL
+  while a reader uses it, so no frame can be overwritten before it has been copied.
+- When the WAL grows past checkpoint_pages, the replicator takes the write lock, copies the last
+  frames, checkpoints and lets the WAL restart. The salt in the WAL header tells a restart the
+  replicator saw apart from one it missed (another process checkpointed while the replicator was
+  down); a missed one starts a new generation.
+- Every snapshot_interval the segments are compacted into a new snapshot, offline from the
+  archive; snapshots and segments older than the retention are pruned.
+
+Restoring to a point in time decompresses the newest snapshot taken before it and writes the
+pages of the segments captured before it over the snapshot, so it takes time proportional to
+the changes since that snapshot. Segments are stamped with the time they were copied, which
+makes the sync interval the granularity of a point-in-time restore.
+"""
+import datetime
+import gzip
+import json
+import os
+import secrets
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+
+WAL_HEADER_SIZE = 32
+FRAME_HEADER_SIZE = 24
+GENERATION_FILE = "generation.json"
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def to_ms(value):
+    """
+    Milliseconds since the epoch of a datetime or ISO 8601 string; naive values are taken as UTC.
+    """
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def _checksum(data, s0, s1, big_endian):
+    # The WAL checksum: a running sum over pairs of 32-bit words, in the byte order the WAL header magic names
+    words = struct.unpack(f"{'>' if big_endian else '<'}{len(data) // 4}I", data)
+    for i in range(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + words[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+def _file_name(index, offset, ms, suffix):
+    return f"{index:08x}-{offset:016x}-{ms:013d}{suffix}"
+
+
+def _parse_name(name, suffix):
+    index, offset, ms = name[:-len(suffix)].split("-")
+    return int(index, 16), int(offset, 16), int(ms)
+
+
+def _write_atomic(path, chunks):
+    # Readers of the archive never see a half written file
+    with gzip.open(path + ".tmp", "wb", compresslevel=6) as out:
+        for chunk in chunks:
+            out.write(chunk)
+    os.replace(path + ".tmp", path)
+
+
+def _read_file(path, block=1 << 20):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            yield chunk
+
+
+def apply_frames(db_file, frames, page_size):
+    """
+    Write the pages of WAL frames into a database file, as a checkpoint would.
+
+    Args:
+        db_file (file): The database file, opened for reading and writing.
+        frames (bytes): Whole frames, ending with a commit frame.
+        page_size (int): The database page size.
+    """
+    frame_size = FRAME_HEADER_SIZE + page_size
+    for start in range(0, len(frames), frame_size):
+        page, commit = struct.unpack_from(">II", frames, start)
+        db_file.seek((page - 1) * page_size)
+        db_file.write(frames[start + FRAME_HEADER_SIZE:start + frame_size])
+        if commit:
+            # A commit frame carries the size of the database after the transaction
+            db_file.truncate(commit * page_size)
+
+
+class WalArchive:
+    """
+    Snapshots and WAL segments on local disk.
+
+    Layout: <path>/<generation>/generation.json, snapshots/<index>-<offset>-<ms>.db.gz and
+    wal/<index>-<offset>-<ms>.wal.gz, where ms is when the state was captured. Generation names
+    start with their creation time, so they sort in order.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def generations(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if os.path.isfile(os.path.join(self.path, name, GENERATION_FILE)))
+
+    def generation_info(self, generation):
+        with open(os.path.join(self.path, generation, GENERATION_FILE)) as f:
+            return json.load(f)
+
+    def new_generation(self, page_size, database):
+        generation = f"{_now_ms():013d}-{secrets.token_hex(4)}"
+        path = os.path.join(self.path, generation)
+        os.makedirs(os.path.join(path, "snapshots"))
+        os.makedirs(os.path.join(path, "wal"))
+        with open(os.path.join(path, GENERATION_FILE), "w") as f:
+            json.dump({"page_size": page_size, "database": database, "created_at": _now_ms()}, f)
+        return generation
+
+    def _list(self, generation, kind, suffix):
+        directory = os.path.join(self.path, generation, kind)
+        return sorted(
+            _parse_name(name, suffix) + (os.path.join(directory, name),)
+            for name in os.listdir(directory) if name.endswith(suffix)
+        )
+
+    def snapshots(self, generation):
+        """
+        Returns:
+            list: (index, offset, ms, path) of the generation's snapshots, oldest first.
+        """
+        return self._list(generation, "snapshots", ".db.gz")
+
+    def segments(self, generation):
+        """
+        Returns:
+            list: (index, offset, ms, path) of the generation's WAL segments, in WAL order.
+        """
+        return self._list(generation, "wal", ".wal.gz")
+
+    def write_snapshot(self, generation, index, offset, ms, chunks):
+        _write_atomic(os.path.join(self.path, generation, "snapshots", _file_name(index, offset, ms, ".db.gz")), chunks)
+
+    def write_segment(self, generation, index, offset, ms, frames):
+        _write_atomic(os.path.join(self.path, generation, "wal", _file_name(index, offset, ms, ".wal.gz")), [frames])
+
+    def _materialize(self, generation, target, until=None):
+        """
+        Rebuild a generation's database in target from its newest snapshot at or before until.
+
+        Returns:
+            tuple: (index, offset, ms) of the restored state and the number of segments applied, or None.
+        """
+        page_size = self.generation_info(generation)["page_size"]
+        snapshots = [s for s in self.snapshots(generation) if until is None or s[2] <= until]
+        if not snapshots:
+            return None
+        index, offset, ms, path = snapshots[-1]
+        with gzip.open(path, "rb") as source, open(target, "wb") as out:
+            shutil.copyfileobj(source, out, 1 << 20)
+        applied = 0
+        with open(target, "r+b") as db_file:
+            for seg_index, seg_offset, seg_ms, seg_path in self.segments(generation):
+                if (seg_index, seg_offset) < (index, offset):
+                    continue
+                if until is not None and seg_ms > until:
+                    break
+                with gzip.open(seg_path, "rb") as f:
+                    frames = f.read()
+                apply_frames(db_file, frames, page_size)
+                index, offset, ms = seg_index, seg_offset + len(frames), seg_ms
+                applied += 1
+            db_file.flush()
+            os.fsync(db_file.fileno())
+        return (index, offset, ms), applied
+
+    def restore(self, target, timestamp=None):
+        """
+        Rebuild the database as it was at a point in time.
+
+        Args:
+            target (str): Path of the database file to write; an existing file is replaced.
+            timestamp (datetime | str, optional): The point in time (naive values are UTC). Defaults to the latest state.
+
+        Returns:
+            dict: The generation used, the number of segments applied and the time of the restored state.
+        """
+        until = to_ms(timestamp) if timestamp is not None else None
+        for generation in reversed(self.generations()):
+            temp = target + ".restoring"
+            result = self._materialize(generation, temp, until)
+            if result is None:
+                continue  # this generation starts after the point in time
+            (_, _, ms), applied = result
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(target + suffix):
+                    os.remove(target + suffix)
+            os.replace(temp, target)
+            return {"generation": generation, "segments": applied, "restored_to": ms}
+        raise ValueError(f"No snapshot in {self.path} is older than {timestamp}")
+
+    def compact(self, generation):
+        """
+        Fold a generation's segments into a new snapshot, without touching the live database.
+
+        Returns:
+            bool: Whether a snapshot was written.
+        """
+        temp = os.path.join(self.path, generation, "compact.db")
+        try:
+            result = self._materialize(generation, temp)
+            if result is None or result[1] == 0:
+                return False
+            (index, offset, ms), _ = result
+            self.write_snapshot(generation, index, offset, ms, _read_file(temp))
+            return True
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def prune(self, retention, keep=None):
+        """
+        Delete what a restore to a point within the last retention seconds does not need.
+
+        Args:
+            retention (float): Seconds of history to keep restorable.
+            keep (str, optional): A generation never to delete, the one being written.
+
+        Returns:
+            int: The number of files deleted.
+        """
+        cutoff = _now_ms() - int(retention * 1000)
+        generations = self.generations()
+        deleted = 0
+        for position, generation in enumerate(generations):
+            following = generations[position + 1] if position + 1 < len(generations) else None
+            # A generation is only needed up to the creation of the next one
+            if generation != keep and following and int(following.split("-")[0]) <= cutoff:
+                deleted += len(self.snapshots(generation)) + len(self.segments(generation))
+                shutil.rmtree(os.path.join(self.path, generation))
+                continue
+            snapshots = [s for s in self.snapshots(generation) if s[2] <= cutoff]
+            if not snapshots:
+                continue
+            base = snapshots[-1]
+            for old in self.snapshots(generation):
+                if old[2] < base[2]:
+                    os.remove(old[3])
+                    deleted += 1
+            for segment in self.segments(generation):
+                if segment[:2] < base[:2]:
+                    os.remove(segment[3])
+                    deleted += 1
+        return deleted
+
+
+class WalReplicator:
+    """
+    Ships the WAL of a SQLite database in WAL mode to a WalArchive.
+
+    Attributes:
+        db_path (str): The database file.
+        archive (WalArchive): Where snapshots and segments go.
+        checkpoint_pages (int): WAL frames after which the replicator checkpoints and restarts the WAL.
+        snapshot_interval (float): Seconds between compactions into a new snapshot.
+        retention (float): Seconds of history kept restorable.
+    """
+    def __init__(self, db_path, archive, checkpoint_pages=1000, snapshot_interval=3600, retention=86400, busy_timeout=5):
+        self.db_path = db_path
+        self.wal_path = db_path + "-wal"
+        self.archive = archive
+        self.checkpoint_pages = checkpoint_pages
+        self.snapshot_interval = snapshot_interval
+        self.retention = retention
+        self.busy_timeout = busy_timeout
+        self.generation = None
+        self._reader = None
+        self._writer = None
+        self._stats = {"syncs": 0, "segments": 0, "frames": 0, "checkpoints": 0, "generations": 0, "snapshots": 0}
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+
+    def _pin(self):
+        # A read transaction keeps the WAL from being restarted under the replicator
+        self._reader.execute("BEGIN")
+        self._reader.execute("SELECT COUNT(1) FROM sqlite_master").fetchone()
+
+    def _unpin(self):
+        self._reader.execute("ROLLBACK")
+
+    def open(self):
+        """
+        Connect to the database and start a generation with a snapshot of it.
+        """
+        self._reader = self._connect()
+        self._writer = self._connect()
+        mode = self._reader.execute("PRAGMA journal_mode").fetchone()[0]
+        if mode.lower() != "wal":
+            raise RuntimeError(f"{self.db_path} is in {mode} mode, WAL shipping needs journal_mode=WAL")
+        self._start_generation()
+
+    def close(self):
+        for conn in (self._reader, self._writer):
+            if conn is not None:
+                conn.close()
+        self._reader = self._writer = None
+
+    def _read_wal(self, offset, salt, checksum, big_endian, page_size):
+        """
+        The whole transactions in the WAL from offset on.
+
+        Returns:
+            tuple: (frames, checksum after the last commit frame).
+        """
+        frame_size = FRAME_HEADER_SIZE + page_size
+        with open(self.wal_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end, committed = 0, checksum
+        for start in range(0, len(data) - frame_size + 1, frame_size):
+            header = data[start:start + FRAME_HEADER_SIZE]
+            _, commit, salt1, salt2, c0, c1 = struct.unpack(">6I", header)
+            if (salt1, salt2) != salt:
+                break  # a frame left over from before the last restart
+            checksum = _checksum(header[:8], *checksum, big_endian)
+            checksum = _checksum(data[start + FRAME_HEADER_SIZE:start + frame_size], *checksum, big_endian)
+            if checksum != (c0, c1):
+                break  # a frame still being written
+            if commit:
+                end, committed = start + frame_size, checksum
+        return data[:end], committed
+
+    def _wal_header(self):
+        """
+        Returns:
+            tuple: (page size, salt, header checksum, big endian) of a valid WAL header, or None.
+        """
+        try:
+            with open(self.wal_path, "rb") as f:
+                header = f.read(WAL_HEADER_SIZE)
+        except FileNotFoundError:
+            return None
+        if len(header) < WAL_HEADER_SIZE:
+            return None
+        magic, _, page_size, _, salt1, salt2, c0, c1 = struct.unpack(">8I", header)
+        if magic not in (0x377F0682, 0x377F0683):
+            return None
+        big_endian = bool(magic & 1)
+        if _checksum(header[:24], 0, 0, big_endian) != (c0, c1):
+            return None
+        return page_size, (salt1, salt2), (c0, c1), big_endian
+
+    def _start_generation(self):
+        # With the write lock held nothing commits between the snapshot and the WAL position it is taken at
+        locked = not self._writer.in_transaction
+        if locked:
+            self._writer.execute("BEGIN IMMEDIATE")
+        try:
+            page_size = self._writer.execute("PRAGMA page_size").fetchone()[0]
+            self.generation = self.archive.new_generation(page_size, os.path.abspath(self.db_path))
+            self.page_size = page_size
+            self.index, self.offset, self.salt = 0, WAL_HEADER_SIZE, None
+            header = self._wal_header()
+            if header:
+                _, self.salt, self.checksum, self.big_endian = header
+                frames, self.checksum = self._read_wal(WAL_HEADER_SIZE, self.salt, self.checksum, self.big_endian, page_size)
+                self.offset += len(frames)
+            ms = _now_ms()
+            snapshot = os.path.join(self.archive.path, self.generation, "snapshot.db")
+            source = self._connect()
+            try:
+                target = sqlite3.connect(snapshot)
+                source.backup(target)
+                target.close()
+            finally:
+                source.close()
+            self.archive.write_snapshot(self.generation, self.index, self.offset, ms, _read_file(snapshot))
+            os.remove(snapshot)
+            self._last_snapshot = ms
+            if self._reader.in_transaction:
+                self._unpin()
+            self._pin()
+        finally:
+            if locked:
+                self._writer.execute("ROLLBACK")
+        self._stats["generations"] += 1
+        self._stats["snapshots"] += 1
+
+    def sync(self):
+        """
+        Copy the transactions committed since the last sync into a new segment.
+
+        Returns:
+            int: The number of frames copied.
+        """
+        header = self._wal_header()
+        if header is None:
+            return 0
+        page_size, salt, checksum, big_endian = header
+        if salt != self.salt:
+            if self.salt is not None and salt[0] != (self.salt[0] + 1) & 0xFFFFFFFF:
+                # The WAL restarted more than once since the last sync, frames were lost
+                self._start_generation()
+                return 0
+            if self.salt is not None:
+                self.index += 1
+            self.salt, self.checksum, self.big_endian = salt, checksum, big_endian
+            self.offset = WAL_HEADER_SIZE
+        frames, checksum = self._read_wal(self.offset, self.salt, self.checksum, self.big_endian, self.page_size)
+        self._stats["syncs"] += 1
+        if not frames:
+            return 0
+        self.archive.write_segment(self.generation, self.index, self.offset, _now_ms(), frames)
+        self.offset += len(frames)
+        self.checksum = checksum
+        count = len(frames) // (FRAME_HEADER_SIZE + self.page_size)
+        self._stats["segments"] += 1
+        self._stats["frames"] += count
+        return count
+
+    def checkpoint(self):
+        """
+        Copy the last frames, checkpoint, and make the next write restart the WAL.
+
+        Writers wait for the copy and the checkpoint.
+
+        Returns:
+            bool: False if writers kept the write lock busy; the next step tries again.
+        """
+        try:
+            self._writer.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            return False
+        try:
+            self.sync()
+            self._unpin()
+            busy, _, _ = self._reader.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        finally:
+            self._writer.execute("ROLLBACK")
+        if not busy:
+            # A write right after a complete checkpoint restarts the WAL; rewriting user_version changes nothing else.
+            # It leaves a frame in the new WAL, so the read transaction taken next keeps that WAL from restarting again.
+            try:
+                version = self._reader.execute("PRAGMA user_version").fetchone()[0]
+                self._reader.execute(f"PRAGMA user_version = {int(version)}")
+            except sqlite3.OperationalError:
+                pass  # an app write got there first and restarted the WAL itself
+        self._pin()
+        self.sync()
+        self._stats["checkpoints"] += 1
+        return True
+
+    def step(self):
+        """
+        One round of the replication loop: sync, checkpoint if the WAL is long, compact and prune when due.
+        """
+        self.sync()
+        if (self.offset - WAL_HEADER_SIZE) // (FRAME_HEADER_SIZE + self.page_size) >= self.checkpoint_pages:
+            self.checkpoint()
+        if _now_ms() - self._last_snapshot >= self.snapshot_interval * 1000:
+            self._last_snapshot = _now_ms()
+            if self.archive.compact(self.generation):
+                self._stats["snapshots"] += 1
+            self.archive.prune(self.retention, keep=self.generation)
+
+    def run(self, interval=1.0, stop=None):
+        """
+        Replicate until stop is set.
+
+        Args:
+            interval (float, optional): Seconds between syncs. Defaults to 1.
+            stop (threading.Event, optional): Ends the loop. Defaults to running forever.
+        """
+        stop = stop or threading.Event()
+        self.open()
+        try:
+            while not stop.wait(interval):
+                self.step()
+        finally:
+            try:
+                self.sync()
+            finally:
+                self.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Counters since startup and the current generation and WAL position, for monitoring.
+        """
+        return dict(self._stats, generation=self.generation, index=getattr(self, "index", None), offset=getattr(self, "offset", None))
@@ -0,0 +1,438 @@
+""" restore.py
+Bulk restore of backup records into the database.
+
+The model restore() methods used to look every record up with its own SELECT and commit it through
+create()/update(), one round trip and one fsync per record. The engine here reads each table's records
+in chunks, finds the rows that already exist with one query per chunk, and writes the chunk with one
+executemany INSERT and one executemany UPDATE. Each table is one transaction.
+
+Tables are restored in foreign key order. Post counters are not taken from the backup: once posts or votes
+are restored they are recounted from the votes table (Vote.recount), so that they agree with it. Rows keep their backup ids where a table is matched on id;
+tables matched on a natural key (users by uid, sections by name, ...) may get other ids, so every table
+records backup id -> database id and the tables referencing it translate their foreign keys with it.
+On server databases the tables of one dependency level are restored in parallel, each on its own
+connection; SQLite has a single writer, so there they run one after the other.
+"""
+import base64
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
+
+import sqlalchemy as sa
+
+from flask import current_app
+from sqlalchemy import insert, update, tuple_, bindparam
+from werkzeug.http import parse_date
+
+from __init__ import app, db
+from model.backup import load_manifest, verify_backup, read_table
+from model.hashing import hash_pool
+from model.user import User
+from model.section import Section
+from model.group import Group
+from model.channel import Channel
+from model.post import Post
+from model.vote import Vote
+from model.carPost import CarPost
+from model.carComments import CarComments
+from model.carChat import carChat
+from model.vehicle import Vehicle
+from model.listings import UserItem
+
+
+def parse_datetime(value):
+    """
+    A datetime from a backup value: a datetime, an ISO 8601 string or an HTTP date (how jsonify writes datetimes).
+
+    Returns:
+        datetime: The value as a naive datetime, or None if it is empty or unreadable.
+    """
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        parsed = parse_date(value)
+        return parsed.replace(tzinfo=None) if parsed else None
+
+
+class TableSpec:
+    """
+    How the records of one table are matched and written.
+
+    Attributes:
+        name (str): The backup name of the table, e.g. "users".
+        model (db.Model): The model of the table.
+        key (tuple): Column attribute names identifying an existing row, e.g. ("_uid",).
+        to_row (callable): Turns a backup record into {"values": insert values, "update": update values},
+            given the id maps of the tables restored before; returns None to skip the record.
+        depends (tuple): Names of the tables whose ids this table references.
+    """
+    def __init__(self, name, model, key, to_row, depends=()):
+        self.name = name
+        self.model = model
+        self.key = key
+        self.to_row = to_row
+        self.depends = depends
+
+
+def _user_id(record, ids, field="user_id"):
+    value = record.get(field)
+    if isinstance(value, dict):
+        value = value.get("id")
+    return ids["users"].get(value, value)
+
+
+@functools.lru_cache(maxsize=1)
+def _password_hash(password):
+    # Backups carry no passwords, restored users get the default one; it is public, so one hash serves them all
+    return hash_pool.generate_many([password])[0]
+
+
+def _users(record, ids, lookups):
+    if not record.get("uid") or not record.get("name"):
+        return None
+    values = {"_uid": record["uid"], "_name": record["name"], "_pfp": record.get("pfp") or ""}
+    return {
+        "values": dict(values, _email=record.get("email") or "?", _role=record.get("role") or "User",
+                       _password=_password_hash(app.config["DEFAULT_PASSWORD"]), _token_version=0),
+        "update": values
+    }
+
+
+def _sections(record, ids, lookups):
+    if not record.get("name"):
+        return None
+    values = {"_name": record["name"], "_theme": record.get("theme")}
+    return {"values": values, "update": values}
+
+
+def _groups(record, ids, lookups):
+    if not record.get("name") or record.get("section_id") is None:
+        return None
+    values = {"_name": record["name"], "_section_id": ids["sections"].get(record["section_id"], record["section_id"])}
+    return {"values": values, "update": values}
+
+
+def _channels(record, ids, lookups):
+    if not record.get("name") or record.get("group_id") is None:
+        return None
+    values = {"_name": record["name"], "_attributes": record.get("attributes"),
+              "_group_id": ids["groups"].get(record["group_id"], record["group_id"])}
+    return {"values": values, "update": values}
+
+
+def _posts(record, ids, lookups):
+    # Post backups name their author and channel instead of carrying their ids
+    user_id = lookups["user_names"].get(record.get("user_name"))
+    channel_id = lookups["channel_names"].get(record.get("channel_name"))
+    if not record.get("title") or user_id is None or channel_id is None:
+        return None
+    values = {"_title": record["title"], "_comment": record.get("comment") or "", "_content": record.get("content") or {},
+              "_user_id": user_id, "_channel_id": channel_id}
+    date_posted = parse_datetime(record.get("date_posted")) or datetime.utcnow()
+    return {
+        "values": dict(values, _date_posted=date_posted, _upvotes=0, _downvotes=0, _score=0,
+                       _hot_score=Post.hot_score(0, date_posted)),
+        "update": values
+    }
+
+
+def _votes(record, ids, lookups):
+    if record.get("vote_type") not in ("upvote", "downvote") or record.get("user_id") is None or record.get("post_id") is None:
+        return None
+    values = {"_user_id": _user_id(record, ids), "_post_id": ids["posts"].get(record["post_id"], record["post_id"]),
+              "_vote_type": record["vote_type"]}
+    return {"values": values, "update": {"_vote_type": values["_vote_type"]}}
+
+
+def _car_posts(record, ids, lookups):
+    if record.get("id") is None or record.get("car_type") is None:
+        return None
+    image_url_table = record.get("image_url_table") or []
+    values = {"id": record["id"], "_title": record.get("title") or "", "_description": record.get("description"),
+              "_uid": _user_id(record, ids, "user"), "_car_type": record["car_type"],
+              "_image_url_table": image_url_table if isinstance(image_url_table, str) else str(image_url_table),
+              "_date_posted": parse_datetime(record.get("date_posted")) or datetime.now()}
+    return {"values": values, "update": values}
+
+
+def _car_comments(record, ids, lookups):
+    if record.get("id") is None or record.get("postid") is None:
+        return None
+    values = {"id": record["id"], "_uid": _user_id(record, ids, "user"), "_content": record.get("content") or "",
+              "_post_id": ids["carPosts"].get(record["postid"], record["postid"]),
+              "_date_posted": parse_datetime(record.get("date_posted")) or datetime.now()}
+    return {"values": values, "update": values}
+
+
+def _car_chats(record, ids, lookups):
+    if record.get("id") is None or record.get("message") is None:
+        return None
+    values = {"id": record["id"], "_message": record["message"], "_user_id": _user_id(record, ids),
+              "_timestamp": parse_datetime(record.get("timestamp")) or datetime.utcnow()}
+    return {"values": values, "update": values}
+
+
+def _vehicles(record, ids, lookups):
+    if not record.get("vin") or record.get("user_id") is None:
+        return None
+    values = {"_vin": record["vin"], "_uid": _user_id(record, ids), "_make": record.get("make"),
+              "_model": record.get("model"), "_year": record.get("year"), "_engine_type": record.get("engine_type"),
+              "_date_added": parse_datetime(record.get("date_added")) or datetime.now()}
+    return {"values": values, "update": values}
+
+
+def _user_items(record, ids, lookups):
+    if not record.get("name") or record.get("user_id") is None:
+        return None
+    values = {"name": record["name"], "user_id": _user_id(record, ids), "user_input": record.get("user_input"),
+              "date_added": parse_datetime(record.get("date_added")) or datetime.now()}
+    return {"values": values, "update": {"user_input": values["user_input"]}}
+
+
+# In foreign key order; a table only references tables listed before it
+TABLES = [
+    TableSpec("users", User, ("_uid",), _users),
+    TableSpec("sections", Section, ("_name",), _sections),
+    TableSpec("groups", Group, ("_name",), _groups, depends=("sections",)),
+    TableSpec("channels", Channel, ("_name",), _channels, depends=("groups",)),
+    TableSpec("posts", Post, ("_title",), _posts, depends=("users", "channels")),
+    TableSpec("votes", Vote, ("_user_id", "_post_id"), _votes, depends=("users", "posts")),
+    TableSpec("carPosts", CarPost, ("id",), _car_posts, depends=("users",)),
+    TableSpec("carComments", CarComments, ("id",), _car_comments, depends=("users", "carPosts")),
+    TableSpec("carChats", carChat, ("id",), _car_chats, depends=("users",)),
+    TableSpec("vehicles", Vehicle, ("_vin",), _vehicles, depends=("users",)),
+    TableSpec("user_items", UserItem, ("name", "user_id"), _user_items, depends=("users",)),
+]
+SPECS = {spec.name: spec for spec in TABLES}
+
+
+def _levels(names):
+    """
+    Group tables into dependency levels: every table's dependencies are in earlier levels.
+    """
+    levels, done = [], set()
+    remaining = [name for name in SPECS if name in names]
+    while remaining:
+        level = [name for name in remaining if all(dep in done or dep not in names for dep in SPECS[name].depends)]
+        levels.append(level)
+        done.update(level)
+        remaining = [name for name in remaining if name not in done]
+    return levels
+
+
+def _lookups(name):
+    """
+    Name -> id maps some tables resolve references with, one query each.
+    """
+    if name == "posts":
+        return {
+            "user_names": {row_name: row_id for row_id, row_name in db.session.query(User.id, User._name)},
+            "channel_names": {row_name: row_id for row_id, row_name in db.session.query(Channel.id, Channel._name)},
+        }
+    return {}
+
+
+def restore_table(name, records, ids=None, chunk_size=1000):
+    """
+    Upserts the backup records of one table, chunk_size records at a time, in one transaction.
+
+    Args:
+        name (str): The backup name of the table, see TABLES.
+        records (iterable): The table's backup records (as written by the model's read), may be a generator.
+        ids (dict, optional): Backup id -> database id maps of the tables restored before. Defaults to none.
+        chunk_size (int, optional): Records per lookup query and per executemany. Defaults to 1000.
+
+    Returns:
+        dict: "inserted", "updated" and "skipped" counts, and "ids", this table's backup id -> database id.
+    """
+    spec = SPECS[name]
+    model = spec.model
+    ids = ids or {}
+    for dep in spec.depends:
+        ids.setdefault(dep, {})
+    key_columns = [getattr(model, attr) for attr in spec.key]
+    lookups = _lookups(name)
+    stats = {"inserted": 0, "updated": 0, "skipped": 0, "ids": {}}
+
+    records = iter(records)
+    try:
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            # Convert the chunk; a later record with the same key wins
+            rows = {}
+            for record in chunk:
+                row = spec.to_row(record, ids, lookups) if isinstance(record, dict) else None
+                if row is None:
+                    stats["skipped"] += 1
+                    continue
+                key = tuple(row["values"][attr] for attr in spec.key)
+                rows[key] = (record.get("id"), row)
+
+            # One query finds the rows of the chunk that already exist
+            if len(key_columns) == 1:
+                condition = key_columns[0].in_([key[0] for key in rows])
+            else:
+                condition = tuple_(*key_columns).in_(list(rows))
+            existing = {tuple(found[1:]): found[0] for found in db.session.query(model.id, *key_columns).filter(condition)}
+
+            inserts = [row["values"] for key, (_, row) in rows.items() if key not in existing]
+            updates = [dict(row["update"], id=existing[key]) for key, (_, row) in rows.items() if key in existing and row["update"]]
+            if inserts:
+                db.session.execute(insert(model), inserts)
+            if updates:
+                db.session.execute(update(model), updates)
+            stats["inserted"] += len(inserts)
+            stats["updated"] += len(updates)
+
+            # Ids of the inserted rows, for the tables that reference this one
+            if "id" not in spec.key and inserts:
+                inserted = [key for key in rows if key not in existing]
+                if len(key_columns) == 1:
+                    condition = key_columns[0].in_([key[0] for key in inserted])
+                else:
+                    condition = tuple_(*key_columns).in_(inserted)
+                existing.update({tuple(found[1:]): found[0] for found in db.session.query(model.id, *key_columns).filter(condition)})
+            for key, (backup_id, row) in rows.items():
+                if backup_id is not None:
+                    stats["ids"][backup_id] = existing.get(key, row["values"].get("id"))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return stats
+
+
+def restore(data, chunk_size=1000, parallel=None):
+    """
+    Restores a backup, table by table in foreign key order.
+
+    Args:
+        data (dict): Backup name of a table -> its records (any iterable), see TABLES; unknown names are ignored.
+        chunk_size (int, optional): Records per lookup query and per executemany. Defaults to 1000.
+        parallel (bool, optional): Restore independent tables concurrently. Defaults to True except on SQLite.
+
+    Returns:
+        dict: Backup name of a table -> its "inserted", "updated" and "skipped" counts.
+    """
+    current = current_app._get_current_object()
+    if parallel is None:
+        parallel = db.engine.dialect.name != "sqlite"
+    ids = {}
+    results = {}
+
+    def run(name):
+        # Each worker thread has its own app context, and with it its own session and connection
+        with current.app_context():
+            return restore_table(name, data[name], dict(ids), chunk_size)
+
+    for level in _levels(set(data) & set(SPECS)):
+        if parallel and len(level) > 1:
+            with ThreadPoolExecutor(max_workers=len(level), thread_name_prefix="restore") as executor:
+                outcomes = dict(zip(level, executor.map(run, level)))
+        else:
+            outcomes = {name: restore_table(name, data[name], dict(ids), chunk_size) for name in level}
+        for name, stats in outcomes.items():
+            ids[name] = stats.pop("ids")
+            results[name] = stats
+    if "posts" in results or "votes" in results:
+        Vote.recount()
+    return results
+
+
+def _decoder(column):
+    # Backup files hold JSON, turn the values of the types JSON has no notation for back into Python objects
+    python_type = None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        pass
+    if python_type is datetime:
+        return parse_datetime
+    if python_type in (date, time):
+        return lambda value: python_type.fromisoformat(value) if isinstance(value, str) else value
+    if python_type is bytes:
+        return lambda value: base64.b64decode(value) if isinstance(value, str) else value
+    return None
+
+
+def restore_snapshot(path, chunk_size=1000):
+    """
+    Restores a backup written by model/backup.py, upserting every table on its primary key.
+
+    The table files are checked against the manifest first, nothing is written if one does not match.
+    Tables are restored in the foreign key order of the manifest; rows keep their ids and passwords,
+    this is a copy of the database rather than an import. Votes already in the database stay, so post
+    counters are recounted afterwards (Vote.recount).
+
+    Args:
+        path (str): The backup directory.
+        chunk_size (int, optional): Rows per lookup query and per executemany. Defaults to 1000.
+
+    Returns:
+        dict: Table name -> its "inserted" and "updated" counts.
+    """
+    problems = verify_backup(path)
+    if problems:
+        raise ValueError(f"Backup {path} is damaged: " + "; ".join(problems))
+    metadatas = {}
+    results = {}
+    try:
+        for entry in load_manifest(path)["tables"]:
+            # A table goes to the database it lives in now, whichever it was backed up from (see model/binds.py)
+            bind = app.config['DB_TABLE_BINDS'].get(entry["name"])
+            if bind not in metadatas:
+                metadatas[bind] = sa.MetaData()
+                metadatas[bind].reflect(bind=db.engines[bind])
+            table = metadatas[bind].tables.get(entry["name"])
+            on_bind = {"bind": db.engines[bind]}
+            if table is None or entry["name"] == "alembic_version":
+                continue
+            decoders = {column.name: _decoder(column) for column in table.columns}
+            keys = [key.name for key in table.primary_key.columns]
+            key_of = lambda row: tuple(row[name] for name in keys)
+            stats = {"inserted": 0, "updated": 0}
+            rows = read_table(path, entry)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                # Columns dropped since the backup are left out, columns added since keep their values
+                chunk = [
+                    {name: decoders[name](value) if decoders[name] and value is not None else value
+                     for name, value in row.items() if name in decoders}
+                    for row in chunk
+                ]
+                existing = set()
+                if keys:
+                    key_columns = [table.c[name] for name in keys]
+                    condition = (tuple_(*key_columns).in_([key_of(row) for row in chunk]) if len(keys) > 1
+                                 else key_columns[0].in_([row[keys[0]] for row in chunk]))
+                    existing = {tuple(found) for found in db.session.execute(sa.select(*key_columns).where(condition), bind_arguments=on_bind)}
+                inserts = [row for row in chunk if not keys or key_of(row) not in existing]
+                updates = [row for row in chunk if keys and key_of(row) in existing]
+                if inserts:
+                    db.session.execute(table.insert(), inserts, bind_arguments=on_bind)
+                columns = [name for name in (updates[0] if updates else ()) if name not in keys]
+                if columns:
+                    # Bind names may not repeat column names in an UPDATE ... SET, hence the prefix
+                    statement = table.update().where(sa.and_(*(table.c[name] == bindparam(f"b_{name}") for name in keys)))
+                    db.session.execute(
+                        statement.values({name: bindparam(f"b_{name}") for name in columns}),
+                        [{f"b_{name}": value for name, value in row.items()} for row in updates],
+                        bind_arguments=on_bind
+                    )
+                stats["inserted"] += len(inserts)
+                stats["updated"] += len(updates)
+            results[entry["name"]] = stats
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if "posts" in results or "votes" in results:
+        Vote.recount()
+    return results
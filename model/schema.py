@@ -0,0 +1,139 @@
+""" schema.py
+One-shot database initialization and the boot-time schema check.
+
+Creating the tables, applying migrations and seeding default data used to run on every import of
+main.py, in every gunicorn worker. It is an explicit step now (scripts/db_init.py, or the custom
+init_db command) that runs once under a lock: a file lock next to the database, or GET_LOCK on
+MySQL where several hosts may start at once. An initialized database is stamped with the newest
+migration, which is all a worker checks when it boots.
+"""
+import contextlib
+import functools
+import os
+import time
+
+from alembic.script import ScriptDirectory
+from flask_migrate import upgrade
+from sqlalchemy import inspect, text
+
+from __init__ import app, db
+from model.binds import move_tables
+
+try:
+    import fcntl
+except ImportError:  # Windows, initialization runs unlocked
+    fcntl = None
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@functools.lru_cache(maxsize=1)
+def head_revision():
+    """
+    Returns:
+        str: The newest revision in migrations/versions.
+    """
+    return ScriptDirectory(MIGRATIONS_DIR).get_current_head()
+
+
+def current_revision():
+    """
+    Returns:
+        str: The revision the database is stamped with, or None if it has not been initialized.
+    """
+    try:
+        return db.session.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except Exception:
+        db.session.rollback()
+        return None
+    finally:
+        db.session.remove()
+
+
+def check_schema():
+    """
+    The boot-time check: one query for the database's revision, compared with the newest migration.
+
+    Returns:
+        tuple: (ok, database revision, newest revision).
+    """
+    current, head = current_revision(), head_revision()
+    return current == head, current, head
+
+
+@contextlib.contextmanager
+def init_lock(name="db_init", timeout=None):
+    """
+    Hold a lock that only one initializing process can hold at a time.
+
+    Args:
+        name (str, optional): The lock name. Defaults to "db_init".
+        timeout (int, optional): Seconds to wait for it. Defaults to DB_INIT_LOCK_TIMEOUT.
+
+    Raises:
+        TimeoutError: Another process held the lock for longer than timeout.
+    """
+    timeout = timeout if timeout is not None else app.config['DB_INIT_LOCK_TIMEOUT']
+    if db.engine.dialect.name == "mysql":
+        with db.engine.connect() as conn:
+            if conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": name, "timeout": timeout}).scalar() != 1:
+                raise TimeoutError(f"Could not get the {name} lock within {timeout}s")
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
+        return
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(app.instance_path, exist_ok=True)
+    with open(os.path.join(app.instance_path, f"{name}.lock"), "w") as lock_file:
+        # Poll until the process initializing first is done, giving up at the deadline like GET_LOCK does
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Could not get the {name} lock within {timeout}s")
+                time.sleep(0.1)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def initialize(seeders, force=False):
+    """
+    Create the tables, apply the migrations and seed default data, unless the database is already initialized.
+
+    Runs under init_lock, so processes starting together initialize once; the ones that waited find
+    the database stamped with the newest revision and return.
+
+    Args:
+        seeders (list): Functions adding default data, run in order; each may fail without stopping the others.
+        force (bool, optional): Seed even if the database is initialized. Defaults to False.
+
+    Returns:
+        bool: Whether initialization ran.
+    """
+    with init_lock():
+        if app.config['DB_SEPARATE_BINDS']:
+            # Tables moved to databases of their own are created there, in an initialized database too
+            db.create_all(bind_key=app.config['DB_SEPARATE_BINDS'])
+            move_tables()
+        if not force and current_revision() == head_revision():
+            return False
+        db.create_all()
+        # Migrations check what exists before changing it, so on tables create_all just made they only stamp the revision
+        upgrade(directory=MIGRATIONS_DIR)
+        for seeder in seeders:
+            try:
+                seeder()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Warning: {seeder.__name__} failed: {e}")
+        tables = inspect(db.engine).get_table_names()
+        print(f"Database initialized: {len(tables)} tables, revision {head_revision()}")
+        return True
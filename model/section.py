@@ -143,18 +143,14 @@ class Section(db.Model):
     
     @staticmethod
     def restore(data):
-        sections = {}
-        for section_data in data:
-            _ = section_data.pop('id', None)  # Remove 'id' from section_data
-            name = section_data.get("name", None)
-            section = Section.query.filter_by(_name=name).first()
-            if section:
-                section.update(section_data)
-            else:
-                section = Section(**section_data)
-                section.create()        
-        db.session.commit()
-        return sections
+        """
+        Upserts sections records from a backup, in bulk (see model/restore.py).
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("sections", data)["ids"]
 
 def initSections():
     """
@@ -2,12 +2,13 @@
 from flask import current_app
 from flask_login import UserMixin
 from datetime import date
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
-from werkzeug.security import generate_password_hash, check_password_hash
 import os
 import json
 
 from __init__ import app, db
+from model.hashing import hash_pool
 
 """ Helper Functions """
 
@@ -48,6 +49,7 @@ class User(db.Model, UserMixin):
         _password (Column): A string representing the hashed password of the user. It is not unique and cannot be null.
         _role (Column): A string representing the user's role within the application. Defaults to "User".
         _pfp (Column): A string representing the path to the user's profile picture. It can be null.
+        _token_version (Column): An integer carried in every issued token; bumping it revokes those tokens.
     """
     __tablename__ = 'users'
 
@@ -58,6 +60,7 @@ class User(db.Model, UserMixin):
     _password = db.Column(db.String(255), unique=False, nullable=False)
     _role = db.Column(db.String(20), default="User", nullable=False)
     _pfp = db.Column(db.String(255), unique=False, nullable=True)
+    _token_version = db.Column(db.Integer, default=0, server_default='0', nullable=False)
    
     posts = db.relationship('Post', backref='author', lazy=True)
                                  
@@ -79,6 +82,7 @@ class User(db.Model, UserMixin):
         self.set_password(password)
         self._role = role
         self._pfp = pfp
+        self._token_version = 0
 
     # UserMixin/Flask-Login requires a get_id method to return the id as a string
     def get_id(self):
@@ -216,26 +220,59 @@ class User(db.Model, UserMixin):
 
     def set_password(self, password):
         """
-        Sets the user's password (hashed).
+        Sets the user's password (hashed on the hash pool).
         
         Args:
             password (str): The new password for the user.
+        
+        Raises:
+            HashPoolSaturated: Too many passwords are being hashed right now.
         """
         if not password or password == "":
             password=app.config["DEFAULT_PASSWORD"]
-        self._password = generate_password_hash(password, "pbkdf2:sha256", salt_length=10)
+        self._password = hash_pool.generate(password)
 
     def is_password(self, password):
         """
         Checks if the provided password matches the user's stored password.
         
+        A match against a hash created with outdated parameters schedules a background rehash.
+        
         Args:
             password (str): The password to check.
         
         Returns:
             bool: True if the password matches, False otherwise.
+        
+        Raises:
+            HashPoolSaturated: Too many passwords are being hashed right now.
         """
-        return check_password_hash(self._password, password)
+        if not hash_pool.check(self._password, password):
+            return False
+        if hash_pool.needs_rehash(self._password):
+            self.rehash_password(password)
+        return True
+
+    def rehash_password(self, password):
+        """
+        Replaces the stored hash with one using the current parameters, in the background.
+        
+        The new hash is written only if the stored hash is unchanged by then, so a password
+        change made in the meantime is never overwritten.
+        
+        Args:
+            password (str): The plaintext password, already verified against the stored hash.
+        """
+        app_obj = current_app._get_current_object()
+        user_id = self.id
+        old_hash = self._password
+
+        def save(new_hash):
+            with app_obj.app_context():
+                User.query.filter_by(id=user_id, _password=old_hash).update({"_password": new_hash})
+                db.session.commit()
+
+        hash_pool.rehash_later(password, save)
 
     def __str__(self):
         """
@@ -264,6 +301,9 @@ class User(db.Model, UserMixin):
         Args:
             role (str): The new role for the user.
         """
+        if self._role is not None and role != self._role:
+            # Issued tokens carry the role as a claim, so they must not outlive a role change
+            self.revoke_tokens()
         self._role = role
 
     def is_admin(self):
@@ -331,6 +371,21 @@ class User(db.Model, UserMixin):
             "pfp": self._pfp,
         }
         return data
+
+    def summary(self):
+        """
+        Converts the user to the short form nested in the objects it authored (car posts, comments, ...).
+
+        Returns:
+            dict: The user's name, id, uid, email and pfp.
+        """
+        return {
+            "name": self.name,
+            "id": self.id,
+            "uid": self.uid,
+            "email": self.email,
+            "pfp": self._pfp
+        }
         
     def update(self, inputs):
         """
@@ -357,6 +412,7 @@ class User(db.Model, UserMixin):
             self.set_uid(uid)
         if password:
             self.set_password(password)
+            self.revoke_tokens()
         if pfp is not None:
             self.pfp = pfp
 
@@ -368,21 +424,59 @@ class User(db.Model, UserMixin):
         except IntegrityError:
             db.session.rollback()
             return None
+        finally:
+            self.invalidate_tokens()
         return self
     
     def delete(self):
         """
         Removes the user object from the database and commits the transaction.
+        Its tokens are revoked once the user is gone, not before.
         
         Returns:
             None
+
+        Raises:
+            IntegrityError: Rows still refer to the user (where foreign keys are enforced); nothing was deleted.
         """
         try:
             db.session.delete(self)
             db.session.commit()
         except IntegrityError:
             db.session.rollback()
+            raise
+        self.invalidate_tokens(deleted=True)
         return None   
+
+    @property
+    def token_version(self):
+        """
+        Gets the user's token version, the "tv" claim every token issued for the user must match.
+        
+        Returns:
+            int: The user's token version.
+        """
+        return self._token_version
+
+    def revoke_tokens(self):
+        """
+        Bumps the user's token version so that every token issued before now is rejected.
+        The change is persisted by the caller's commit.
+        """
+        self._token_version = (self._token_version or 0) + 1
+
+    def invalidate_tokens(self, deleted=False):
+        """
+        Drops any verified tokens cached for this user, so the next request reloads the user from the database.
+        
+        Args:
+            deleted (bool): True when the user no longer exists and none of its tokens may be accepted.
+        """
+        from api.jwt_authorize import token_cache  # deferred, api.jwt_authorize imports this module
+        if deleted:
+            token_cache.invalidate(self.id, deleted=True)
+        else:
+            token_cache.invalidate(self.id, self._token_version)
     
     def save_pfp(self, image_data, filename):
         """
@@ -409,6 +503,7 @@ class User(db.Model, UserMixin):
         """
         self.pfp = None
         db.session.commit()
+        self.invalidate_tokens()
         
     def set_uid(self, new_uid=None):
         """
@@ -427,6 +522,7 @@ class User(db.Model, UserMixin):
             self._uid = new_uid
             # Commit the UID change to the database
             db.session.commit()
+            self.invalidate_tokens()
 
         # If the UID has changed, update the directory name
         if old_uid != self._uid:
@@ -436,19 +532,96 @@ class User(db.Model, UserMixin):
                 os.rename(old_path, new_path)
                 
     @staticmethod
-    def restore(data):
-        users = {}
-        for user_data in data:
-            _ = user_data.pop('id', None)  # Remove 'id' from user_data and store it in user_id
-            uid = user_data.get("uid", None)
-            user = User.query.filter_by(_uid=uid).first()
-            if user:
-                user.update(user_data)
+    def import_many(rows, default_password=None, chunk_size=500):
+        """
+        Creates many users in one transaction.
+
+        The whole batch is validated first and checked against existing uids with one IN query per chunk,
+        passwords are hashed in parallel (hash_pool.generate_many), and the valid rows are inserted with a
+        single executemany. Rows without a password get default_password; since that password is known
+        anyway, they all share one salted hash instead of paying for a pbkdf2 run each.
+
+        Args:
+            rows (list): Dictionaries with "name", "uid" and optionally "password" and "pfp".
+            default_password (str, optional): Password of rows without one. Defaults to DEFAULT_PASSWORD.
+            chunk_size (int, optional): uids per IN query, kept under the database's bound parameter limit.
+
+        Returns:
+            dict: "created" (list of uids), "errors" (list of {"row", "uid", "message"}), "success_count" and "error_count".
+        """
+        default_password = default_password or app.config["DEFAULT_PASSWORD"]
+        errors = []
+        valid = []  # (row index, user data)
+        seen = set()
+
+        def reject(index, uid, message):
+            errors.append({"row": index, "uid": uid, "message": message})
+
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                reject(index, None, "Expected an object with user data")
+                continue
+            name, uid, password = row.get("name"), row.get("uid"), row.get("password")
+            if not isinstance(name, str) or len(name) < 2:
+                reject(index, uid, "Name is missing or less than 2 characters")
+            elif not isinstance(uid, str) or len(uid) < 2:
+                reject(index, uid, "User ID is missing or less than 2 characters")
+            elif password is not None and (not isinstance(password, str) or len(password) < 6):
+                reject(index, uid, "Password is less than 6 characters")
+            elif uid in seen:
+                reject(index, uid, "User ID appears more than once in the batch")
             else:
-                user = User(**user_data)
-                user.create()
-        return users
+                seen.add(uid)
+                valid.append((index, {"name": name, "uid": uid, "password": password, "pfp": row.get("pfp") or ""}))
+
+        existing = set()
+        uids = [data["uid"] for _, data in valid]
+        for start in range(0, len(uids), chunk_size):
+            chunk = uids[start:start + chunk_size]
+            existing.update(uid for (uid,) in db.session.query(User._uid).filter(User._uid.in_(chunk)))
+        for index, data in valid:
+            if data["uid"] in existing:
+                reject(index, data["uid"], "User ID already exists")
+        valid = [(index, data) for index, data in valid if data["uid"] not in existing]
+
+        # One hash per explicit password, one shared hash for everyone on the default password
+        explicit = [data["password"] for _, data in valid if data["password"]]
+        hashes = iter(hash_pool.generate_many(explicit))
+        default_hash = hash_pool.generate_many([default_password])[0] if len(explicit) < len(valid) else None
+        values = [{
+            "_name": data["name"],
+            "_uid": data["uid"],
+            "_email": "?",
+            "_password": next(hashes) if data["password"] else default_hash,
+            "_role": "User",
+            "_pfp": data["pfp"],
+            "_token_version": 0
+        } for _, data in valid]
+
+        created = []
+        if values:
+            try:
+                db.session.execute(insert(User), values)
+                db.session.commit()
+                created = [value["_uid"] for value in values]
+            except IntegrityError:
+                # A uid was taken between the check and the insert, nothing from this batch was written
+                db.session.rollback()
+                for index, data in valid:
+                    reject(index, data["uid"], "Batch rolled back after a concurrent uid conflict, retry the import")
+        errors.sort(key=lambda error: error["row"])
+        return {"created": created, "errors": errors, "success_count": len(created), "error_count": len(errors)}
 
+    @staticmethod
+    def restore(data):
+        """
+        Upserts users records from a backup, in bulk (see model/restore.py).
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("users", data)["ids"]
 
 """Database Creation and Testing """
 
@@ -9,7 +9,7 @@ class UserCars(db.Model):
     
     __tablename__ = 'userCars'
     id = db.Column(db.Integer, primary_key=True)
-    _uid = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    _uid = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # a user's cars
     _make = db.Column(db.String(255), nullable=False) 
     _model = db.Column(db.String(255), nullable=False) 
     _year = db.Column(db.String(255), nullable=False) 
@@ -6,13 +6,15 @@ from __init__ import app, db
 class Vehicle(db.Model):
     __tablename__ = "vehicles"
     id = db.Column(db.Integer, primary_key=True)
-    _uid = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    _uid = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)  # a user's vehicles
     _vin = db.Column(db.String(17), unique=True, nullable=False)
     _make = db.Column(db.String(100), nullable=False)
     _model = db.Column(db.String(100), nullable=False)
     _year = db.Column(db.Integer, nullable=False)
     _engine_type = db.Column(db.String(50), nullable=False)
     _date_added = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    # The VIN lookup compares upper(_vin), which the unique index on _vin cannot serve
+    __table_args__ = (db.Index('ix_vehicles_upper_vin', db.func.upper(_vin)),)
 
     def __init__(self, vin, make, model, year, engine_type, uid, input_datetime=""):
         self._vin = vin
@@ -84,40 +86,14 @@ class Vehicle(db.Model):
 
     @staticmethod
     def restore(data):
-        vehicles = {}
-        for vehicle_data in data:
-            id = vehicle_data.get("id")
-            vehicle = Vehicle.query.filter_by(id=id).first()
-            if vehicle:
-                # Convert date string to datetime object before updating
-                if "date_added" in vehicle_data and isinstance(vehicle_data["date_added"], str):
-                    vehicle_data["date_added"] = datetime.fromisoformat(vehicle_data["date_added"])
-                vehicle.update(**vehicle_data)  # Spread the dictionary as keyword arguments
-            else:
-                # Handle date_added conversion when creating a new vehicle
-                date_added = vehicle_data.get("date_added")
-                if isinstance(date_added, str):  # Convert string to datetime if needed
-                    date_added = datetime.fromisoformat(date_added)
-                elif not isinstance(date_added, datetime):  # Ensure it's a valid datetime object
-                    raise TypeError(f"Invalid date_added format: {date_added}")
-                # Check for 'user_id' directly if 'user' is not present
-                user_id = vehicle_data.get("user_id")
-                if user_id is None:
-                    raise ValueError(f"Missing or invalid user_id in vehicle_data: {vehicle_data}")
-                vehicle = Vehicle(
-                    vin=vehicle_data.get("vin"),
-                    make=vehicle_data.get("make"),
-                    model=vehicle_data.get("model"),
-                    year=vehicle_data.get("year"),
-                    engine_type=vehicle_data.get("engine_type"),
-                    uid=user_id,
-                    input_datetime=date_added
-                )
-                vehicle.create()
-        return vehicles
-
-
-
+        """
+        Upserts vehicles records from a backup, in bulk (see model/restore.py).
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        return restore_table("vehicles", data)["ids"]
 
 def initVehicles():
     """
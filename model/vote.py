@@ -1,4 +1,5 @@
 from __init__ import db, app
+from sqlalchemy import func, insert, update, delete, select
 from sqlalchemy.exc import IntegrityError
 from model.post import Post
 from model.user import User
@@ -16,6 +17,12 @@ class Vote(db.Model):
         _post_id (db.Column): An integer representing the ID of the post that received the vote.
     """
     __tablename__ = 'votes'
+    __table_args__ = (
+        # One vote per user and post, the conflict target of Vote.cast
+        db.Index('uq_votes_user_id_post_id', '_user_id', '_post_id', unique=True),
+        # Serves the vote lists of a post, grouped by type
+        db.Index('ix_votes_post_id_vote_type', '_post_id', '_vote_type'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     _vote_type = db.Column(db.String(10), nullable=False)  # "upvote" or "downvote"
@@ -37,10 +44,11 @@ class Vote(db.Model):
 
     def create(self):
         """
-        Add the vote to the database and commit the transaction.
+        Add the vote to the database and count it on its post, in one transaction.
         """
         try:
             db.session.add(self)
+            Vote._count(self._post_id, **{self._vote_type: 1})
             db.session.commit()
         except Exception as e:
             db.session.rollback()
@@ -62,24 +70,206 @@ class Vote(db.Model):
 
     def delete(self):
         """
-        Remove the vote from the database and commit the transaction.
+        Remove the vote from the database and from its post's counters, in one transaction.
         """
+        # Read before deleting, an expired attribute would autoflush the delete and then fail to load
+        post_id, vote_type = self._post_id, self._vote_type
         try:
             db.session.delete(self)
+            Vote._count(post_id, **{vote_type: -1})
             db.session.commit()
         except Exception as e:
             db.session.rollback()
             raise e
 
+    @staticmethod
+    def _count(post_id, upvote=0, downvote=0):
+        """
+        Adjust the vote counters of a post, and with them its feed scores, in the current transaction.
+
+        Returns:
+            bool: False if the post does not exist.
+        """
+        values = {}
+        if upvote:
+            values["_upvotes"] = Post._upvotes + upvote
+        if downvote:
+            values["_downvotes"] = Post._downvotes + downvote
+        if not values:
+            return True
+        if not db.session.execute(update(Post).where(Post.id == post_id).values(**values)).rowcount:
+            return False
+        Post.rescore(post_id)
+        return True
+
+    @staticmethod
+    def _insert_ignore():
+        """
+        An INSERT into votes that does nothing when the user already voted on the post.
+        """
+        dialect = db.session.get_bind(mapper=Vote.__mapper__).dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+            return sqlite_insert(Vote).on_conflict_do_nothing(index_elements=["_user_id", "_post_id"])
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+            return postgresql_insert(Vote).on_conflict_do_nothing(index_elements=["_user_id", "_post_id"])
+        return insert(Vote).prefix_with("IGNORE")
+
+    @staticmethod
+    def cast(user_id, post_id, vote_type):
+        """
+        Record a user's vote on a post, replacing any earlier vote of theirs, and keep the post's counters in step.
+
+        Nothing is read first: an UPDATE flips an existing vote of the other type, otherwise an insert that
+        ignores the (user, post) conflict adds the vote. The rowcounts say what changed, and the counters on
+        posts are adjusted by exactly that in the same transaction.
+
+        Args:
+            user_id (int): ID of the user voting.
+            post_id (int): ID of the post voted on.
+            vote_type (str): "upvote" or "downvote".
+
+        Returns:
+            dict: The vote and the post's new counts, or None if the post does not exist.
+        """
+        other = "downvote" if vote_type == "upvote" else "upvote"
+        try:
+            flipped = db.session.execute(
+                update(Vote)
+                .where(Vote._user_id == user_id, Vote._post_id == post_id, Vote._vote_type != vote_type)
+                .values(_vote_type=vote_type)
+            ).rowcount
+            if flipped:
+                found = Vote._count(post_id, **{vote_type: 1, other: -1})
+            else:
+                inserted = db.session.execute(
+                    Vote._insert_ignore().values(_user_id=user_id, _post_id=post_id, _vote_type=vote_type)
+                ).rowcount
+                # Neither flipped nor inserted: the same vote is already recorded, nothing to count
+                found = Vote._count(post_id, **{vote_type: 1}) if inserted else True
+            if not found:
+                db.session.rollback()
+                return None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+        return {"vote_type": vote_type, "user_id": user_id, "post_id": post_id, **Vote.counts([post_id])[post_id]}
+
+    @staticmethod
+    def retract(user_id, post_id):
+        """
+        Remove a user's vote on a post, if any, and take it off the post's counters, without reading it first.
+
+        Returns:
+            bool: True if a vote was removed.
+        """
+        try:
+            for vote_type in ("upvote", "downvote"):
+                removed = db.session.execute(
+                    delete(Vote).where(Vote._user_id == user_id, Vote._post_id == post_id, Vote._vote_type == vote_type)
+                ).rowcount
+                if removed:
+                    Vote._count(post_id, **{vote_type: -removed})
+                    db.session.commit()
+                    return True
+            db.session.rollback()
+            return False
+        except Exception as e:
+            db.session.rollback()
+            raise e
+
+    @staticmethod
+    def counts(post_ids):
+        """
+        Read the upvote and downvote counts of many posts from their counter columns, in one query.
+
+        Args:
+            post_ids (list): The ids of the posts to count votes for.
+
+        Returns:
+            dict: post id -> {"upvote_count": int, "downvote_count": int}, unknown posts count 0.
+        """
+        result = {post_id: {"upvote_count": 0, "downvote_count": 0} for post_id in post_ids}
+        if not result:
+            return result
+        rows = db.session.query(Post.id, Post._upvotes, Post._downvotes).filter(Post.id.in_(result.keys())).all()
+        for post_id, upvotes, downvotes in rows:
+            result[post_id] = {"upvote_count": upvotes, "downvote_count": downvotes}
+        return result
+
+    @staticmethod
+    def recount():
+        """
+        Recompute the vote counters of every post from the votes table, then its feed scores.
+
+        Vote keeps the counters in step as it writes; this is for votes and posts written around it,
+        by a restore (see model/restore.py).
+
+        Returns:
+            int: The number of posts whose scores changed, as returned by Post.rescore_all.
+        """
+        def tally(vote_type):
+            return select(func.count(Vote.id)).where(Vote._post_id == Post.id, Vote._vote_type == vote_type).scalar_subquery()
+
+        try:
+            db.session.execute(
+                update(Post).values(_upvotes=tally("upvote"), _downvotes=tally("downvote")),
+                execution_options={"synchronize_session": False}
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise e
+        return Post.rescore_all()
+
+    @staticmethod
+    def read_for_posts(post_ids, include_votes=True):
+        """
+        Summarize the votes of many posts: counts from Vote.counts, plus the votes themselves if asked,
+        all loaded with one more query.
+
+        Args:
+            post_ids (list): The ids of the posts.
+            include_votes (bool, optional): Include the "upvotes" and "downvotes" lists. Defaults to True.
+
+        Returns:
+            list: One dictionary per post id, in the order given.
+        """
+        counts = Vote.counts(post_ids)
+        votes = {post_id: {"upvotes": [], "downvotes": []} for post_id in counts}
+        if include_votes and counts:
+            for vote in Vote.query.filter(Vote._post_id.in_(counts.keys())).order_by(Vote.id):
+                if vote._vote_type in ("upvote", "downvote"):
+                    votes[vote._post_id][f"{vote._vote_type}s"].append(vote.read())
+        results = []
+        for post_id in post_ids:
+            result = {"post_id": post_id, **counts[post_id]}
+            if include_votes:
+                result.update(votes[post_id])
+            results.append(result)
+        return results
+
+    @staticmethod
+    def restore(data):
+        """
+        Upserts votes records from a backup, in bulk (see model/restore.py), and recounts the posts' counters.
+
+        Returns:
+            dict: Backup id -> database id of the restored records.
+        """
+        from model.restore import restore_table
+        ids = restore_table("votes", data)["ids"]
+        Vote.recount()
+        return ids
+
 def initVotes():
     """
     Initialize the Vote table with any required starter data.
     
     Returns:
-        list: A list of created Vote objects.
-    
-    Raises:
-        IntegrityError: An error occurred when adding the tester data to the table.
+        list: The starter votes, as returned by Vote.cast.
     """
     with app.app_context():
         # Create database tables if they don't exist
@@ -87,32 +277,18 @@ def initVotes():
 
         # Optionally, add some test data (replace with actual values as needed)
         votes = [
-            Vote(vote_type='upvote', user_id=1, post_id=1),
-            Vote(vote_type='downvote', user_id=2, post_id=1),
+            ('upvote', 1, 1),
+            ('downvote', 2, 1),
         ]
-        
+
+        # Vote.cast is idempotent, so running this again leaves votes and counters as they are
         created_votes = []
-        for vote in votes:
-            try:
-                db.session.add(vote)
-                db.session.flush()  # Flush to get the vote IDs
-                created_votes.append(vote)
-                print(f"Record created: {repr(vote)}")
-            except IntegrityError:
-                db.session.rollback()
-                print(f"Vote already exists: {vote._vote_type} by user {vote._user_id} on post {vote._post_id}")
-                # Try to get the existing vote
-                existing = Vote.query.filter_by(_vote_type=vote._vote_type, _user_id=vote._user_id, _post_id=vote._post_id).first()
-                if existing:
-                    created_votes.append(existing)
+        for vote_type, user_id, post_id in votes:
+            vote = Vote.cast(user_id, post_id, vote_type)
+            if vote is None:
+                print(f"Post {post_id} not found, skipping {vote_type} by user {user_id}")
                 continue
-        
-        # Commit all changes at once
-        try:
-            db.session.commit()
-            print("All votes created successfully")
-            return created_votes
-        except Exception as e:
-            db.session.rollback()
-            print(f"Error committing votes: {str(e)}")
-            return None
+            created_votes.append(vote)
+            print(f"Record created: {vote}")
+        print("All votes created successfully")
+        return created_votes
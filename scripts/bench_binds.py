@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+""" bench_binds.py
+Measures how long user writes wait for the SQLite write lock during a chat burst, with the chat table
+in the main database and in a database of its own (DB_SEPARATE_BINDS=chat).
+
+Several chat processes insert messages as fast as they can, one commit per message as carChat.create
+does, while one more process updates user rows at a steady rate, as logins and profile edits do.
+Both layouts use the same pragma profile as the app (SQLITE_PRAGMA_PROFILE). Reported per layout:
+the latency of the user updates (what a login waits), how many failed with "database is locked",
+and the chat messages written meanwhile.
+
+The databases go in a temporary directory under instance/ by default, so that fsync reaches a real
+disk; point --directory at the volume the app runs on to measure that one.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_binds.py
+
+Or run from the root of the project:
+> scripts/bench_binds.py --chatters 4 --seconds 5
+> SQLITE_PRAGMA_PROFILE=durable scripts/bench_binds.py
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from __init__ import app, apply_sqlite_pragmas
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=0)  # waiting for the lock is left to the profile's busy_timeout
+    apply_sqlite_pragmas(conn, app.config['SQLITE_PRAGMAS'])
+    return conn
+
+def create(main_path, chat_path, users):
+    conn = connect(main_path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, _uid TEXT, _name TEXT, _password TEXT, _token_version INTEGER DEFAULT 0)")
+    conn.executemany("INSERT INTO users (_uid, _name, _password) VALUES (?, ?, ?)",
+                     [(f"user{i}", f"User {i}", "pbkdf2:sha256:1000$" + "x" * 80) for i in range(users)])
+    conn.commit()
+    conn.close()
+    conn = connect(chat_path)
+    conn.execute('CREATE TABLE "carChats" (id INTEGER PRIMARY KEY, _message TEXT, user_id INTEGER, _timestamp TEXT)')
+    conn.execute('CREATE INDEX "ix_carChats__timestamp" ON "carChats" (_timestamp)')
+    conn.commit()
+    conn.close()
+
+def chatter(chat_path, start, stop, results):
+    conn = connect(chat_path)
+    written = 0
+    start.wait()
+    while not stop.is_set():
+        try:
+            conn.execute('INSERT INTO "carChats" (_message, user_id, _timestamp) VALUES (?, ?, ?)',
+                         ("vroom " * 20, os.getpid() % 100, time.strftime("%Y-%m-%dT%H:%M:%S")))
+            conn.commit()
+            written += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+    conn.close()
+    results.put(("chat", written))
+
+def updater(main_path, users, rate, start, stop, results):
+    conn = connect(main_path)
+    latencies, locked = [], 0
+    start.wait()
+    number = 0
+    while not stop.is_set():
+        began = time.perf_counter()
+        try:
+            conn.execute("UPDATE users SET _token_version = _token_version + 1 WHERE id = ?", (number % users + 1,))
+            conn.commit()
+            latencies.append(time.perf_counter() - began)
+        except sqlite3.OperationalError:
+            conn.rollback()
+            locked += 1
+        number += 1
+        time.sleep(max(0.0, 1 / rate - (time.perf_counter() - began)))
+    conn.close()
+    results.put(("users", (latencies, locked)))
+
+def run(main_path, chat_path, args):
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(args.chatters + 2)
+    stop = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=chatter, args=(chat_path, start, stop, results)) for _ in range(args.chatters)]
+    processes.append(context.Process(target=updater, args=(main_path, args.users, args.rate, start, stop, results)))
+    for process in processes:
+        process.start()
+    start.wait()
+    time.sleep(args.seconds)
+    stop.set()
+    messages, latencies, locked = 0, [], 0
+    for _ in processes:
+        kind, value = results.get()
+        if kind == "chat":
+            messages += value
+        else:
+            latencies, locked = value
+    for process in processes:
+        process.join()
+    latencies.sort()
+    return {
+        "updates": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000 if latencies else 0,
+        "max_ms": latencies[-1] * 1000 if latencies else 0,
+        "locked": locked,
+        "messages_per_s": messages / args.seconds
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--chatters", type=int, default=4, help="processes writing chat messages")
+    parser.add_argument("--seconds", type=float, default=5, help="length of each run")
+    parser.add_argument("--rate", type=float, default=50, help="user updates per second")
+    parser.add_argument("--users", type=int, default=1000, help="rows in the users table")
+    parser.add_argument("--directory", default=app.instance_path, help="where the scratch databases are created")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    print(f"{args.chatters} chat writers, user updates at {args.rate:.0f}/s for {args.seconds:.0f}s, "
+          f"profile {app.config['SQLITE_PRAGMA_PROFILE']}, in {args.directory}")
+    print(f"  {'layout':<18} {'user p50 ms':>11} {'p99 ms':>8} {'max ms':>8} {'locked':>7} {'messages/s':>11}")
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        shared = os.path.join(directory, "shared.db")
+        create(shared, shared, args.users)
+        separate = (os.path.join(directory, "main.db"), os.path.join(directory, "chat.db"))
+        create(*separate, args.users)
+        for name, (main_path, chat_path) in [("one database", (shared, shared)), ("chat separate", separate)]:
+            result = run(main_path, chat_path, args)
+            print(f"  {name:<18} {result['p50_ms']:>11.2f} {result['p99_ms']:>8.2f} {result['max_ms']:>8.2f} "
+                  f"{result['locked']:>7} {result['messages_per_s']:>11.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+""" bench_boot.py
+Measures how long a worker takes to boot, with and without the initialization that used to run on import.
+
+Each run is a fresh interpreter importing main (what every gunicorn worker does). The boot does one
+schema version query now; the work it used to do on every import, db.create_all() and the nine seed
+functions, is timed separately in the same fresh interpreter, against the already initialized
+database as it ran on every boot.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_boot.py
+
+Or run from the root of the project:
+> scripts/bench_boot.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+BOOT = """
+import json, time
+start = time.perf_counter()
+import main
+booted = time.perf_counter() - start
+result = {"boot": booted}
+if LEGACY:
+    start = time.perf_counter()
+    with main.app.app_context():
+        main.db.create_all()
+        for seeder in main.SEEDERS:
+            try:
+                seeder()
+            except Exception:
+                main.db.session.rollback()
+    result["legacy_init"] = time.perf_counter() - start
+print("BOOT " + json.dumps(result))
+"""
+
+def boot(legacy):
+    output = subprocess.run(
+        [sys.executable, "-c", f"LEGACY = {legacy}\n" + BOOT],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    line = [line for line in output.splitlines() if line.startswith("BOOT ")][-1]
+    return json.loads(line[5:])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    now = [boot(False)["boot"] for _ in range(args.runs)]
+    before = [sum(boot(True).values()) for _ in range(args.runs)]
+    print(f"{args.runs} runs, median of fresh interpreters")
+    print(f"  boot with init on import (before)  {statistics.median(before) * 1000:8.0f} ms")
+    print(f"  boot with schema check (now)       {statistics.median(now) * 1000:8.0f} ms")
+
+if __name__ == "__main__":
+    main()
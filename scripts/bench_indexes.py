@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+""" bench_indexes.py
+Measures the lookups served by the indexes of migration 3c8f1e5b7a20, before and after creating them.
+
+A scratch SQLite database gets --rows rows in each table involved, spread over --keys users, posts,
+sections or groups (about rows / keys matches per lookup). Each query below, the same filter an
+endpoint runs, is timed --runs times with random keys, first without the indexes, then with the
+indexes of the migration's INDEXES created. Reported per query: the median and p99 latency before
+and after, and the plan SQLite uses once the index exists.
+
+The database goes in a temporary directory under instance/ by default and uses the app's pragma
+profile (SQLITE_PRAGMA_PROFILE).
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_indexes.py
+
+Or run from the root of the project:
+> scripts/bench_indexes.py --rows 100000 --runs 200
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from __init__ import app, apply_sqlite_pragmas
+
+MIGRATION = os.path.join(os.path.dirname(__file__), '..', 'migrations', 'versions', '3c8f1e5b7a20_lookup_indexes.py')
+
+# The tables as the models declare them, without the indexes under test
+TABLES = [
+    "CREATE TABLE posts (id INTEGER PRIMARY KEY, _title TEXT, _comment TEXT, _content TEXT, _user_id INTEGER, _channel_id INTEGER)",
+    'CREATE TABLE "nestPosts" (id INTEGER PRIMARY KEY, _title TEXT, _content TEXT, _user_id INTEGER, _group_id INTEGER, _image_url TEXT)',
+    "CREATE TABLE feedbacks (id INTEGER PRIMARY KEY, _content TEXT, _user_id INTEGER, _post_id INTEGER)",
+    "CREATE TABLE groups (id INTEGER PRIMARY KEY, _name TEXT UNIQUE, _section_id INTEGER)",
+    "CREATE TABLE channels (id INTEGER PRIMARY KEY, _name TEXT, _attributes TEXT, _group_id INTEGER)",
+    'CREATE TABLE "userCars" (id INTEGER PRIMARY KEY, _uid INTEGER, _make TEXT, _model TEXT, _year TEXT, _trim TEXT)',
+    "CREATE TABLE vehicles (id INTEGER PRIMARY KEY, _uid INTEGER, _vin TEXT UNIQUE, _make TEXT, _model TEXT, _year INTEGER)",
+    "CREATE TABLE user_items (id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT, user_input TEXT)",
+]
+
+# Name -> (SQL, function of a random key number giving its parameters)
+QUERIES = {
+    "posts of a user": ("SELECT * FROM posts WHERE _user_id = ?", lambda key: (key,)),
+    "nest posts of a user": ('SELECT * FROM "nestPosts" WHERE _user_id = ?', lambda key: (key,)),
+    "feedback of a post": ("SELECT * FROM feedbacks WHERE _post_id = ?", lambda key: (key,)),
+    "groups of a section": ("SELECT * FROM groups WHERE _section_id = ?", lambda key: (key,)),
+    "channels of a group": ("SELECT * FROM channels WHERE _group_id = ?", lambda key: (key,)),
+    "channel by name": ("SELECT * FROM channels WHERE _group_id = ? AND _name = ? LIMIT 1", lambda key: (key, f"channel{key}")),
+    "cars of a user": ('SELECT * FROM "userCars" WHERE _uid = ?', lambda key: (key,)),
+    "vehicles of a user": ("SELECT * FROM vehicles WHERE _uid = ?", lambda key: (key,)),
+    "vehicle by VIN": ("SELECT * FROM vehicles WHERE upper(_vin) = ? LIMIT 1", lambda key: (f"VIN{key:014d}",)),
+    "item by name": ("SELECT * FROM user_items WHERE name = ? LIMIT 1", lambda key: (f"item{key}",)),
+    "item of a user": ("SELECT * FROM user_items WHERE name = ? AND user_id = ? LIMIT 1", lambda key: (f"item{key}", key)),
+}
+
+def load_indexes():
+    # The INDEXES of the migration itself, so the benchmark measures what upgrading creates
+    spec = importlib.util.spec_from_file_location("lookup_indexes", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration.INDEXES
+
+def seed(conn, rows, keys):
+    rng = random.Random(0)
+    def key():
+        return rng.randrange(keys)
+    conn.executemany("INSERT INTO posts (_title, _comment, _content, _user_id, _channel_id) VALUES (?, ?, '{}', ?, ?)",
+                     ((f"post{i}", "comment " * 10, key(), key()) for i in range(rows)))
+    conn.executemany('INSERT INTO "nestPosts" (_title, _content, _user_id, _group_id, _image_url) VALUES (?, ?, ?, ?, ?)',
+                     ((f"nest{i}", "content " * 10, key(), key(), f"image{i}.png") for i in range(rows)))
+    conn.executemany("INSERT INTO feedbacks (_content, _user_id, _post_id) VALUES (?, ?, ?)",
+                     (("feedback " * 10, key(), key()) for _ in range(rows)))
+    conn.executemany("INSERT INTO groups (_name, _section_id) VALUES (?, ?)", ((f"group{i}", key()) for i in range(rows)))
+    conn.executemany("INSERT INTO channels (_name, _group_id) VALUES (?, ?)",
+                     ((f"channel{i % keys}", key()) for i in range(rows)))
+    conn.executemany('INSERT INTO "userCars" (_uid, _make, _model, _year) VALUES (?, ?, ?, ?)',
+                     ((key(), "Toyota", "Corolla", "2014") for _ in range(rows)))
+    # VINs shuffled over the table, so that a scan for one does not stop early
+    conn.executemany("INSERT INTO vehicles (_uid, _vin, _make, _model, _year) VALUES (?, ?, ?, ?, ?)",
+                     ((key(), f"vin{i * 7919 % rows:014d}", "Volkswagen", "Beetle", 2014) for i in range(rows)))
+    conn.executemany("INSERT INTO user_items (user_id, name, user_input) VALUES (?, ?, ?)",
+                     ((key(), f"item{i % keys}", "notes " * 5) for i in range(rows)))
+    conn.commit()
+
+def create_indexes(conn, indexes):
+    for table, table_indexes in indexes.items():
+        for name, columns in table_indexes.items():
+            expressions = ", ".join(column if isinstance(column, str) else str(column) for column in columns)
+            conn.execute(f'CREATE INDEX "{name}" ON "{table}" ({expressions})')
+    conn.commit()
+
+def measure(conn, sql, params, keys, runs):
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(runs):
+        args = params(rng.randrange(keys))
+        began = time.perf_counter()
+        conn.execute(sql, args).fetchall()
+        latencies.append(time.perf_counter() - began)
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000
+
+def plan(conn, sql, params):
+    return "; ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params(0)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=100000, help="rows in each table")
+    parser.add_argument("--keys", type=int, default=5000, help="distinct users, posts, sections or groups looked up")
+    parser.add_argument("--runs", type=int, default=200, help="timed lookups per query")
+    parser.add_argument("--directory", default=app.instance_path, help="where the scratch database is created")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    indexes = load_indexes()
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        conn = sqlite3.connect(os.path.join(directory, "bench.db"))
+        apply_sqlite_pragmas(conn, app.config['SQLITE_PRAGMAS'])
+        for statement in TABLES:
+            conn.execute(statement)
+        seed(conn, args.rows, args.keys)
+
+        before = {name: measure(conn, sql, params, args.keys, args.runs) for name, (sql, params) in QUERIES.items()}
+        began = time.perf_counter()
+        create_indexes(conn, indexes)
+        built = time.perf_counter() - began
+        after = {name: measure(conn, sql, params, args.keys, args.runs) for name, (sql, params) in QUERIES.items()}
+
+        print(f"{args.rows} rows per table, {args.keys} keys, {args.runs} lookups per query, "
+              f"profile {app.config['SQLITE_PRAGMA_PROFILE']}; indexes built in {built:.2f}s")
+        print(f"  {'query':<22} {'before p50 ms':>13} {'p99 ms':>8} {'after p50 ms':>13} {'p99 ms':>8} {'speedup':>8}  plan after")
+        for name, (sql, params) in QUERIES.items():
+            (before_p50, before_p99), (after_p50, after_p99) = before[name], after[name]
+            print(f"  {name:<22} {before_p50:>13.3f} {before_p99:>8.3f} {after_p50:>13.3f} {after_p99:>8.3f} "
+                  f"{before_p50 / after_p50:>7.0f}x  {plan(conn, sql, params)}")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
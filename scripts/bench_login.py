@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+""" bench_login.py
+Compares login throughput and latency with password hashing inline vs on the bounded hash pool.
+
+A fixed number of server threads (like gunicorn --threads) serve a burst of login attempts from
+many concurrent clients, mixed with cheap requests that only measure how long they wait for a free
+server thread. Inline, every login holds its server thread for a full pbkdf2 check. With the pool,
+logins beyond its capacity are refused at once with 503, so cheap requests keep flowing.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_login.py
+
+Or run from the root of the project:
+> scripts/bench_login.py --clients 64 --server-threads 8 --seconds 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from werkzeug.security import generate_password_hash
+from model.hashing import HashPool, HashPoolSaturated
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run(pool, args, pwhash):
+    server = ThreadPoolExecutor(max_workers=args.server_threads)
+    lock = threading.Lock()
+    results = {"ok": [], "rejected": [], "probe": []}
+    deadline = time.perf_counter() + args.seconds
+
+    def login(queued_at):
+        try:
+            pool.check(pwhash, "123Toby!")
+            key = "ok"
+        except HashPoolSaturated:
+            key = "rejected"
+        with lock:
+            results[key].append(time.perf_counter() - queued_at)
+        return key
+
+    def probe(queued_at):
+        with lock:
+            results["probe"].append(time.perf_counter() - queued_at)
+
+    def client():
+        while time.perf_counter() < deadline:
+            if server.submit(login, time.perf_counter()).result() == "rejected":
+                # Clients honor Retry-After, scaled down to keep runs short
+                time.sleep(args.backoff)
+
+    def prober():
+        while time.perf_counter() < deadline:
+            server.submit(probe, time.perf_counter()).result()
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    threads.append(threading.Thread(target=prober))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    return results, elapsed
+
+def report(name, results, elapsed):
+    ok, rejected, probe = results["ok"], results["rejected"], results["probe"]
+    print(f"{name}")
+    print(f"  logins ok        {len(ok):6d}  ({len(ok) / elapsed:7.1f}/s)  p50 {percentile(ok, 50) * 1000:7.1f} ms  p99 {percentile(ok, 99) * 1000:7.1f} ms")
+    print(f"  logins 503       {len(rejected):6d}  ({len(rejected) / elapsed:7.1f}/s)  p50 {percentile(rejected, 50) * 1000:7.1f} ms")
+    print(f"  other requests   {len(probe):6d}             p50 {percentile(probe, 50) * 1000:7.1f} ms  p99 {percentile(probe, 99) * 1000:7.1f} ms  mean {statistics.fmean(probe or [0]) * 1000:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--clients", type=int, default=32, help="concurrent clients attempting to log in")
+    parser.add_argument("--server-threads", type=int, default=8, help="threads serving requests")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each run")
+    parser.add_argument("--method", default="pbkdf2:sha256:200000", help="hash method of the stored password")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="hash pool workers")
+    parser.add_argument("--queue", type=int, default=None, help="hash pool queue depth (default 2 x workers)")
+    parser.add_argument("--backoff", type=float, default=0.1, help="seconds a client waits after a 503")
+    args = parser.parse_args()
+    queue = args.queue if args.queue is not None else 2 * args.workers
+
+    pwhash = generate_password_hash("123Toby!", args.method, salt_length=10)
+    print(f"{args.clients} clients, {args.server_threads} server threads, {args.method}, {args.seconds:g}s per run\n")
+
+    results, elapsed = run(HashPool(workers=0, queue_depth=0, method=args.method), args, pwhash)
+    report("inline (no pool)", results, elapsed)
+    results, elapsed = run(HashPool(workers=args.workers, queue_depth=queue, method=args.method), args, pwhash)
+    report(f"hash pool (workers={args.workers}, queue={queue})", results, elapsed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+""" bench_sqlite_pragmas.py
+Compares the write throughput of the SQLite pragma profiles under concurrent writers.
+
+For each profile of SQLITE_PRAGMA_PROFILES a fresh database is created and several writer
+processes (what gunicorn workers are) commit one row per transaction, as the models do with
+db.session.commit(), all starting at once. Optional reader processes run a count query in a loop
+meanwhile. Reported per profile: commits per second across all writers, the median and 99th
+percentile commit latency, and how many commits failed with "database is locked".
+
+The databases go in a temporary directory under instance/ by default, so that fsync reaches a real
+disk; point --directory at the volume the app runs on to measure that one.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./bench_sqlite_pragmas.py
+
+Or run from the root of the project:
+> scripts/bench_sqlite_pragmas.py --writers 4 --commits 500 --readers 2
+> scripts/bench_sqlite_pragmas.py --profiles legacy production
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from __init__ import app, SQLITE_PRAGMA_PROFILES, apply_sqlite_pragmas
+
+def connect(path, pragmas):
+    conn = sqlite3.connect(path, timeout=0)  # waiting for locks is left to the profile's busy_timeout
+    apply_sqlite_pragmas(conn, pragmas)
+    return conn
+
+def writer(path, pragmas, commits, start, results):
+    conn = connect(path, pragmas)
+    latencies, locked = [], 0
+    start.wait()
+    for number in range(commits):
+        began = time.perf_counter()
+        try:
+            conn.execute("INSERT INTO posts (user_id, title, content, created_at) VALUES (?, ?, ?, ?)",
+                         (os.getpid(), f"Post {number}", "x" * 200, time.time()))
+            conn.commit()
+            latencies.append(time.perf_counter() - began)
+        except sqlite3.OperationalError:
+            conn.rollback()
+            locked += 1
+    conn.close()
+    results.put((latencies, locked))
+
+def reader(path, pragmas, start, stop):
+    conn = connect(path, pragmas)
+    start.wait()
+    while not stop.is_set():
+        try:
+            conn.execute("SELECT COUNT(*), MAX(created_at) FROM posts").fetchone()
+        except sqlite3.OperationalError:
+            pass
+    conn.close()
+
+def run(profile, args, directory):
+    pragmas = SQLITE_PRAGMA_PROFILES[profile]
+    path = os.path.join(directory, f"{profile}.db")
+    conn = connect(path, pragmas)
+    conn.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT, content TEXT, created_at REAL)")
+    conn.execute("CREATE INDEX ix_posts_user_id ON posts (user_id)")
+    conn.commit()
+    conn.close()
+
+    context = multiprocessing.get_context("fork")
+    start = context.Barrier(args.writers + args.readers + 1)
+    stop = context.Event()
+    results = context.Queue()
+    readers = [context.Process(target=reader, args=(path, pragmas, start, stop)) for _ in range(args.readers)]
+    writers = [context.Process(target=writer, args=(path, pragmas, args.commits, start, results)) for _ in range(args.writers)]
+    for process in readers + writers:
+        process.start()
+    start.wait()
+    began = time.perf_counter()
+    latencies, locked = [], 0
+    for _ in writers:
+        writer_latencies, writer_locked = results.get()
+        latencies.extend(writer_latencies)
+        locked += writer_locked
+    elapsed = time.perf_counter() - began
+    stop.set()
+    for process in readers + writers:
+        process.join()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    return {
+        "commits_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99_ms": p99 * 1000,
+        "locked": locked
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PRAGMA_PROFILES), choices=list(SQLITE_PRAGMA_PROFILES), help="profiles to compare")
+    parser.add_argument("--writers", type=int, default=4, help="concurrent writer processes")
+    parser.add_argument("--commits", type=int, default=300, help="commits per writer")
+    parser.add_argument("--readers", type=int, default=1, help="concurrent reader processes")
+    parser.add_argument("--directory", default=app.instance_path, help="where the scratch databases are created")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    print(f"{args.writers} writers x {args.commits} commits, {args.readers} readers, in {args.directory}")
+    print(f"  {'profile':<12} {'commits/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'locked':>7}")
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        for profile in args.profiles:
+            result = run(profile, args, directory)
+            print(f"  {profile:<12} {result['commits_per_s']:>10.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['locked']:>7}")
+
+if __name__ == "__main__":
+    main()
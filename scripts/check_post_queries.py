@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+""" check_post_queries.py
+Checks that the post list endpoints run a fixed number of queries, however many posts there are.
+
+Each endpoint is called against a scratch in-memory database seeded with a small and a large number
+of posts (spread over many authors and channels). If the number of SELECTs grows with the number of
+posts, serialization is lazy loading authors or channels one post at a time (N+1) and the check fails.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./check_post_queries.py
+
+Or run from the root of the project:
+> scripts/check_post_queries.py --small 10 --large 200
+"""
+
+import argparse
+import os
+import sys
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from __init__ import app as base_app, db
+from api.jwt_authorize import encode_token, token_cache
+from api.post import post_api
+from model.user import User
+from model.section import Section
+from model.group import Group
+from model.channel import Channel
+from model.post import Post
+
+def make_app():
+    # A scratch app on an in-memory database, so the check never touches volumes/
+    app = Flask(__name__)
+    app.config.update(base_app.config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config.pop('SQLALCHEMY_ENGINE_OPTIONS', None)  # an in-memory database lives in a single connection, not a pool
+    db.init_app(app)
+    app.register_blueprint(post_api)
+    return app
+
+def seed(count):
+    db.drop_all()
+    db.create_all()
+    # Authors are inserted directly, hashing a password per row would dominate the run
+    pwhash = generate_password_hash("123Toby!", "pbkdf2:sha256:1000")
+    authors = max(1, count // 2)
+    db.session.execute(User.__table__.insert(), [
+        {"_name": f"User {i}", "_uid": f"user{i}", "_email": "?", "_password": pwhash, "_role": "User", "_pfp": "", "_token_version": 0}
+        for i in range(authors)
+    ])
+    section = Section("Home")
+    db.session.add(section)
+    db.session.flush()
+    group = Group("General", section.id)
+    db.session.add(group)
+    db.session.flush()
+    channels = [Channel(f"Channel {i}", group.id) for i in range(max(1, count // 4))]
+    db.session.add_all(channels)
+    db.session.flush()
+    user_ids = [row[0] for row in db.session.execute(db.select(User.id)).all()]
+    db.session.add_all([
+        # Every third post is by the first user and every other one in the first channel, so all three lists grow
+        Post(f"Post {i}", "comment", user_ids[0] if i % 3 == 0 else user_ids[i % len(user_ids)],
+             channels[0].id if i % 2 else channels[i % len(channels)].id)
+        for i in range(count)
+    ])
+    db.session.commit()
+    return db.session.get(User, user_ids[0]), channels[0].id
+
+def count_queries(app, count):
+    with app.app_context():
+        user, channel_id = seed(count)
+        token = encode_token(user)
+        db.session.remove()
+        token_cache.clear()
+
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            client = app.test_client()
+            client.set_cookie(app.config['JWT_TOKEN_NAME'], token)
+            results = {}
+            for name, call in [
+                ("GET /api/posts", lambda: client.get('/api/posts')),
+                ("POST /api/posts/filter", lambda: client.post('/api/posts/filter', json={"channel_id": channel_id})),
+                ("GET /api/post/user", lambda: client.get('/api/post/user')),
+            ]:
+                token_cache.clear()
+                del statements[:]
+                response = call()
+                assert response.status_code == 200, f"{name} answered {response.status_code}"
+                results[name] = (len(statements), len(response.get_json()))
+            return results
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--small", type=int, default=10, help="posts in the first run")
+    parser.add_argument("--large", type=int, default=200, help="posts in the second run")
+    args = parser.parse_args()
+
+    app = make_app()
+    small = count_queries(app, args.small)
+    large = count_queries(app, args.large)
+
+    failed = False
+    for name in small:
+        (small_queries, small_posts), (large_queries, large_posts) = small[name], large[name]
+        ok = small_queries == large_queries
+        failed = failed or not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:24s} {small_posts:5d} posts: {small_queries} queries, {large_posts:5d} posts: {large_queries} queries")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
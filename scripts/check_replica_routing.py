@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+""" check_replica_routing.py
+Checks read-replica routing end to end, with two SQLite files in a temporary directory.
+
+A scratch app serves the post API from a primary database with a replica kept --lag seconds behind
+by ReplicaLagSimulator. A user creates a post; then, before the replica catches up:
+
+- the POST wrote to the primary only;
+- a GET of /api/posts by another client reads the replica and does not see the post yet;
+- a GET by the writer, who holds the sticky cookie, reads the primary and sees it.
+
+Once the replica has caught up, both see it from the replica; once the sticky window has passed,
+the writer's reads go back to the replica. Which engine served each request is counted with engine events.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./check_replica_routing.py
+
+Or run from the root of the project:
+> scripts/check_replica_routing.py --lag 1 --sticky 2
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from sqlalchemy import event
+
+from __init__ import app as base_app, db
+from api.jwt_authorize import encode_token
+from api.post import post_api
+from model.replica import REPLICA_BIND, ReplicaLagSimulator, init_read_replica
+from model.user import User
+from model.section import Section
+from model.group import Group
+from model.channel import Channel
+
+def make_app(primary, replica, sticky):
+    # A scratch app on two scratch databases, so the check never touches volumes/
+    app = Flask(__name__)
+    app.config.update(base_app.config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{primary}'
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: f'sqlite:///{replica}'}
+    app.config['DB_REPLICA_STICKY_SECONDS'] = sticky
+    db.init_app(app)
+    init_read_replica(app)
+    app.register_blueprint(post_api)
+    return app
+
+def seed():
+    db.create_all()
+    user = User(name="Writer", uid="writer", password="123Toby!")
+    db.session.add(user)
+    section = Section("Home")
+    db.session.add(section)
+    db.session.flush()
+    group = Group("General", section.id)
+    db.session.add(group)
+    db.session.flush()
+    channel = Channel("General", group.id)
+    db.session.add(channel)
+    db.session.commit()
+    return encode_token(user), channel.id
+
+def titles(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT _title FROM posts")}
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--lag", type=float, default=1.0, help="seconds the replica is behind")
+    parser.add_argument("--sticky", type=int, default=2, help="seconds a writer's reads stay on the primary")
+    args = parser.parse_args()
+
+    failures = []
+    def expect(condition, message):
+        print(f"{'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        primary, replica = os.path.join(scratch, "primary.db"), os.path.join(scratch, "replica.db")
+        app = make_app(primary, replica, args.sticky)
+        simulator = ReplicaLagSimulator(primary, replica, lag=args.lag, interval=args.lag / 4)
+        with app.app_context():
+            token, channel_id = seed()
+            engines = {"primary": db.engines[None], "replica": db.engines[REPLICA_BIND]}
+        simulator.sync()
+
+        served = []
+        for name, engine in engines.items():
+            event.listen(engine, "before_cursor_execute", lambda *_, name=name: served.append(name))
+
+        writer, reader = app.test_client(), app.test_client()
+        for client in (writer, reader):
+            client.set_cookie(base_app.config['JWT_TOKEN_NAME'], token)
+
+        def posts(client):
+            del served[:]
+            response = client.get('/api/posts')
+            assert response.status_code == 200, f"GET /api/posts answered {response.status_code}"
+            return {post['title'] for post in response.get_json()}, set(served)
+
+        del served[:]
+        response = writer.post('/api/post', json={"title": "Fresh", "comment": "hello", "channel_id": channel_id})
+        expect(response.status_code == 200, f"POST /api/post answered {response.status_code}")
+        expect(set(served) == {"primary"}, f"POST used {sorted(set(served))}")
+        expect("Fresh" in titles(primary) and "Fresh" not in titles(replica), "the post is on the primary only")
+        expect(writer.get_cookie(base_app.config['DB_REPLICA_STICKY_COOKIE']) is not None, "the writer got the sticky cookie")
+
+        seen, used = posts(reader)
+        expect("Fresh" not in seen and used == {"replica"}, f"another client reads the lagging replica ({sorted(used)})")
+        seen, used = posts(writer)
+        expect("Fresh" in seen and used == {"primary"}, f"the writer reads its own write from the primary ({sorted(used)})")
+
+        deadline = time.time() + args.lag * 3
+        while "Fresh" not in titles(replica) and time.time() < deadline:
+            simulator.step()
+            time.sleep(args.lag / 10)
+        seen, used = posts(reader)
+        expect("Fresh" in seen and used == {"replica"}, f"the replica caught up after {args.lag}s ({sorted(used)})")
+
+        time.sleep(args.sticky + 1.1)
+        seen, used = posts(writer)
+        expect("Fresh" in seen and used == {"replica"}, f"after {args.sticky}s the writer reads the replica again ({sorted(used)})")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+""" check_replication.py
+Checks WAL shipping and point-in-time restore end to end, on a scratch database in a temporary directory.
+
+A writer commits rounds of inserts, updates and deletes while the replicator ships the WAL with a
+small checkpoint threshold (so the WAL restarts many times) and a short snapshot interval (so
+segments are compacted and pruned). The state of the table is recorded after every round; the
+database is then restored at each recorded time and must match the state recorded at that time.
+Finally the replicator is stopped, the WAL is checkpointed behind its back, and a restart must
+begin a new generation that restores correctly too.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./check_replication.py
+
+Or run from the root of the project:
+> scripts/check_replication.py --rounds 200 --checkpoint-pages 20
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from model.replication import WalArchive, WalReplicator
+
+def digest(path):
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok", f"{path} is corrupt"
+        rows = conn.execute("SELECT id, value FROM items ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    return hashlib.sha256(repr(rows).encode()).hexdigest()[:16], len(rows)
+
+def write_round(conn, number):
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO items (value) VALUES (?)", [(f"round {number} row {i} " + "x" * 200,) for i in range(20)])
+    conn.execute("UPDATE items SET value = value || '+' WHERE id % 7 = ?", (number % 7,))
+    conn.execute("DELETE FROM items WHERE id % 11 = ? AND id < ?", (number % 11, number * 10))
+    conn.execute("COMMIT")
+
+def check(archive, history, scratch):
+    failures = 0
+    target = os.path.join(scratch, "restored.db")
+    for ms, expected in history:
+        result = archive.restore(target, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ms // 1000)) + f".{ms % 1000:03d}")
+        actual = digest(target)
+        if actual != expected:
+            failures += 1
+            print(f"FAIL restore to {ms}: {actual}, expected {expected} ({result})")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rounds", type=int, default=120, help="write rounds")
+    parser.add_argument("--checkpoint-pages", type=int, default=20, help="WAL frames before the replicator checkpoints")
+    parser.add_argument("--snapshot-interval", type=float, default=0.2, help="seconds between compactions")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, "live.db")
+        archive = WalArchive(os.path.join(scratch, "archive"))
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT)")
+
+        replicator = WalReplicator(db_path, archive, checkpoint_pages=args.checkpoint_pages,
+                                   snapshot_interval=args.snapshot_interval, retention=3600)
+        replicator.open()
+        history = []
+        start = time.perf_counter()
+        for number in range(args.rounds):
+            write_round(conn, number)
+            replicator.step()
+            time.sleep(0.002)
+            history.append((int(time.time() * 1000), digest(db_path)))
+            time.sleep(0.002)
+        elapsed = time.perf_counter() - start
+        replicator.close()
+        stats = replicator.stats()
+        print(f"{args.rounds} rounds in {elapsed:.2f}s: {stats['segments']} segments, {stats['frames']} frames, "
+              f"{stats['checkpoints']} checkpoints, {stats['snapshots']} snapshots, WAL index {stats['index']}")
+
+        # Checkpoint behind the replicator's back: the next generation must start from a fresh snapshot
+        for number in range(args.rounds, args.rounds + 10):
+            write_round(conn, number)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        write_round(conn, args.rounds + 10)
+        replicator.open()
+        for number in range(args.rounds + 11, args.rounds + 20):
+            write_round(conn, number)
+            replicator.step()
+            time.sleep(0.002)
+            history.append((int(time.time() * 1000), digest(db_path)))
+            time.sleep(0.002)
+        replicator.close()
+        conn.close()
+        print(f"generations: {len(archive.generations())}")
+
+        start = time.perf_counter()
+        failures = check(archive, history, scratch)
+        print(f"{len(history)} point-in-time restores in {time.perf_counter() - start:.2f}s, {failures} failed")
+        sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
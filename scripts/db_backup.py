@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 
 """ db_backup.py
-Backs up the current database and saves the data to JSON files.
+Backs up the current database from a consistent snapshot, one compressed NDJSON file per table.
+
+The backup is a new timestamped directory under BACKUP_DIR (instance/backup by default) holding
+<table>.ndjson.gz files and a manifest.json with their row counts and checksums. It can run while
+the app serves traffic; see model/backup.py.
 
 Usage: Run from the terminal as such:
 
@@ -9,9 +13,10 @@ Goto the scripts directory:
 > cd scripts; ./db_backup.py
 
 Or run from the root of the project:
-> scripts/db_backup.py
+> scripts/db_backup.py --directory /mnt/backups
 """
 
+import argparse
 import sys
 import os
 
@@ -21,9 +26,13 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from main import app, backup_data
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--directory", default=None, help="where to create the backup (default BACKUP_DIR)")
+    args = parser.parse_args()
+
     # Step 1: Backup the old database
     with app.app_context():
-        backup_data()
+        backup_data(args.directory)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
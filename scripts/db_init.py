@@ -1,88 +1,53 @@
 #!/usr/bin/env python3
 
-""" db_migrate.py
-Generates the database schema for all db models
-- Initializes Users, Sections, and UserSections tables.
-- Imports data from the old database to the new database.
+""" db_init.py
+Initializes the database: creates the tables, applies the migrations and seeds default data.
+
+This is the one place initialization happens; the app itself only checks at boot that the database
+is at the newest migration. It runs under a lock and does nothing if the database is already
+initialized, so every container or deploy can run it before starting the app.
+
+--reset drops all tables first and initializes from scratch, losing all data.
 
 Usage: Run from the terminal as such:
 
 Goto the scripts directory:
-> cd scripts; ./db_migrate.py
+> cd scripts; ./db_init.py
 
 Or run from the root of the project:
-> scripts/db_migrate.py
-
-General Process outline:
-0. Warning to the user.
-1. Old data extraction.  An API has been created in the old project ...
-  - Extract Data: retrieves data from the specified tables in the old database.
-  - Transform Data: the API to JSON format understood by the new project.
-2. New schema.  The schema is created in "this" new database.
-3. Load Data: The bulk load API in "this" project inserts the data using required business logic.
-
+> scripts/db_init.py
+> scripts/db_init.py --force
+> scripts/db_init.py --reset
 """
-import shutil
+import argparse
 import sys
-from pathlib import Path
 import os
 
 # Add the directory containing main.py to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# This script brings the schema up to date, the boot check would only warn that it is not
+os.environ.setdefault('DB_SCHEMA_CHECK', 'off')
 # Import application object
 from main import app, db, generate_data
 
-# Backup the old database
-def backup_database(db_uri, backup_uri):
-    """Backup the current database."""
-    if backup_uri:
-        db_path = db_uri.replace('sqlite:///', 'instance/')
-        backup_path = backup_uri.replace('sqlite:///', 'instance/')
-        shutil.copyfile(db_path, backup_path)
-        print(f"Database backed up to {backup_path}")
-    else:
-        print("Backup not supported for production database.")
-
-# Main extraction and loading process
 def main():
-    
-    # Step 0: Warning to the user and backup table
-    with app.app_context():
-        try:
-            # Step 3: Build New schema
-            # Check if the database has any tables
-            inspector = db.inspect(db.engine)
-            tables = inspector.get_table_names()
-            
-            # if tables:
-            #     print("Warning, you are about to lose all data in the database!")
-            #     print("Do you want to continue? (y/n)")
-            #     response = input()
-            #     if response.lower() != 'y':
-            #         print("Exiting without making changes.")
-            #         sys.exit(0)
-                    
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            sys.exit(1)
-        
-    # Step 1: Build New schema and create test data 
-    try:
-        with app.app_context():
-            # Drop all the tables defined in the project
-            db.drop_all()
-            print("All tables dropped.")
-            
-            # Create the tables defined in the project
-            print("Generating data.")
-            generate_data()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--force", action="store_true", help="seed default data even if the database is initialized")
+    parser.add_argument("--reset", action="store_true", help="drop all tables first, losing all data")
+    args = parser.parse_args()
 
+    try:
+        if args.reset:
+            with app.app_context():
+                # Drop all the tables defined in the project, and the revision stamp with them
+                db.drop_all()
+                with db.engine.begin() as conn:
+                    conn.exec_driver_sql("DROP TABLE IF EXISTS alembic_version")
+                print("All tables dropped.")
+        generate_data(force=args.force)
     except Exception as e:
         print(f"An error occurred: {e}")
         sys.exit(1)
-    
-    # Log success 
-    print("Database initialized!")
- 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+""" db_replica_sim.py
+Plays a lagging read replica of the SQLite database, to try read-replica routing locally.
+
+The replica is a second SQLite file (by default user_management_replica.db next to the database)
+kept --lag seconds behind it, see ReplicaLagSimulator in model/replica.py. Start the app with
+DB_REPLICA_URI pointing at that file: GET requests then read data up to --lag seconds old, except
+for a user who wrote within DB_REPLICA_STICKY_SECONDS.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./db_replica_sim.py
+
+Or run from the root of the project:
+> scripts/db_replica_sim.py --lag 3
+> DB_REPLICA_URI=sqlite:////path/to/instance/volumes/user_management_replica.db python main.py
+"""
+
+import argparse
+import sys
+import os
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import sqlite_path
+from model.replica import ReplicaLagSimulator
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--lag", type=float, default=2.0, help="seconds the replica is behind")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between copies of the database")
+    parser.add_argument("--replica", default=None, help="replica database file")
+    args = parser.parse_args()
+
+    primary = sqlite_path()
+    if primary is None:
+        print("The replica simulator needs the SQLite database.")
+        sys.exit(1)
+    replica = os.path.abspath(args.replica or os.path.splitext(primary)[0] + '_replica.db')
+    simulator = ReplicaLagSimulator(primary, replica, lag=args.lag, interval=args.interval)
+    simulator.sync()
+    print(f"Replica {replica} follows {primary} {args.lag}s behind; start the app with DB_REPLICA_URI=sqlite:///{replica}", flush=True)
+    try:
+        simulator.run()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
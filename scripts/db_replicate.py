@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+""" db_replicate.py
+Ships the SQLite WAL to a local archive continuously, or restores the database to a point in time.
+
+Run it next to the app (one replicator per database). It keeps snapshots and WAL segments in
+REPLICA_DIR (instance/replica by default); see model/replication.py for how. A restore writes a new
+database file, by default volumes/user_management_restored.db next to the live one, to swap in
+with the app stopped.
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./db_replicate.py
+
+Or run from the root of the project:
+> scripts/db_replicate.py
+> scripts/db_replicate.py --restore --timestamp 2026-10-18T09:30:00
+> scripts/db_replicate.py --restore --output /tmp/latest.db
+"""
+
+import argparse
+import sys
+import os
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import replicate, restore_point_in_time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--restore", action="store_true", help="restore instead of replicating")
+    parser.add_argument("--timestamp", default=None, help="point in time to restore, ISO 8601, UTC unless it has an offset (default latest)")
+    parser.add_argument("--output", default=None, help="database file the restore writes")
+    args = parser.parse_args()
+
+    if args.restore:
+        if restore_point_in_time(args.timestamp, args.output) is None:
+            sys.exit(1)
+    else:
+        replicate()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 
 """ db_restore.py
-Restores the database from JSON files.
+Restores the database from JSON files, or from a backup written by db_backup.py.
+
+Without options the JSON files in instance/backup (data.json, <table>.json) are imported. They carry
+no passwords: users not in the database yet are created with DEFAULT_PASSWORD.
+With --backup the newest backup directory (or the one given) is restored instead, after its
+files are checked against its manifest.
 
 Usage: Run from the terminal as such:
 
@@ -9,21 +14,30 @@ Goto the scripts directory:
 > cd scripts; ./db_restore.py
 
 Or run from the root of the project:
-> scripts/db_restore.py
+> scripts/db_restore.py --backup
+> scripts/db_restore.py --backup instance/backup/20261018T120000000000Z
 """
 
+import argparse
 import sys
 import os
 
 # Add the directory containing main.py to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from main import app, restore_data_command
+from main import app, load_data_from_json, restore_data, restore_from_backup
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--backup", nargs="?", const="latest", default=None, help="restore a backup directory (default the newest)")
+    args = parser.parse_args()
+
     # Step 3: Restore the database
     with app.app_context():
-        restore_data_command()
+        if args.backup:
+            restore_from_backup(None if args.backup == "latest" else args.backup)
+        else:
+            restore_data(load_data_from_json())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
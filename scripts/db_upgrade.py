@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+""" db_upgrade.py
+Applies the Alembic migrations in migrations/versions to the current database.
+
+Tables are created by db.create_all() in scripts/db_init.py (which also runs these migrations);
+migrations bring databases created by an older version of the models up to date (new columns,
+indexes, ...).
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./db_upgrade.py
+
+Or run from the root of the project:
+> scripts/db_upgrade.py
+"""
+
+import sys
+import os
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# This script brings the schema up to date, the boot check would only warn that it is not
+os.environ.setdefault('DB_SCHEMA_CHECK', 'off')
+
+from flask_migrate import upgrade
+from main import app
+
+def main():
+    # Migrations live next to main.py, not in the working directory
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations')
+    with app.app_context():
+        upgrade(directory=directory)
+
+if __name__ == "__main__":
+    main()
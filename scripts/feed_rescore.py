@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+""" feed_rescore.py
+Recomputes the hot and top feed scores of every post from its vote counters.
+
+Votes keep the scores of the posts they touch up to date; this periodic job covers the rest:
+posts created before the scores existed, a change of FEED_HOT_DECAY, and counters edited by hand.
+It works in batches, one short transaction each, so it can run next to the live app (e.g. from cron).
+
+Usage: Run from the terminal as such:
+
+Goto the scripts directory:
+> cd scripts; ./feed_rescore.py
+
+Or run from the root of the project:
+> scripts/feed_rescore.py --batch-size 1000
+"""
+
+import argparse
+import sys
+import os
+
+# Add the directory containing main.py to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app
+from model.post import Post
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--batch-size", type=int, default=500, help="posts rescored per transaction")
+    args = parser.parse_args()
+    with app.app_context():
+        changed = Post.rescore_all(batch_size=args.batch_size)
+    print(f"Rescored {changed} posts")
+
+if __name__ == "__main__":
+    main()